@@ -0,0 +1,53 @@
+"""Compare two results of suite.py
+
+    python compare.py base.json new.json
+
+Ratio is new / base. Throughput ratio larger than 1 and latency, load time
+and RSS ratios smaller than 1 are improvements.
+"""
+
+import argparse
+import json
+
+load_keys = ('scale', 'model_type')
+tagging_keys = ('scale', 'model_type', 'sentence_length', 'beam_size', 'guess_tag')
+
+def index(results, keys):
+    return {tuple(result[key] for key in keys): result for result in results}
+
+def ratio(new, base):
+    return new / base if base else float('nan')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('base', type=str)
+    parser.add_argument('new', type=str)
+
+    args = parser.parse_args()
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+    print('base = {}\nnew  = {}\n'.format(base['meta']['commit'], new['meta']['commit']))
+
+    base_load = index(base['load'], load_keys)
+    for key, result in index(new['load'], load_keys).items():
+        if not key in base_load:
+            continue
+        b = base_load[key]
+        print('load scale={} {:9} : time x{:.2f} ({:.3f} -> {:.3f} sec), rss x{:.2f} ({:.1f} -> {:.1f} Mb)'.format(
+            *key, ratio(result['load_time'], b['load_time']), b['load_time'], result['load_time'],
+            ratio(result['rss_mb'], b['rss_mb']), b['rss_mb'], result['rss_mb']))
+
+    base_tagging = index(base['tagging'], tagging_keys)
+    for key, result in index(new['tagging'], tagging_keys).items():
+        if not key in base_tagging:
+            continue
+        b = base_tagging[key]
+        print('scale={} {:9} length={:<3} beam={} guess_tag={} : throughput x{:.2f}, p50 x{:.2f}, p99 x{:.2f}'.format(
+            *key, ratio(result['sents_per_sec'], b['sents_per_sec']),
+            ratio(result['latency_ms']['p50'], b['latency_ms']['p50']),
+            ratio(result['latency_ms']['p99'], b['latency_ms']['p99'])))
+
+if __name__ == '__main__':
+    main()
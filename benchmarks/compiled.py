@@ -0,0 +1,71 @@
+"""Search time of string and compiled TrigramParameter
+
+    python compiled.py --scale 0.05 --num_sent 300 --beam_size 10
+
+It tags same sentences with TrigramParameter(compiled=False) and
+TrigramParameter(compiled=True), and prints the time of the search stage
+(TaggerStats) of each one. The lattices are generated once before the
+measurement, so the eojeol cache does not favor the second one. The best
+of repeat runs is reported, and the results of both must be same.
+Without model_path, a synthetic model of the given dictionary scale is used.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+sys.path.append('../')
+
+from crf_postagger.trigram import TrigramParameter
+from crf_postagger.trigram import TrigramTagger
+from synthetic import as_text
+from synthetic import generate_model
+from synthetic import generate_pos2words
+from synthetic import generate_sentences
+from synthetic import save_model
+
+def measure_search(tagger, sentences, repeat, **tag_kwargs):
+    stats = tagger.enable_stats()
+    # warm up the eojeol cache
+    results = [tagger.tag(sentence, **tag_kwargs) for sentence in sentences]
+    times = []
+    for _ in range(repeat):
+        stats.reset()
+        for sentence in sentences:
+            tagger.tag(sentence, **tag_kwargs)
+        times.append(stats.time['search'])
+    tagger.disable_stats()
+    return results, min(times)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_path', type=str, default=None, help='trained model path. synthetic model if not given')
+    parser.add_argument('--scale', type=float, default=0.05, help='dictionary scale of synthetic model')
+    parser.add_argument('--num_sent', type=int, default=300)
+    parser.add_argument('--beam_size', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--viterbi', dest='viterbi', action='store_true')
+
+    args = parser.parse_args()
+    pos2words, _ = generate_pos2words(args.scale, 0)
+    model_path = args.model_path
+    if model_path is None:
+        model_path = os.path.join(tempfile.mkdtemp(), 'synthetic.json')
+        save_model(model_path, *generate_model(pos2words))
+    sentences = [as_text(sentence) for sentence in generate_sentences(pos2words, args.num_sent, 0, 1)]
+    print('{} sents, {} chars'.format(len(sentences), sum(len(sentence) for sentence in sentences)))
+
+    tag_kwargs = {'beam_size': args.beam_size, 'viterbi': args.viterbi}
+    string_results, string_time = measure_search(
+        TrigramTagger(TrigramParameter(model_path)), sentences, args.repeat, **tag_kwargs)
+    compiled_results, compiled_time = measure_search(
+        TrigramTagger(TrigramParameter(model_path, compiled=True)), sentences, args.repeat, **tag_kwargs)
+
+    same = all([poses for poses, _ in a] == [poses for poses, _ in b]
+               for a, b in zip(string_results, compiled_results))
+    print('string   : search {:f} sec'.format(string_time))
+    print('compiled : search {:f} sec, {:.2f} x'.format(compiled_time, string_time / compiled_time))
+    print('same results = {}'.format(same))
+
+if __name__ == '__main__':
+    main()
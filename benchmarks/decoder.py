@@ -0,0 +1,48 @@
+import argparse
+import sys
+import time
+sys.path.append('../')
+
+from crf_postagger import Corpus
+from crf_postagger.trigram import TrigramTagger
+from crf_postagger.trigram import TrigramParameter
+
+def measure(tagger, sentences, beam_size, viterbi):
+    begin = time.time()
+    results = [tagger.tag(sentence, beam_size=beam_size, viterbi=viterbi) for sentence in sentences]
+    return results, time.time() - begin
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_path', type=str, default='../models/trigram_sejong_lr_sepxsv.json', help='trained model path')
+    parser.add_argument('--corpus_path', type=str, default='../data/sejong_corpus_lr_sepxsv.txt', help='sentences are made by concatenating morphemes')
+    parser.add_argument('--num_sent', type=int, default=1000)
+    parser.add_argument('--beam_size', type=int, default=5)
+    parser.add_argument('--compiled', dest='compiled', action='store_true')
+
+    args = parser.parse_args()
+    tagger = TrigramTagger(TrigramParameter(args.model_path, compiled=args.compiled))
+    sentences = [''.join(word for word, _ in sent) for sent in Corpus(args.corpus_path, args.num_sent)]
+    num_chars = sum(len(sentence) for sentence in sentences)
+    print('{} sents, {} chars'.format(len(sentences), num_chars))
+
+    beam_results, beam_time = measure(tagger, sentences, args.beam_size, False)
+    viterbi_results, viterbi_time = measure(tagger, sentences, args.beam_size, True)
+
+    # agreement of the best path, and how often each one found the higher score
+    n_agree, n_viterbi_better, n_beam_better = 0, 0, 0
+    for beam, viterbi in zip(beam_results, viterbi_results):
+        if beam[0][0] == viterbi[0][0]:
+            n_agree += 1
+        elif viterbi[0][1] > beam[0][1]:
+            n_viterbi_better += 1
+        else:
+            n_beam_better += 1
+
+    print('beam search    : {:f} sec, {:.1f} sents / sec'.format(beam_time, len(sentences) / beam_time))
+    print('viterbi search : {:f} sec, {:.1f} sents / sec'.format(viterbi_time, len(sentences) / viterbi_time))
+    print('best path agreement = {:.2f} %'.format(100 * n_agree / len(sentences)))
+    print('higher score, viterbi = {}, beam = {}'.format(n_viterbi_better, n_beam_better))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import random
+import sys
+import time
+sys.path.append('../')
+
+from crf_postagger import AbstractParameter
+from synthetic import generate_pos2words
+
+def scan_every_tag(pos2words, word):
+    # previous implementation of AbstractParameter._get_tag_score
+    return tuple((tag, words[word]) for tag, words in pos2words.items() if word in words)
+
+def measure(lookup, queries, n_repeat):
+    begin = time.time()
+    for _ in range(n_repeat):
+        for query in queries:
+            lookup(query)
+    elapsed = time.time() - begin
+    return n_repeat * len(queries) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=float, default=1.0, help='dictionary size relative to Sejong')
+    parser.add_argument('--num_queries', type=int, default=100000, help='number of candidate substrings')
+    parser.add_argument('--num_repeat', type=int, default=5)
+
+    args = parser.parse_args()
+    pos2words, syllables = generate_pos2words(args.scale)
+    random.seed(0)
+    num_words = sum(len(words) for words in pos2words.values())
+    print('{} tags, {} words'.format(len(pos2words), num_words))
+
+    begin = time.time()
+    parameter = AbstractParameter(pos2words=pos2words)
+    print('index construction = {:f} sec'.format(time.time() - begin))
+
+    # every substring of generated eojeols, as _word_lookup requests
+    queries = []
+    while len(queries) < args.num_queries:
+        eojeol = ''.join(random.choice(syllables) for _ in range(random.randint(2, 8)))
+        for b in range(len(eojeol)):
+            for e in range(b + 1, min(len(eojeol), b + parameter.max_word_len) + 1):
+                queries.append(eojeol[b:e])
+    hit = sum(1 for query in queries if parameter._get_tag_score(query))
+    print('{} queries, {:.2f} % are dictionary words'.format(
+        len(queries), 100 * hit / len(queries)))
+
+    before = measure(lambda word: scan_every_tag(pos2words, word), queries, args.num_repeat)
+    after = measure(parameter._get_tag_score, queries, args.num_repeat)
+    print('scan every tag   : {:.0f} lookups / sec'.format(before))
+    print('inverted index   : {:.0f} lookups / sec'.format(after))
+    print('speed up         : x{:.2f}'.format(after / before))
+
+if __name__ == '__main__':
+    main()
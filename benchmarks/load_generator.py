@@ -0,0 +1,159 @@
+"""Load generator of crf_postagger.server
+
+    python -m crf_postagger.server --model_path synthetic.json --n_jobs 4
+    python load_generator.py --port 8470 --rates 100 200 400 800
+
+For every target rate (sentences / sec), requests are sent with Poisson
+arrivals (open loop) over the connections for duration seconds, so the
+latency includes the queueing delay of the server when it is saturated.
+It reports the achieved throughput, p50 / p99 latency and the number of
+timed out and rejected requests. Sentences are read from sentence_path,
+or generated by synthetic.py.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+from synthetic import as_text
+from synthetic import generate_pos2words
+from synthetic import generate_sentences
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[int(round(p / 100 * (len(values) - 1)))]
+
+async def open_connection(args):
+    if args.unix_path:
+        return await asyncio.open_unix_connection(args.unix_path)
+    return await asyncio.open_connection(args.host, args.port)
+
+async def request(reader, writer, request_):
+    writer.write((json.dumps(request_, ensure_ascii=False) + '\n').encode('utf-8'))
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+class Connection:
+    """A connection which matches out of order responses by id"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.waiting = {}
+        self.ids = itertools.count()
+        self.task = asyncio.get_running_loop().create_task(self._read())
+
+    async def _read(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            response = json.loads(line)
+            future = self.waiting.pop(response.get('id'), None)
+            if future is not None and not future.done():
+                future.set_result(response)
+
+    async def tag(self, sentence):
+        id_ = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[id_] = future
+        self.writer.write((json.dumps({'id': id_, 'sentence': sentence}, ensure_ascii=False) + '\n').encode('utf-8'))
+        await self.writer.drain()
+        return await future
+
+    async def close(self):
+        self.task.cancel()
+        self.writer.close()
+
+async def run_rate(args, sentences, rate):
+    connections = [Connection(*await open_connection(args)) for _ in range(args.connections)]
+    rng = random.Random(args.seed)
+    latencies, errors = [], {}
+
+    async def send(connection, sentence):
+        begin = time.perf_counter()
+        response = await connection.tag(sentence)
+        if 'error' in response:
+            errors[response['error']] = errors.get(response['error'], 0) + 1
+        else:
+            latencies.append(time.perf_counter() - begin)
+
+    tasks = []
+    begin = time.perf_counter()
+    next_time = begin
+    for i in itertools.count():
+        next_time += rng.expovariate(rate)
+        if next_time - begin > args.duration:
+            break
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        connection = connections[i % len(connections)]
+        tasks.append(asyncio.get_running_loop().create_task(
+            send(connection, sentences[i % len(sentences)])))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - begin
+
+    for connection in connections:
+        await connection.close()
+    return {
+        'target_rate': rate,
+        'num_requests': len(tasks),
+        'sents_per_sec': len(latencies) / elapsed,
+        'p50_ms': 1000 * percentile(latencies, 50),
+        'p99_ms': 1000 * percentile(latencies, 99),
+        'errors': errors
+    }
+
+async def run(args, sentences):
+    reader, writer = await open_connection(args)
+    print('health: {}'.format(await request(reader, writer, {'op': 'health'})))
+
+    results = []
+    for rate in args.rates:
+        result = await run_rate(args, sentences, rate)
+        results.append(result)
+        print('target {:>7.1f} / sec : throughput {:>7.1f} sents / sec, p50 = {:.2f} ms, p99 = {:.2f} ms, errors = {}'.format(
+            rate, result['sents_per_sec'], result['p50_ms'], result['p99_ms'], result['errors']))
+
+    stats = await request(reader, writer, {'op': 'stats'})
+    print('server: mean batch size = {:.1f}, counts = {}'.format(
+        stats['mean_batch_size'], stats['counts']))
+    writer.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8470)
+    parser.add_argument('--unix_path', type=str, default=None)
+    parser.add_argument('--rates', type=float, nargs='+', default=[50, 100, 200, 400, 800], help='target sentences / sec')
+    parser.add_argument('--duration', type=float, default=5, help='seconds of each rate')
+    parser.add_argument('--connections', type=int, default=8)
+    parser.add_argument('--sentence_path', type=str, default=None, help='utf-8 text, a sentence per line')
+    parser.add_argument('--scale', type=float, default=0.05, help='dictionary size of synthetic sentences')
+    parser.add_argument('--num_eojeols', type=int, default=0, help='number of eojeols of synthetic sentences. 0 means random')
+    parser.add_argument('--output', type=str, default=None, help='if given, results are written as JSON')
+    parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+    if args.sentence_path:
+        with open(args.sentence_path, encoding='utf-8') as f:
+            sentences = [line.strip() for line in f if line.strip()]
+    else:
+        pos2words, _ = generate_pos2words(args.scale, args.seed)
+        sentences = [as_text(sentence) for sentence in
+            generate_sentences(pos2words, 1000, args.num_eojeols, args.seed + 2)]
+
+    results = asyncio.run(run(args, sentences))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Tagger benchmark suite on synthetic models
+
+    python suite.py --output results.json
+    python compare.py base.json results.json
+
+For every dictionary scale, a synthetic model is generated and loaded by
+TrigramParameter and HMMStyleParameter in fresh processes to measure load
+time and RSS. Then the taggers tag synthetic sentences of each length, and
+the throughput and latency percentiles are recorded for every beam_size
+and guess_tag of TrigramTagger. The eojeol and lemma caches are cleared
+before each configuration. Same arguments generate same models and
+sentences, so results of different commits are comparable.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.append('../')
+
+from crf_postagger.hmm_style import HMMStyleParameter
+from crf_postagger.hmm_style import HMMStyleTagger
+from crf_postagger.trigram import TrigramParameter
+from crf_postagger.trigram import TrigramTagger
+from crf_postagger.utils import get_process_memory
+from synthetic import as_text
+from synthetic import generate_model
+from synthetic import generate_pos2words
+from synthetic import generate_sentences
+from synthetic import save_model
+
+parameter_classes = {'trigram': TrigramParameter, 'hmm_style': HMMStyleParameter}
+
+def _measure_load(model_path, model_type, queue):
+    rss = get_process_memory()
+    begin = time.perf_counter()
+    parameter = parameter_classes[model_type](model_path)
+    load_time = time.perf_counter() - begin
+    queue.put((load_time, 1024 * (get_process_memory() - rss)))
+
+def measure_load(model_path, model_type):
+    """Load time (sec) and increased RSS (Mb) in a fresh process"""
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_measure_load, args=(model_path, model_type, queue))
+    process.start()
+    load_time, rss = queue.get()
+    process.join()
+    return {'model_type': model_type, 'load_time': load_time, 'rss_mb': rss}
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[int(round(p / 100 * (len(values) - 1)))]
+
+def measure_tagging(tagger, sentences, **tag_kwargs):
+    parameters = tagger.parameters
+    parameters._eojeol_cache.clear()
+    parameters._lemma_cache.clear()
+
+    latencies = []
+    begin = time.perf_counter()
+    for sentence in sentences:
+        begin_sent = time.perf_counter()
+        tagger.tag(sentence, **tag_kwargs)
+        latencies.append(time.perf_counter() - begin_sent)
+    elapsed = time.perf_counter() - begin
+
+    return {
+        'sents_per_sec': len(sentences) / elapsed,
+        'chars_per_sec': sum(len(sentence) for sentence in sentences) / elapsed,
+        'latency_ms': {
+            'mean': 1000 * elapsed / len(sentences),
+            'p50': 1000 * percentile(latencies, 50),
+            'p90': 1000 * percentile(latencies, 90),
+            'p99': 1000 * percentile(latencies, 99),
+            'max': 1000 * max(latencies)
+        }
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+def run(args):
+    output = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'args': vars(args)
+        },
+        'load': [],
+        'tagging': []
+    }
+
+    model_dir = tempfile.mkdtemp(prefix='crf_postagger_bench_')
+    for scale in args.scales:
+        pos2words, _ = generate_pos2words(scale, args.seed)
+        state_features, transitions, feature_counts = generate_model(
+            pos2words, args.num_train_sents, args.seed)
+        model_path = os.path.join(model_dir, 'synthetic_{}.json'.format(scale))
+        save_model(model_path, state_features, transitions, feature_counts)
+
+        setting = {
+            'scale': scale,
+            'num_words': sum(len(words) for words in pos2words.values()),
+            'num_features': len(feature_counts),
+            'model_bytes': os.path.getsize(model_path)
+        }
+        print('scale = {}, {} words, {} features'.format(
+            scale, setting['num_words'], setting['num_features']))
+
+        for model_type in args.models:
+            result = dict(setting, **measure_load(model_path, model_type))
+            output['load'].append(result)
+            print('  load {:9} : {:.3f} sec, {:.1f} Mb'.format(
+                model_type, result['load_time'], result['rss_mb']))
+
+        taggers = {}
+        if 'trigram' in args.models:
+            taggers['trigram'] = TrigramTagger(TrigramParameter(model_path))
+        if 'hmm_style' in args.models:
+            taggers['hmm_style'] = HMMStyleTagger(HMMStyleParameter(model_path))
+
+        for length in args.sentence_lengths:
+            sentences = [as_text(sentence) for sentence in
+                generate_sentences(pos2words, args.num_sents, length, args.seed + 2)]
+            configs = []
+            if 'trigram' in taggers:
+                configs += [('trigram', {'beam_size': beam_size, 'guess_tag': guess_tag})
+                    for beam_size in args.beam_sizes for guess_tag in (False, True)]
+            if 'hmm_style' in taggers:
+                configs.append(('hmm_style', {}))
+            for model_type, tag_kwargs in configs:
+                result = dict(setting, model_type=model_type,
+                    sentence_length=length, num_sents=len(sentences),
+                    beam_size=tag_kwargs.get('beam_size'),
+                    guess_tag=tag_kwargs.get('guess_tag'))
+                result.update(measure_tagging(taggers[model_type], sentences, **tag_kwargs))
+                output['tagging'].append(result)
+                print('  {:9} length={:<3} beam={} guess_tag={} : {:.1f} sents / sec, p50 = {:.2f} ms, p99 = {:.2f} ms'.format(
+                    model_type, length, result['beam_size'], result['guess_tag'],
+                    result['sents_per_sec'], result['latency_ms']['p50'], result['latency_ms']['p99']))
+
+        os.remove(model_path)
+    os.rmdir(model_dir)
+    return output
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', type=str, default='benchmark_results.json')
+    parser.add_argument('--scales', type=float, nargs='+', default=[0.05, 0.2], help='dictionary sizes relative to Sejong')
+    parser.add_argument('--num_train_sents', type=int, default=2000, help='number of sentences which generate trigram features')
+    parser.add_argument('--models', type=str, nargs='+', default=['trigram', 'hmm_style'], choices=['trigram', 'hmm_style'])
+    parser.add_argument('--sentence_lengths', type=int, nargs='+', default=[5, 15, 40], help='number of eojeols')
+    parser.add_argument('--beam_sizes', type=int, nargs='+', default=[1, 5, 10])
+    parser.add_argument('--num_sents', type=int, default=200, help='number of sentences of each length')
+    parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+    output = run(args)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print('results are written in {}'.format(args.output))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""Synthetic dictionary, model and sentences for offline benchmarks
+
+    python synthetic.py --model_path synthetic.json --scale 0.1 --sentence_path sentences.txt
+
+Words are random strings of Hangul syllables, drawn from a small set of
+syllables so that many words share prefixes as real words do. Synthetic
+training sentences are sampled from a few eojeol patterns, and the model
+has the trigram features of those sentences with random coefficients,
+plus an x[0] feature of every dictionary word, as trained models have.
+The model is written in the JSON format of Trainer.
+"""
+
+import argparse
+import json
+import random
+import sys
+sys.path.append('../')
+
+from crf_postagger.trigram import TrigramFeatureTransformer
+
+# approximate number of distinct morphemes of each tag in Sejong corpus
+sejong_tag_sizes = {
+    'Noun': 180000, 'Verb': 9000, 'Adjective': 4000, 'Adverb': 6000,
+    'Determiner': 600, 'Exclamation': 800, 'Josa': 300, 'Eomi': 2500,
+    'Prefix': 400, 'Suffix': 1200, 'Number': 300, 'Pronoun': 500,
+    'Foreign': 3000, 'Punctuation': 60, 'Symbol': 100, 'NounEnding': 80,
+    'VerbEnding': 80, 'AdjectiveEnding': 60, 'Hanja': 700, 'Copula': 10
+}
+
+# (tags of morphemes in an eojeol, weight)
+eojeol_patterns = [
+    (('Noun', 'Josa'), 30),
+    (('Noun',), 12),
+    (('Noun', 'Noun', 'Josa'), 6),
+    (('Verb', 'Eomi'), 16),
+    (('Adjective', 'Eomi'), 8),
+    (('Noun', 'Copula', 'Eomi'), 4),
+    (('Pronoun', 'Josa'), 5),
+    (('Adverb',), 7),
+    (('Determiner',), 3),
+    (('Number', 'Noun'), 3),
+    (('Prefix', 'Noun', 'Suffix', 'Josa'), 2),
+    (('Exclamation',), 1),
+    (('Foreign', 'Josa'), 2),
+    (('Noun', 'Punctuation'), 1)
+]
+
+def generate_pos2words(scale, seed=0):
+    rng = random.Random(seed)
+    # frequent syllables only, to make many prefixes shared like real words
+    syllables = [chr(44032 + rng.randint(0, 11171)) for _ in range(800)]
+    pos2words = {}
+    for tag, size in sejong_tag_sizes.items():
+        words = {}
+        for _ in range(max(1, int(size * scale))):
+            len_word = min(8, max(1, int(rng.expovariate(0.45)) + 1))
+            word = ''.join(rng.choice(syllables) for _ in range(len_word))
+            words[word] = rng.random()
+        pos2words[tag] = words
+    return pos2words, syllables
+
+def generate_sentences(pos2words, num_sents, num_eojeols=0, seed=0):
+    """It returns list of sentences. A sentence is list of eojeols, and an
+    eojeol is list of (word, tag). Words are sampled from skewed
+    distribution, so a few words are frequent as in real text.
+
+    :param int num_eojeols: number of eojeols in a sentence. If 0, 3 to 20 eojeols
+    """
+
+    rng = random.Random(seed)
+    vocabs = {tag: list(words) for tag, words in pos2words.items()}
+    patterns, weights = zip(*eojeol_patterns)
+
+    def sample_word(tag):
+        vocab = vocabs[tag]
+        return vocab[int(len(vocab) * rng.random() ** 3)]
+
+    sentences = []
+    for _ in range(num_sents):
+        n = num_eojeols if num_eojeols > 0 else rng.randint(3, 20)
+        sentences.append([
+            [(sample_word(tag), tag) for tag in pattern]
+            for pattern in rng.choices(patterns, weights, k=n)
+        ])
+    return sentences
+
+def as_text(sentence):
+    return ' '.join(''.join(word for word, _ in eojeol) for eojeol in sentence)
+
+def as_wordpos(sentence):
+    return [wordpos for eojeol in sentence for wordpos in eojeol]
+
+def generate_model(pos2words, num_train_sents=2000, seed=0):
+    """
+    :returns: state_features, transitions, feature_counts
+        state_features is {(feature, tag): coef}, transitions is {(tag, tag): coef}
+        and feature_counts is {feature: count}
+    """
+
+    rng = random.Random(seed)
+    transformer = TrigramFeatureTransformer()
+    training = generate_sentences(pos2words, num_train_sents, 0, seed + 1)
+
+    state_features, transitions, feature_counts = {}, {}, {}
+    for sentence in training:
+        x, y = transformer(as_wordpos(sentence))
+        for features, tag in zip(x, y):
+            for feature in features:
+                feature_counts[feature] = feature_counts.get(feature, 0) + 1
+                if not (feature, tag) in state_features:
+                    state_features[(feature, tag)] = rng.gauss(0, 1)
+        # observed transitions are preferred
+        for transition in zip(y, y[1:]):
+            transitions[transition] = abs(rng.gauss(1, 0.5))
+
+    # every dictionary word has positive x[0] feature as trained models memorize all words
+    for tag, words in pos2words.items():
+        for word, score in words.items():
+            feature = 'x[0]=%s' % word
+            state_features[(feature, tag)] = 0.1 + score
+            feature_counts.setdefault(feature, 1)
+
+    tags = list(pos2words)
+    for transition in ((t0, t1) for t0 in tags for t1 in tags):
+        if not transition in transitions:
+            transitions[transition] = rng.gauss(-1, 0.5)
+
+    return state_features, transitions, feature_counts
+
+def save_model(path, state_features, transitions, feature_counts):
+    # same format with Trainer._save_as_json
+    idx2feature = sorted(feature_counts, key=lambda feature: -feature_counts[feature])
+    params = {
+        'state_features': {' -> '.join(key): coef for key, coef in state_features.items()},
+        'transitions': {' -> '.join(key): coef for key, coef in transitions.items()},
+        'idx2feature': idx2feature,
+        'features': {feature: (idx, feature_counts[feature]) for idx, feature in enumerate(idx2feature)}
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(params, f, ensure_ascii=False, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_path', type=str, default='synthetic.json')
+    parser.add_argument('--scale', type=float, default=0.1, help='dictionary size relative to Sejong')
+    parser.add_argument('--num_train_sents', type=int, default=2000, help='number of sentences which generate trigram features')
+    parser.add_argument('--sentence_path', type=str, default=None, help='if given, synthetic sentences are written')
+    parser.add_argument('--num_sents', type=int, default=1000)
+    parser.add_argument('--num_eojeols', type=int, default=0, help='number of eojeols in a sentence. 0 means random')
+    parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+    pos2words, _ = generate_pos2words(args.scale, args.seed)
+    state_features, transitions, feature_counts = generate_model(
+        pos2words, args.num_train_sents, args.seed)
+    save_model(args.model_path, state_features, transitions, feature_counts)
+    print('{} words, {} features, {} state features'.format(
+        sum(len(words) for words in pos2words.values()), len(feature_counts), len(state_features)))
+
+    if args.sentence_path:
+        sentences = generate_sentences(pos2words, args.num_sents, args.num_eojeols, args.seed + 2)
+        with open(args.sentence_path, 'w', encoding='utf-8') as f:
+            for sentence in sentences:
+                f.write('{}\n'.format(as_text(sentence)))
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+from .lattice import Lattice
 from .lemmatizer import lemma_candidate
 from .params import AbstractParameter
 from .tagger import AbstractTagger
@@ -0,0 +1,225 @@
+"""Binary model format
+
+A model file begins with an 8 byte magic and an 8 byte header length,
+followed by a JSON header and 8 byte aligned sections. Every string
+(tags and features) is interned once in a string table, and coefficients
+are packed in little-endian arrays, so the file can be read through mmap
+without parsing. Parameters copy the coefficients into Python dicts while
+the file is open, so every process which loads the model holds its own
+copy; only the pages of the file itself are shared while it is read.
+
+    header = {section name: [typecode, offset, length], ..., 'scales': {section name: scale}}
+
+    strings            : utf-8 text of all interned strings
+    string_offsets (Q) : character offsets of each string in strings
+    transition_from (I), transition_to (I), transition_coef (d)
+    state_feature (I), state_tag (I), state_coef (d)
+    idx2feature (I)    : string id of idx-th feature
+    feature_count (Q)  : count of idx-th feature
+
+Coefficients may be quantized by save_binary. With int8, a coefficient is
+stored as round(coef / scale) (b) where scale = max |coef| / 127, and the
+scale is in header['scales']. With float16, it is stored as (e).
+"""
+
+from array import array
+import json
+import mmap
+import struct
+import sys
+
+magic = b'CRFPOSB1'
+_alignment = 8
+
+def is_binary_model(path):
+    with open(path, 'rb') as f:
+        return f.read(len(magic)) == magic
+
+class BinaryModel:
+    """Read-only view of a binary model file. Arrays are memoryviews of
+    the mmap, so they are valid until close() is called."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(magic)] != magic:
+            self._mmap.close()
+            raise ValueError('{} is not a binary crf_postagger model'.format(path))
+        begin = len(magic)
+        header_len, = struct.unpack('<Q', self._mmap[begin: begin + 8])
+        begin += 8
+        self.header = json.loads(self._mmap[begin: begin + header_len].decode('utf-8'))
+        self._buffer = memoryview(self._mmap)
+        self._strings = None
+
+    def __getitem__(self, section):
+        typecode, offset, length = self.header[section]
+        size = struct.calcsize(typecode) * length
+        view = self._buffer[offset: offset + size]
+        # memoryview can not cast to float16
+        if sys.byteorder == 'big' or typecode == 'e':
+            return struct.unpack('<{}{}'.format(length, typecode), view)
+        return view.cast(typecode)
+
+    def coefficients(self, section):
+        values = self[section]
+        scale = self.header.get('scales', {}).get(section)
+        if scale is not None:
+            return [value * scale for value in values]
+        return values
+
+    @property
+    def strings(self):
+        if self._strings is None:
+            typecode, offset, length = self.header['strings']
+            text = self._buffer[offset: offset + length].tobytes().decode('utf-8')
+            offsets = self['string_offsets']
+            self._strings = [text[b:e] for b, e in zip(offsets, offsets[1:])]
+        return self._strings
+
+    def transitions(self):
+        strings = self.strings
+        return {
+            (strings[f], strings[t]): coef for f, t, coef in zip(
+                self['transition_from'], self['transition_to'], self.coefficients('transition_coef'))
+        }
+
+    def state_features(self):
+        strings = self.strings
+        return {
+            (strings[feature], strings[tag]): coef for feature, tag, coef in zip(
+                self['state_feature'], self['state_tag'], self.coefficients('state_coef'))
+        }
+
+    def idx2feature(self):
+        strings = self.strings
+        return [strings[i] for i in self['idx2feature']]
+
+    def feature_counts(self):
+        return list(self['feature_count'])
+
+    def close(self):
+        self._strings = None
+        self._buffer.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def load_binary(path):
+    return BinaryModel(path)
+
+def quantize(values, quantization):
+    """It returns (typecode, values, scale) of quantized coefficients.
+
+    :param list values: list of float
+    :param str quantization: 'int8' or 'float16'
+    """
+
+    if quantization == 'int8':
+        scale = max((abs(value) for value in values), default=0) / 127 or 1.0
+        return 'b', [max(-127, min(127, round(value / scale))) for value in values], scale
+    elif quantization == 'float16':
+        return 'e', list(values), None
+    raise ValueError("quantization should be 'int8' or 'float16'")
+
+def dequantize(values, quantization):
+    """Coefficients as they are read from a quantized model"""
+    typecode, values, scale = quantize(values, quantization)
+    if typecode == 'e':
+        return list(struct.unpack('<{}e'.format(len(values)), struct.pack('<{}e'.format(len(values)), *values)))
+    return [value * scale for value in values]
+
+def save_binary(path, state_features, transitions, idx2feature, features, quantization=None):
+    """
+    :param dict state_features: {(feature, tag): coef}
+    :param dict transitions: {(tag, tag): coef}
+    :param list idx2feature: list of feature str
+    :param dict features: {feature: (idx, count)}
+    :param str quantization: None, 'int8' or 'float16'
+    """
+
+    string2id = {}
+    def intern(string):
+        idx = string2id.get(string)
+        if idx is None:
+            idx = string2id[string] = len(string2id)
+        return idx
+
+    sections = {}
+    sections['transition_from'] = array('I', (intern(f) for f, _ in transitions))
+    sections['transition_to'] = array('I', (intern(t) for _, t in transitions))
+    sections['state_feature'] = array('I', (intern(f) for f, _ in state_features))
+    sections['state_tag'] = array('I', (intern(t) for _, t in state_features))
+    sections['idx2feature'] = array('I', (intern(f) for f in idx2feature))
+    feature_count = array('Q', [0] * len(idx2feature))
+    for idx, count in features.values():
+        feature_count[idx] = count
+    sections['feature_count'] = feature_count
+
+    strings = sorted(string2id, key=lambda string: string2id[string])
+    string_offsets = array('Q', [0])
+    for string in strings:
+        string_offsets.append(string_offsets[-1] + len(string))
+    sections['string_offsets'] = string_offsets
+
+    if sys.byteorder == 'big':
+        for values in sections.values():
+            values.byteswap()
+
+    payloads = [('strings', 'B', ''.join(strings).encode('utf-8'))]
+    payloads += [(name, values.typecode, values.tobytes()) for name, values in sections.items()]
+
+    scales = {}
+    for name, coefficients in [('transition_coef', transitions), ('state_coef', state_features)]:
+        typecode, values, scale = 'd', list(coefficients.values()), None
+        if quantization is not None:
+            typecode, values, scale = quantize(values, quantization)
+        if scale is not None:
+            scales[name] = scale
+        payloads.append((name, typecode, struct.pack('<{}{}'.format(len(values), typecode), *values)))
+
+    # header stores absolute offsets, so its length is fixed before offsets are known
+    def as_header(offsets):
+        header = {name: [typecode, offset, len(data) // struct.calcsize(typecode)]
+                  for (name, typecode, data), offset in zip(payloads, offsets)}
+        if scales:
+            header['scales'] = scales
+        return json.dumps(header, sort_keys=True).encode('utf-8')
+
+    def align(position):
+        return position + (-position % _alignment)
+
+    header_len = len(as_header([2 ** 62] * len(payloads)))
+    begin = align(len(magic) + 8 + header_len)
+    offsets = []
+    for _, _, data in payloads:
+        offsets.append(begin)
+        begin = align(begin + len(data))
+    header = as_header(offsets).ljust(header_len)
+
+    with open(path, 'wb') as f:
+        f.write(magic)
+        f.write(struct.pack('<Q', header_len))
+        f.write(header)
+        for (_, _, data), offset in zip(payloads, offsets):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(data)
+
+def json_to_binary(json_path, binary_path, marker=' -> '):
+    """Convert a JSON model written by Trainer to the binary format"""
+
+    with open(json_path, encoding='utf-8') as f:
+        model = json.load(f)
+
+    save_binary(
+        binary_path,
+        {tuple(key.split(marker)): coef for key, coef in model['state_features'].items()},
+        {tuple(key.split(marker)): coef for key, coef in model['transitions'].items()},
+        model['idx2feature'],
+        model['features']
+    )
@@ -0,0 +1,217 @@
+from heapq import merge
+import json
+import math
+import os
+
+
+class LossyCounter:
+    """Lossy counting (Manku & Motwani, 2002)
+
+    The stream is divided into buckets of width ceil(1 / error_rate). An
+    item is stored with its count and the maximum count it could have had
+    before it was stored. At every bucket boundary, items which could not
+    have occurred more than once per bucket are removed. For a stream of N
+    items,
+
+    - every stored count is at most error_rate * N smaller than the true count
+    - every item whose true count exceeds error_rate * N is stored
+    - at most (1 / error_rate) * log(error_rate * N) items are stored
+
+    If max_size > 0, at most max_size items are stored. When a new item
+    exceeds it, the bucket is raised at once so that at most 3/4 of
+    max_size items remain. Then max_error, instead of error_rate * N, bounds
+    the difference between stored and true counts, and every item whose
+    true count exceeds max_error is stored.
+
+    :param float error_rate: 0 < error_rate < 1
+    :param int max_size: maximum number of stored items. 0 means no limit
+    """
+
+    def __init__(self, error_rate=1e-6, max_size=0):
+        if not (0 < error_rate < 1):
+            raise ValueError('error_rate should be in (0, 1)')
+        self.error_rate = error_rate
+        self.width = int(math.ceil(1 / error_rate))
+        self.max_size = max_size
+        self.n_items = 0
+        self.bucket = 1
+        # item -> [count, max error]
+        self.counter = {}
+
+    def __len__(self):
+        return len(self.counter)
+
+    def __contains__(self, item):
+        return item in self.counter
+
+    @property
+    def max_error(self):
+        return self.bucket - 1
+
+    def add(self, item):
+        count_error = self.counter.get(item)
+        if count_error is None:
+            self.counter[item] = [1, self.bucket - 1]
+            if 0 < self.max_size < len(self.counter):
+                self._shrink()
+        else:
+            count_error[0] += 1
+        self.n_items += 1
+        if self.n_items % self.width == 0:
+            self._prune(self.bucket)
+
+    def update(self, items):
+        add = self.add
+        for item in items:
+            add(item)
+
+    def _prune(self, bucket):
+        # remove items which could not have occurred more than bucket times
+        self.counter = {
+            item: count_error for item, count_error in self.counter.items()
+            if count_error[0] + count_error[1] > bucket
+        }
+        self.bucket = bucket + 1
+
+    def _shrink(self):
+        # the smallest bucket which leaves at most 3/4 of max_size items
+        bounds = sorted((count + error for count, error in self.counter.values()), reverse=True)
+        self._prune(max(self.bucket, bounds[self.max_size * 3 // 4]))
+
+    def candidates(self, min_count=1):
+        """Items whose true count may be equal or larger than min_count"""
+        return {item for item, (count, error) in self.counter.items()
+                if count + error >= min_count}
+
+
+class SpillCounter:
+    """Exact out-of-core counter.
+
+    Items are counted in memory until buffer_size distinct items are
+    stored. Then the counts are written to spill_dir as a run, a text file
+    of 'item\tcount' lines sorted by item, and the buffer is cleared. The
+    runs are combined by a k-way merge which streams the runs, so peak
+    memory is set by buffer_size, not by the number of distinct items. At
+    most max_merge runs are opened at once; if there are more runs, they
+    are merged in groups into intermediate runs first.
+
+    A manifest in spill_dir records the runs and a signature of what was
+    counted, so finished runs can be merged again by later runs without
+    counting.
+
+    :param str spill_dir: directory of runs
+    :param int buffer_size: maximum number of distinct items in memory
+    :param int max_merge: maximum number of runs merged at once
+    """
+
+    def __init__(self, spill_dir, buffer_size=1000000, max_merge=64):
+        if not os.path.exists(spill_dir):
+            os.makedirs(spill_dir)
+        self.spill_dir = spill_dir
+        self.buffer_size = max(1, buffer_size)
+        self.max_merge = max(2, max_merge)
+        self.buffer = {}
+        self.runs = []
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def update(self, items):
+        for item in items:
+            self.buffer[item] = self.buffer.get(item, 0) + 1
+        if len(self.buffer) >= self.buffer_size:
+            self.spill()
+
+    def spill(self):
+        if not self.buffer:
+            return
+        path = os.path.join(self.spill_dir, 'run{}.tsv'.format(len(self.runs)))
+        _write_run(path, sorted(self.buffer.items()))
+        self.runs.append(path)
+        self.buffer = {}
+
+    def save_manifest(self, signature):
+        """Flush the buffer and record the runs with the signature of counted data"""
+        self.spill()
+        manifest = {'signature': signature, 'runs': [os.path.basename(run) for run in self.runs]}
+        with open(os.path.join(self.spill_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, spill_dir, signature, max_merge=64):
+        """It returns the SpillCounter of finished runs in spill_dir if they
+        were counted from data of same signature, otherwise None"""
+
+        path = os.path.join(spill_dir, 'manifest.json')
+        if (signature is None) or not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest['signature'] != signature:
+            return None
+        runs = [os.path.join(spill_dir, run) for run in manifest['runs']]
+        if not all(os.path.exists(run) for run in runs):
+            return None
+        counter = cls(spill_dir, max_merge=max_merge)
+        counter.runs = runs
+        return counter
+
+    def items(self):
+        """It yields (item, count) in sorted order of item, merging runs and buffer"""
+
+        runs, intermediates = self.runs, []
+        try:
+            # bounded fan-in, so the number of open files does not grow with runs
+            while len(runs) > self.max_merge:
+                merged = []
+                for b in range(0, len(runs), self.max_merge):
+                    path = os.path.join(self.spill_dir, 'merge{}.tsv'.format(len(intermediates)))
+                    _write_run(path, _merge_counts([_read_run(run) for run in runs[b: b + self.max_merge]]))
+                    intermediates.append(path)
+                    merged.append(path)
+                runs = merged
+
+            streams = [_read_run(run) for run in runs]
+            streams.append(iter(sorted(self.buffer.items())))
+            yield from _merge_counts(streams)
+        finally:
+            for path in intermediates:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def remove_runs(self):
+        """Remove the runs of this counter and the runs recorded in manifest"""
+        runs = set(self.runs)
+        manifest = os.path.join(self.spill_dir, 'manifest.json')
+        if os.path.exists(manifest):
+            with open(manifest, encoding='utf-8') as f:
+                runs.update(os.path.join(self.spill_dir, run) for run in json.load(f)['runs'])
+            os.remove(manifest)
+        for run in runs:
+            if os.path.exists(run):
+                os.remove(run)
+        self.runs = []
+
+def _write_run(path, items):
+    with open(path, 'w', encoding='utf-8') as f:
+        for item, count in items:
+            f.write('{}\t{}\n'.format(item, count))
+
+def _read_run(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            item, count = line[:-1].rsplit('\t', 1)
+            yield item, int(count)
+
+def _merge_counts(streams):
+    # sum counts of same item in sorted streams
+    item_, count_ = None, 0
+    for item, count in merge(*streams):
+        if item == item_:
+            count_ += count
+            continue
+        if item_ is not None:
+            yield item_, count_
+        item_, count_ = item, count
+    if item_ is not None:
+        yield item_, count_
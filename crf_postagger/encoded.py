@@ -0,0 +1,147 @@
+"""Feature id encoded training corpus
+
+Trainer transforms every sentence to feature strings twice, once to count
+features and once to append them to pycrfsuite. The encoded corpus stores
+the second result as ids, so a later training with same corpus and
+feature transformer reads sentences without transformation and filtering.
+
+A file begins with an 8 byte magic, followed by sentence records and a
+JSON trailer. The last 8 bytes are the length of the trailer.
+
+    record  = [length (I)] + [n_tokens, (label id, n_features, feature ids ...) * n_tokens] (I)
+    trailer = {'signature', 'idx2feature', 'feature_counts', 'labels', 'num_sent'}
+"""
+
+from array import array
+import hashlib
+import json
+import os
+import struct
+import sys
+
+magic = b'CRFPOSE1'
+
+def hash_signature(signature):
+    """It returns sha1 hex digest of JSON serializable signature"""
+    text = json.dumps(signature, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+class EncodedCorpusWriter:
+    """It writes sentences as feature ids. Features not in features are
+    removed, as Trainer does before appending them to pycrfsuite.
+
+    The file is written at path + '.tmp' and is renamed to path by close(),
+    so an interrupted writing never leaves an incomplete cache.
+
+    :param str path: cache file path
+    :param dict features: {feature: (idx, count)}
+    """
+
+    def __init__(self, path, features):
+        self.path = path
+        self.features = features
+        self.label2id = {}
+        self.num_sent = 0
+        self._f = open(path + '.tmp', 'wb')
+        self._f.write(magic)
+
+    def write(self, x, y):
+        """It returns x of which features are in features, and writes it"""
+        features = self.features
+        label2id = self.label2id
+        x_ = []
+        record = array('I', [len(x)])
+        for xi, yi in zip(x, y):
+            xi = [xij for xij in xi if xij in features]
+            x_.append(xi)
+            label = label2id.get(yi)
+            if label is None:
+                label = label2id[yi] = len(label2id)
+            record.append(label)
+            record.append(len(xi))
+            record.extend(features[xij][0] for xij in xi)
+        if sys.byteorder == 'big':
+            record.byteswap()
+        self._f.write(struct.pack('<I', len(record)))
+        self._f.write(record.tobytes())
+        self.num_sent += 1
+        return x_
+
+    def close(self, signature, idx2feature, feature_counts):
+        labels = sorted(self.label2id, key=lambda label: self.label2id[label])
+        trailer = {
+            'signature': signature,
+            'idx2feature': idx2feature,
+            'feature_counts': feature_counts,
+            'labels': labels,
+            'num_sent': self.num_sent
+        }
+        trailer = json.dumps(trailer, ensure_ascii=False).encode('utf-8')
+        self._f.write(trailer)
+        self._f.write(struct.pack('<Q', len(trailer)))
+        self._f.close()
+        os.replace(self.path + '.tmp', self.path)
+
+    def abort(self):
+        self._f.close()
+        os.remove(self.path + '.tmp')
+
+class EncodedCorpus:
+    """Iterable of (x, y) decoded from an encoded corpus file. Decoding is
+    list indexing of idx2feature and labels, so no string is created.
+
+    :param str path: cache file path
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(magic)) != magic:
+                raise ValueError('{} is not an encoded crf_postagger corpus'.format(path))
+            f.seek(-8, os.SEEK_END)
+            trailer_len, = struct.unpack('<Q', f.read(8))
+            f.seek(-8 - trailer_len, os.SEEK_END)
+            self._end = f.tell()
+            trailer = json.loads(f.read(trailer_len).decode('utf-8'))
+        self.signature = trailer['signature']
+        self.idx2feature = trailer['idx2feature']
+        self.feature_counts = trailer['feature_counts']
+        self.labels = trailer['labels']
+        self.num_sent = trailer['num_sent']
+
+    def __len__(self):
+        return self.num_sent
+
+    def __iter__(self):
+        idx2feature = self.idx2feature
+        labels = self.labels
+        with open(self.path, 'rb') as f:
+            f.seek(len(magic))
+            while f.tell() < self._end:
+                length, = struct.unpack('<I', f.read(4))
+                record = array('I', f.read(4 * length))
+                if sys.byteorder == 'big':
+                    record.byteswap()
+                x, y = [], []
+                b = 1
+                for _ in range(record[0]):
+                    y.append(labels[record[b]])
+                    n_features = record[b + 1]
+                    b += 2
+                    x.append([idx2feature[i] for i in record[b: b + n_features]])
+                    b += n_features
+                yield x, y
+
+def load_encoded_corpus(path, signature):
+    """It returns EncodedCorpus if path exists and was encoded from data of
+    same signature, otherwise None"""
+
+    if (signature is None) or not os.path.exists(path):
+        return None
+    try:
+        corpus = EncodedCorpus(path)
+    except (ValueError, OSError, struct.error):
+        return None
+    if corpus.signature != signature:
+        return None
+    return corpus
@@ -1,4 +1,5 @@
 from ._path import ford_list
+from ._path import dag_longest_path
 from ._hmm_style import HMMStyleParameter
 from ._hmm_style import HMMStyleTagger
 from ._hmm_style import HMMStyleFeatureTransformer
\ No newline at end of file
@@ -2,8 +2,8 @@ from .. import AbstractTagger
 from .. import AbstractParameter
 from .. import AbstractFeatureTransformer
 from .. import BaseFeatureTransformer
-from .. import bos, eos, unk, Eojeol, Eojeols
-from ._path import ford_list
+from .. import bos, eos, unk, Eojeols
+from ._path import dag_longest_path
 
 
 class HMMStyleTagger(AbstractTagger):
@@ -21,54 +21,90 @@ class HMMStyleTagger(AbstractTagger):
         super().__init__(parameters, feature_transformer, verbose)
 
     def tag(self, sentence, flatten=True, debug=False):
-        # generate nodes and edges
-        edges, bos_node, eos_node = self.parameters.generate(sentence)
-        nodes = {node for edge in edges for node in edge[:2]}
-
-        # add transition score
-        edges = _hmm_style_tagger_weight(
-            edges, self.parameters, self._a_syllable_penalty, self._noun_preference)
-
-        # debug
-        if debug:
-            for from_, to_, score in edges:
-                print('from : {}'.format(from_))
-                print('to   : {}'.format(to_))
+        stats = self.stats
+        if stats is not None:
+            stats.begin()
+
+        # generate nodes
+        lattice, chars, bos_node, eos_node = self.parameters.generate_begin_index(sentence)
+
+        if stats is not None:
+            stats.lap('generate')
+            stats.count('nodes', len(lattice) - 2)
+            stats.count('lemma_candidates', sum(lattice.compound))
+
+        def weight(from_, to_):
+            score = _lattice_edge_score(lattice, from_, to_, self.parameters,
+                self._a_syllable_penalty, self._noun_preference)
+            # debug
+            if debug:
+                print('from : {}'.format(lattice.eojeol(from_)))
+                print('to   : {}'.format(lattice.eojeol(to_)))
                 print('score: {}\n'.format(score))
+            return score
+
+        if stats is not None:
+            weight_ = weight
+            def weight(from_, to_):
+                stats.count('edges')
+                return weight_(from_, to_)
+
+        def unknown_node(begin):
+            return self.parameters._unknown_node(lattice, chars, begin)
 
         # find optimal path
-        list_of_eojeols, cost = ford_list(edges, nodes, bos_node, eos_node)
+        list_of_eojeols, cost = dag_longest_path(
+            lattice, bos_node, eos_node, weight, unknown_node)
+
+        if stats is not None:
+            stats.lap('search')
 
         # wrapper list of words to Eojeols
         eojeols = Eojeols(list_of_eojeols, cost)
 
         # post-processing
         if flatten:
-            poses = self._remain_only_pos(eojeols)
+            poses = self._remain_only_pos(lattice, eojeols)
         else:
-            poses = self._remain_details(eojeols)
+            poses = self._remain_details(lattice, eojeols)
+
+        if stats is not None:
+            stats.lap('postprocess')
+            stats.end(sentence)
 
         return [poses, cost]
 
+def _hmm_style_edge_score(from_, to_, parameters, _a_syllable_penalty, _noun_preference):
+    #score = parameters.transitions.get((from_.last_tag, to_.first_tag), 0) + to_.eojeol_score
+    score = parameters.transitions.get((from_.last_tag, to_.first_tag), 0) + from_.eojeol_score + to_.eojeol_score
+    if len(to_.first_word) == 1:
+        score += _a_syllable_penalty
+    elif to_.first_tag == 'Noun':
+        score += _noun_preference
+    #if not (to_.first_word == to_.last_tag):
+    #    score += get_transition(to_.first_tag, to_.last_tag)
+    return score
+
+def _lattice_edge_score(lattice, from_, to_, parameters, _a_syllable_penalty, _noun_preference):
+    # same as _hmm_style_edge_score, with lattice nodes
+    score = (parameters.transitions.get((lattice.last_tag[from_], lattice.first_tag[to_]), 0)
+             + lattice.score[from_] + lattice.score[to_])
+    if len(lattice.first_word[to_]) == 1:
+        score += _a_syllable_penalty
+    elif lattice.first_tag[to_] == 'Noun':
+        score += _noun_preference
+    return score
+
 def _hmm_style_tagger_weight(edges, parameters, _a_syllable_penalty, _noun_preference):
-    def get_transition(f, t):
-        return parameters.transitions.get((f, t), 0)
-
-    def get_score(from_, to_):
-        #score = get_transition(from_.last_tag, to_.first_tag) + to_.eojeol_score
-        score = get_transition(from_.last_tag, to_.first_tag) + from_.eojeol_score + to_.eojeol_score
-        if len(to_.first_word) == 1:
-            score += _a_syllable_penalty
-        elif to_.first_tag == 'Noun':
-            score += _noun_preference
-        #if not (to_.first_word == to_.last_tag):
-        #    score += get_transition(to_.first_tag, to_.last_tag)
-        return score
-    return [(from_, to_, get_score(from_, to_)) for from_, to_ in edges]
+    return [(from_, to_, _hmm_style_edge_score(from_, to_, parameters, _a_syllable_penalty, _noun_preference))
+            for from_, to_ in edges]
 
 class HMMStyleFeatureTransformer(AbstractFeatureTransformer):
-    def __init__(self):
-        super().__init__()
+
+    templates = ['x[0]=%s']
+
+    def __init__(self, hashed=False, vocabulary=None):
+        super().__init__(hashed, vocabulary)
 
     def to_feature(self, words_, tags_, i):
         features = [
@@ -76,65 +112,88 @@ class HMMStyleFeatureTransformer(AbstractFeatureTransformer):
         ]
         return features
 
+    def to_feature_ids(self, w, t, i):
+        return [w[i] << 4]
+
+    def to_feature_keys(self, w, t, i):
+        return ((0, w[i]),)
+
 class HMMStyleParameter(AbstractParameter):
     def __init__(self, model_path=None, pos2words=None, preanalyzed_eojeols=None,
-        max_word_len=0, parameter_marker=' -> ', unknown_penalty=-0.1):
+        max_word_len=0, parameter_marker=' -> ', unknown_penalty=-0.1,
+        lemma_cache_size=100000, eojeol_cache_size=10000, index_cache=False):
 
         super().__init__(model_path, pos2words,
-            preanalyzed_eojeols, max_word_len, parameter_marker, unknown_penalty)
+            preanalyzed_eojeols, max_word_len, parameter_marker, unknown_penalty,
+            lemma_cache_size, eojeol_cache_size, index_cache)
+
+    def generate_begin_index(self, sentence):
+        """It returns the lattice of sentence with the begin and end nodes.
+        The end node is indexed at the end of sentence. If the sentence
+        does not begin with a known word, an unknown word is added at 0."""
 
-    def generate(self, sentence):
         # prepare lookup list
         chars = sentence.replace(' ','')
-        sent = self._sentence_lookup(sentence)
-        n_char = len(sent) + 1
+        lattice = self._sentence_lookup(sentence)
+        n_char = len(chars) + 1
 
         # add end node
-        eos_node = Eojeol(eos, eos, None, eos, None, n_char-1, n_char, 0, 0, 0)
-        sent.append([eos_node])
+        eos_node = lattice.add(eos, None, eos, None, n_char-1, n_char, 0, pos=eos)
 
         # check first word position
-        nonempty_first = self._get_nonempty_first(sent, n_char)
-        if nonempty_first > 0:
-            # (pos, first_word, last_word, first_tag, last_tag, begin, end, eojeol_score, compound, unknown)
-            word = chars[:nonempty_first]
-            sent[0] = [Eojeol(word, word, word, unk, unk, 0, nonempty_first, 0, unknown_penalty, 1)]
+        if not lattice.begin_index[0]:
+            self._unknown_node(lattice, chars, 0, indexed=True)
+
+        bos_node = lattice.add(None, bos, None, bos, 0, 0, 0, indexed=False, pos=bos)
+        return lattice, chars, bos_node, eos_node
+
+    def generate(self, sentence):
+        # edge list of Eojeols for ford_list. HMMStyleTagger decodes the lattice directly
+        lattice, chars, bos_node, eos_node = self.generate_begin_index(sentence)
 
         # add link between adjacent nodes
-        edges = self._link_adjacent_nodes(sent, chars, n_char)
+        edges = self._link_adjacent_nodes(lattice, chars)
 
         # add link from unk node
-        edges = self._link_from_unk_nodes(edges, sent)
+        edges = self._link_from_unk_nodes(edges, lattice)
 
-        bos_node = Eojeol(bos, None, bos, None, bos, 0, 0, 0, 0, 0)
-        for word in sent[0]:
-            edges.append((bos_node, word))
-        edges = sorted(edges, key=lambda x:(x[0].begin, x[1].end))
+        for node in lattice.begin_index[0]:
+            edges.append((bos_node, node))
+        edges = sorted(edges, key=lambda x:(lattice.begin[x[0]], lattice.end[x[1]]))
+        edges = [(lattice.eojeol(from_), lattice.eojeol(to_)) for from_, to_ in edges]
 
-        return edges, bos_node, eos_node
+        return edges, lattice.eojeol(bos_node), lattice.eojeol(eos_node)
 
-    def _get_nonempty_first(self, sent, end, offset=0):
+    def _unknown_node(self, lattice, chars, begin, indexed=False):
+        # unknown word from begin to the next position where a known word begins
+        end = self._get_nonempty_first(lattice.begin_index, len(lattice.begin_index), begin)
+        word = chars[begin:end]
+        return lattice.add(word, word, unk, unk, begin, end, self.unknown_penalty, 0, 1, indexed=indexed)
+
+    def _get_nonempty_first(self, begin_index, end, offset=0):
         for i in range(offset, end):
-            if sent[i]:
+            if begin_index[i]:
                 return i
         return offset
 
-    def _link_adjacent_nodes(self, sent, chars, n_char):
+    def _link_adjacent_nodes(self, lattice, chars):
         edges = []
-        for words in sent[:-1]:
-            for word in words:
-                if not sent[word.end]:
-                    unk_end = self._get_nonempty_first(sent, n_char, word.end)
-                    unk_word = chars[word.end:unk_end]
-                    unk_node = Eojeol(unk_word, unk_word, unk_word, unk, unk, word.end, unk_end, 0, 1)
-                    edges.append((word, unk_node))
-                for adjacent in sent[word.end]:
-                    edges.append((word, adjacent))
+        begin_index = lattice.begin_index
+        unknowns = {}
+        for b in range(len(begin_index) - 1):
+            for node in begin_index[b]:
+                end = lattice.end[node]
+                if not begin_index[end]:
+                    if not end in unknowns:
+                        unknowns[end] = self._unknown_node(lattice, chars, end)
+                    edges.append((node, unknowns[end]))
+                for adjacent in begin_index[end]:
+                    edges.append((node, adjacent))
         return edges
 
-    def _link_from_unk_nodes(self, edges, sent):
-        unk_nodes = {to_node for _, to_node in edges if to_node.last_tag == unk}
+    def _link_from_unk_nodes(self, edges, lattice):
+        unk_nodes = {to_node for _, to_node in edges if lattice.last_tag[to_node] == unk}
         for unk_node in unk_nodes:
-            for adjacent in sent[unk_node.end]:
+            for adjacent in lattice.begin_index[lattice.end[unk_node]]:
                 edges.append((unk_node, adjacent))
-        return edges
\ No newline at end of file
+        return edges
@@ -39,4 +39,56 @@ def ford_list(E, V, S, T):
         prev_ = prev[prev_]
     path.append(S)
 
-    return path[::-1], d[T]
\ No newline at end of file
+    return path[::-1], d[T]
+
+def dag_longest_path(lattice, bos_node, eos_node, weight, unknown_node):
+    """Longest path on a lattice indexed by begin offset.
+
+    Every edge goes from a node ending at i to a node beginning at i, so
+    visiting nodes in the order of begin offset is a topological order and
+    one pass finds the longest path in O(V + E).
+
+    :param Lattice lattice: lattice.begin_index[i] is the list of nodes
+        beginning at i. The last one is [eos_node]
+    :param callable weight: weight(from_node, to_node)
+    :param callable unknown_node: unknown_node(i) returns the node which
+        begins at i when begin_index[i] is empty
+    """
+
+    begin_index = lattice.begin_index
+    ends = lattice.end
+    unknowns = [[] for _ in begin_index]
+
+    def successors(node):
+        e = ends[node]
+        if begin_index[e]:
+            return begin_index[e]
+        if not unknowns[e]:
+            unknowns[e].append(unknown_node(e))
+        return unknowns[e]
+
+    # node -> (score, previous node)
+    best = {bos_node: (0, None)}
+
+    def relax(node):
+        score = best[node][0]
+        for next_node in successors(node):
+            next_score = score + weight(node, next_node)
+            previous = best.get(next_node)
+            if (previous is None) or (next_score > previous[0]):
+                best[next_node] = (next_score, node)
+
+    relax(bos_node)
+    for b in range(len(begin_index) - 1):
+        for node in begin_index[b] + unknowns[b]:
+            if node in best:
+                relax(node)
+
+    # Finding path
+    score, prev = best[eos_node]
+    path = [eos_node]
+    while prev is not None:
+        path.append(prev)
+        _, prev = best[prev]
+
+    return path[::-1], score
@@ -0,0 +1,109 @@
+from .utils import Eojeol
+
+
+class Lattice:
+    """Candidate eojeols (nodes) of a sentence in parallel lists.
+
+    Node i is first_word[i], last_word[i], first_tag[i], last_tag[i],
+    begin[i], end[i], score[i], compound[i], unknown[i] and the interned
+    ids of words and tags, as the fields of Eojeol. Adding a node appends
+    existing objects to the lists, so no object is created per node. Lists
+    are used instead of array.array, because reading an item of array
+    creates a new object every time. The pos string such as 'word/tag' is
+    built only for the nodes of the output path.
+
+    begin_index[b] is the list of nodes beginning at b, for b in
+    [0, n_char]. Nodes added with indexed=False, such as begin and end
+    nodes, are not in begin_index.
+    """
+
+    def __init__(self, n_char=0):
+        self.n_char = n_char
+        self.begin_index = [[] for _ in range(n_char + 1)]
+        self.first_word = []
+        self.last_word = []
+        self.first_tag = []
+        self.last_tag = []
+        self.begin = []
+        self.end = []
+        self.score = []
+        self.compound = []
+        self.unknown = []
+        self.first_word_id = []
+        self.last_word_id = []
+        self.first_tag_id = []
+        self.last_tag_id = []
+        # node -> pos, of the nodes whose pos is not 'word/tag' format
+        self._pos = {}
+
+    def __len__(self):
+        return len(self.begin)
+
+    def add(self, first_word, last_word, first_tag, last_tag, begin, end, score,
+        compound=0, unknown=0, first_word_id=0, last_word_id=0, first_tag_id=0,
+        last_tag_id=0, indexed=True, pos=None):
+        """It returns the id of added node"""
+
+        node = len(self.begin)
+        self.first_word.append(first_word)
+        self.last_word.append(last_word)
+        self.first_tag.append(first_tag)
+        self.last_tag.append(last_tag)
+        self.begin.append(begin)
+        self.end.append(end)
+        self.score.append(score)
+        self.compound.append(compound)
+        self.unknown.append(unknown)
+        self.first_word_id.append(first_word_id)
+        self.last_word_id.append(last_word_id)
+        self.first_tag_id.append(first_tag_id)
+        self.last_tag_id.append(last_tag_id)
+        if indexed:
+            self.begin_index[begin].append(node)
+        if pos is not None:
+            self._pos[node] = pos
+        return node
+
+    def extend(self, other, offset=0):
+        """It appends the nodes of other lattice, shifted by offset"""
+
+        base = len(self.begin)
+        self.first_word += other.first_word
+        self.last_word += other.last_word
+        self.first_tag += other.first_tag
+        self.last_tag += other.last_tag
+        self.begin += [b + offset for b in other.begin]
+        self.end += [e + offset for e in other.end]
+        self.score += other.score
+        self.compound += other.compound
+        self.unknown += other.unknown
+        self.first_word_id += other.first_word_id
+        self.last_word_id += other.last_word_id
+        self.first_tag_id += other.first_tag_id
+        self.last_tag_id += other.last_tag_id
+        for b, nodes in enumerate(other.begin_index):
+            if nodes:
+                self.begin_index[b + offset] += [node + base for node in nodes]
+        for node, pos in other._pos.items():
+            self._pos[node + base] = pos
+
+    def pos(self, node):
+        pos = self._pos.get(node)
+        if pos is not None:
+            return pos
+        if self.compound[node]:
+            return '%s/%s + %s/%s' % (self.first_word[node], self.first_tag[node],
+                self.last_word[node], self.last_tag[node])
+        return self.first_word[node] + '/' + self.first_tag[node]
+
+    def eojeol(self, node):
+        """Eojeol of the node"""
+        return Eojeol(self.pos(node), self.first_word[node], self.last_word[node],
+            self.first_tag[node], self.last_tag[node], self.begin[node], self.end[node],
+            self.score[node], self.compound[node], self.unknown[node],
+            self.first_word_id[node], self.last_word_id[node],
+            self.first_tag_id[node], self.last_tag_id[node])
+
+    def as_begin_index(self):
+        """List of Eojeols beginning at each offset"""
+        return [[self.eojeol(node) for node in nodes] for nodes in self.begin_index]
@@ -1,30 +1,90 @@
 from collections import defaultdict
+from contextlib import contextmanager
+import gc
+import os
 import re
 import json
 
-from .utils import bos, eos, unk, Eojeol
+from .utils import bos, eos, unk
+from .utils import LRUCache
+from .lattice import Lattice
 from .lemmatizer import lemma_candidate
+from .binary import is_binary_model
+from .binary import load_binary
 from .trainer import Feature
+from .trie import Trie
 
 doublespace_pattern = re.compile(u'\s+', re.UNICODE)
+# increase when the derived index or the format of index cache changes
+index_cache_version = 2
+# lemmatization depends on only these dictionaries
+lemma_tags = {'Verb', 'Adjective', 'Eomi', 'Noun'}
+# tags of lemma nodes. their morphemes may not be substrings of eojeols
+lemma_node_tags = lemma_tags | {'Josa'}
 
 class AbstractParameter:
+    _features = None
+    _feature_counts = None
+    # feature tables of subclasses, {tag: {key: coef}}, stored in index cache
+    _index_tables = ()
+
     def __init__(self, model_path=None, pos2words=None, preanalyzed_eojeols=None,
-        max_word_len=0, parameter_marker=' -> ', unknown_penalty=-0.1):
+        max_word_len=0, parameter_marker=' -> ', unknown_penalty=-0.1,
+        lemma_cache_size=100000, eojeol_cache_size=10000, index_cache=False):
+        """If index_cache is True (or a path), the normalized coefficients and
+        the structures derived from the model (dictionary and the feature
+        tables of subclasses) are stored as JSON in a sidecar file,
+        model_path + '.index' by default, keyed by the size and the
+        modification time of the model file. Later loading of the same model
+        reads only the sidecar file, without parsing the model and deriving
+        the structures. It is used only when pos2words is not given."""
 
         self.pos2words = pos2words
         self.max_word_len = max_word_len
         self.unknown_penalty = unknown_penalty
-
-        if model_path:
-            self._load_from_json(model_path, parameter_marker)
-
-        if not pos2words:
-            self._construct_dictionary_from_state_features()
+        # integer ids of words and tags. filled by compiled parameters
+        self._word2id = {}
+        self._tag2id = {}
+        # surface substring -> ((stem, ending, stem tag, ending tag), ...)
+        self._lemma_cache = LRUCache(lemma_cache_size)
+        # (eojeol, guess_tag) -> _word_lookup(eojeol, guess_tag)
+        self._eojeol_cache = LRUCache(eojeol_cache_size)
+
+        cache_path, cache_key, index = None, None, None
+        if model_path and index_cache and not pos2words:
+            cache_path = index_cache if isinstance(index_cache, str) else model_path + '.index'
+            stat = os.stat(model_path)
+            cache_key = {
+                'version': index_cache_version,
+                'class': self.__class__.__qualname__,
+                'model': os.path.abspath(model_path),
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'parameter_marker': parameter_marker
+            }
+            index = _load_index_cache(cache_path, cache_key)
+
+        if index is not None:
+            self._set_index(index)
+        else:
+            if model_path and is_binary_model(model_path):
+                self._load_from_binary(model_path)
+            elif model_path:
+                self._load_from_json(model_path, parameter_marker)
+
+            if not pos2words:
+                self._construct_dictionary_from_state_features()
+
+            self._derive_features()
+
+            if cache_path:
+                _save_index_cache(cache_path, cache_key, self._index())
 
         if self.max_word_len == 0:
             self._check_max_word_len()
 
+        self._build_dictionary_index()
+
         if not preanalyzed_eojeols:
             preanalyzed_eojeols = {}
         self.preanalyzed_eojeols = preanalyzed_eojeols
@@ -34,8 +94,13 @@ class AbstractParameter:
         return self.generate(sentence)
 
     def generate(self, sentence, guess_tag=False):
+        """It returns Lattice of the candidate eojeols of sentence"""
         return self._sentence_lookup(sentence, guess_tag)
 
+    def _derive_features(self):
+        # subclasses build their feature tables from state_features
+        pass
+
     def _check_max_word_len(self):
         if not self.pos2words:
             raise ValueError('pos2words should not be empty')
@@ -43,43 +108,195 @@ class AbstractParameter:
             max(len(word) for word in words) for words in self.pos2words.values())
 
     def _sentence_lookup(self, sentence, guess_tag=False):
-        sentence = doublespace_pattern.sub(' ', sentence)
-        sent = []
-        for eojeol in sentence.split():
-            sent += self._word_lookup(eojeol, len(sent), guess_tag)
-        return sent
-
-    def _word_lookup(self, eojeol, offset=0, guess_tag=False):
+        eojeols = doublespace_pattern.sub(' ', sentence).split()
+        lattice = Lattice(sum(len(eojeol) for eojeol in eojeols))
+        offset = 0
+        for eojeol in eojeols:
+            lattice.extend(self._cached_word_lookup(eojeol, guess_tag), offset)
+            offset += len(eojeol)
+        return lattice
+
+    def _cached_word_lookup(self, eojeol, guess_tag=False):
+        # cached lattice begins at offset 0. it should not be modified
+        key = (eojeol, guess_tag)
+        lattice = self._eojeol_cache.get(key)
+        if lattice is None:
+            lattice = self._word_lookup(eojeol, guess_tag)
+            self._eojeol_cache[key] = lattice
+        return lattice
+
+    def _word_lookup(self, eojeol, guess_tag=False):
         n = len(eojeol)
-        pos = [[] for _ in range(n)]
+        lattice = Lattice(n)
+        add = lattice.add
         for b in range(n):
-            for r in range(1, self.max_word_len+1):
-                e = b+r
-                if e > n:
-                    continue
+            # all dictionary words begin at b, found by one trie scan
+            known = dict(self._trie.prefixes(eojeol, b))
+            for e in range(b+1, min(n, b+self.max_word_len)+1):
                 sub = eojeol[b:e]
+                wid = self._word2id.get(sub, 0)
 
-                # Eojeol(pos, first_word, last_word, first_tag, last_tag, begin, end, eojeol_score, compound, unknown)
-                tag_scores = self._get_tag_score(sub)
+                # (first_word, last_word, first_tag, last_tag, begin, end, eojeol_score, compound, unknown, ids)
+                tag_scores = known.get(e)
 
                 # when substring is known word
                 if tag_scores:
                     for tag, score in tag_scores:
-                        pos[b].append(Eojeol(sub+'/'+tag, sub, sub, tag, tag, b+offset, e+offset, score, 0, 0))
+                        tid = self._tag2id.get(tag, 0)
+                        add(sub, sub, tag, tag, b, e, score, 0, 0, wid, wid, tid, tid)
                 # when substring is unknown substring
                 elif guess_tag:
                     for tag, score in self._guess_tag(sub, b, e, eojeol):
-                        pos[b].append(Eojeol(sub+'/'+tag, sub, sub, tag, tag, b+offset, e+offset, score, 0, 1))
+                        tid = self._tag2id.get(tag, 0)
+                        add(sub, sub, tag, tag, b, e, score, 0, 1, wid, wid, tid, tid)
 
                 # check whether substring is predicator
-                for word_form_lemma in self._add_lemmas(sub, b, e, offset):
-                    pos[b].append(word_form_lemma)
+                self._add_lemmas(lattice, sub, b, e)
+
+        return lattice
 
-        return pos
+    def _add_node(self, lattice, first_word, last_word, first_tag, last_tag,
+        begin, end, score, compound=0, unknown=0, indexed=True, pos=None):
+        # node with interned ids, which is not created by _word_lookup
+        return lattice.add(first_word, last_word, first_tag, last_tag,
+            begin, end, score, compound, unknown,
+            self._word2id.get(first_word, 0), self._word2id.get(last_word, 0),
+            self._tag2id.get(first_tag, 0), self._tag2id.get(last_tag, 0),
+            indexed, pos)
 
     def _get_tag_score(self, word):
-        # return (word, word score)
-        return tuple((tag, words[word]) for tag, words in self.pos2words.items() if word in words)
+        # return ((tag, word score), ...)
+        return self._word_tags.get(word, ())
+
+    def _build_dictionary_index(self):
+        # inverted index, word -> ((tag, score), ...)
+        word_tags = defaultdict(lambda: [])
+        for tag, words in self.pos2words.items():
+            for word, score in words.items():
+                word_tags[word].append((tag, score))
+        self._word_tags = {
+            word: tuple(tag_scores) for word, tag_scores in word_tags.items()}
+        # trie shares the (tag, score) tuples of the inverted index
+        self._trie = Trie(self._word_tags.items())
+
+    def _update_dictionary_index(self, words):
+        for word in words:
+            tag_scores = tuple((tag, words_[word]) for tag, words_
+                               in self.pos2words.items() if word in words_)
+            self._word_tags[word] = tag_scores
+            self._trie[word] = tag_scores
+
+    def add_user_dictionary(self, tag, word_score):
+        return self.add_words((word, tag, score) for word, score in word_score.items())
+
+    def remove_user_dictionary(self, tag, words):
+        return self.remove_words((word, tag) for word in words)
+
+    def load_user_dictionary(self, path, default_score=1, remove=False):
+        """It adds (or removes, if remove=True) the words of a TSV file,
+        'word<TAB>tag[<TAB>score]' per line, read by read_user_dictionary.
+
+        :returns: number of added (or removed) words
+        """
+        entries = read_user_dictionary(path, default_score)
+        if remove:
+            return self.remove_words((word, tag) for word, tag, _ in entries)
+        return self.add_words(entries)
+
+    def add_words(self, entries):
+        """It adds iterable of (word, tag, score) to the dictionary. The
+        dictionary index and max_word_len are updated for each word, and
+        the cached candidates which may contain the words are evicted. If
+        max_word_len grows, all cached candidates are cleared.
+
+        :returns: number of added words
+        """
+        tag_order = {tag: i for i, tag in enumerate(self.pos2words)}
+        changed, changed_tags = set(), set()
+        max_word_len = self.max_word_len
+        try:
+            with _paused_gc():
+                for word, tag, score in entries:
+                    words = self.pos2words.get(tag)
+                    if words is None:
+                        raise ValueError('{} tag does not exist in model'.format(tag))
+                    if not word:
+                        continue
+                    words[word] = score
+                    # keep tag order of _build_dictionary_index
+                    tag_scores = self._word_tags.get(word, ())
+                    if tag_scores:
+                        tag_scores = tuple(sorted(
+                            [ts for ts in tag_scores if ts[0] != tag] + [(tag, score)],
+                            key=lambda ts: tag_order[ts[0]]))
+                    else:
+                        tag_scores = ((tag, score),)
+                    self._word_tags[word] = tag_scores
+                    self._trie[word] = tag_scores
+                    if len(word) > self.max_word_len:
+                        self.max_word_len = len(word)
+                    changed.add(word)
+                    changed_tags.add(tag)
+        finally:
+            # words added before an error remain, so caches are updated anyway
+            if self.max_word_len > max_word_len:
+                # cached candidates were found with shorter substrings
+                self._lemma_cache.clear()
+                self._eojeol_cache.clear()
+            else:
+                self._evict_cached_words(changed, changed_tags)
+        return len(changed)
+
+    def remove_words(self, entries):
+        """It removes iterable of (word, tag) from the dictionary. Words not
+        in the dictionary are ignored. max_word_len is not decreased.
+
+        :returns: number of removed words
+        """
+        changed, changed_tags = set(), set()
+        with _paused_gc():
+            for word, tag in entries:
+                words = self.pos2words.get(tag)
+                if not words or not (word in words):
+                    continue
+                del words[word]
+                tag_scores = tuple(ts for ts in self._word_tags[word] if ts[0] != tag)
+                if tag_scores:
+                    self._word_tags[word] = tag_scores
+                    self._trie[word] = tag_scores
+                else:
+                    del self._word_tags[word]
+                    del self._trie[word]
+                changed.add(word)
+                changed_tags.add(tag)
+        self._evict_cached_words(changed, changed_tags)
+        return len(changed)
+
+    def _evict_cached_words(self, words, tags):
+        if not words:
+            return
+        if tags & lemma_tags:
+            self._lemma_cache.clear()
+        # lemma nodes are not substrings of eojeols, so they can not be checked
+        preanalyzed_tags = {tag for lemmas in self.preanalyzed_eojeols.values()
+                            for lemma in lemmas for tag in lemma[2:]}
+        if tags & (lemma_node_tags | preanalyzed_tags):
+            self._eojeol_cache.clear()
+            return
+        # the cost is proportional to the cache size, not the number of words
+        max_len = max(len(word) for word in words)
+        for key in self._eojeol_cache.keys():
+            eojeol = key[0]
+            n = len(eojeol)
+            if any(eojeol[b:e] in words for b in range(n)
+                   for e in range(b + 1, min(n, b + max_len) + 1)):
+                self._eojeol_cache.pop(key)
+
+    def lemma_cache_stats(self):
+        return self._lemma_cache.stats()
+
+    def eojeol_cache_stats(self):
+        return self._eojeol_cache.stats()
 
     def _guess_tag(self, sub, b, e, eojeol):
         return [
@@ -91,36 +308,34 @@ class AbstractParameter:
             (unk, self.unknown_penalty)
         ]
 
-    def _add_lemmas(self, sub, b, e, offset):
+    def _add_lemmas(self, lattice, sub, b, e):
 
         def get_score(word, tag):
             return self.pos2words.get(tag, {}).get(word, 0)
 
-        def as_eojeol(l_morph, r_morph, l_tag, r_tag, b, e, offset):
-            eojeol = Eojeol(
-                '%s/%s + %s/%s' %  (l_morph, l_tag, r_morph, r_tag),
-                l_morph, r_morph, l_tag, r_tag, b + offset, e + offset,
-                get_score(l_morph, l_tag) + get_score(r_morph, r_tag), 1, 0
-            )
-            return eojeol
-
         # check pre-analyzed lemmas
-        lemmas = self.preanalyzed_eojeols.get(sub, [])
+        lemmas = self.preanalyzed_eojeols.get(sub)
 
         # if sub is unseen string
         if not lemmas:
-            for i in range(1, min(self.max_word_len, len(sub)) + 1):
-                try:
-                    for lemma in self._lemmatize(sub, i):
-                        lemmas.append(lemma)
-                except Exception as e:
-                    continue
+            lemmas = self._lemma_cache.get(sub)
+            if lemmas is None:
+                lemmas = self._lemmatize_all(sub)
+                self._lemma_cache[sub] = lemmas
 
-        # formatting
-        lemmas = [as_eojeol(l_morph, r_morph, l_tag, r_tag, b, e, offset)
-                  for l_morph, r_morph, l_tag, r_tag in lemmas]
+        for l_morph, r_morph, l_tag, r_tag in lemmas:
+            self._add_node(lattice, l_morph, r_morph, l_tag, r_tag, b, e,
+                get_score(l_morph, l_tag) + get_score(r_morph, r_tag), 1, 0)
 
-        return lemmas
+    def _lemmatize_all(self, sub):
+        lemmas = []
+        for i in range(1, min(self.max_word_len, len(sub)) + 1):
+            try:
+                for lemma in self._lemmatize(sub, i):
+                    lemmas.append(lemma)
+            except Exception as e:
+                continue
+        return tuple(lemmas)
 
     def _lemmatize(self, word, i):
         l = word[:i]
@@ -152,23 +367,77 @@ class AbstractParameter:
             for feature, coef in model['state_features'].items()
         }
 
-        # weight normalize. [-1, 1]
-        max_value = max(abs(coef) for coef in self.transitions.values())
-        max_value = max(max_value, max(abs(coef) for coef in self.state_features.values()))
-        self.transitions = {key:coef/max_value for key, coef in self.transitions.items()}
-        self.state_features = {key:coef/max_value for key, coef in self.state_features.items()}
+        self._normalize_coefficients()
 
         # get idx2features
         self.idx2feature = model['idx2feature']
 
         # parse feature information map
-        self.features = {
+        self._features = {
             feature: Feature(idx, count)
             for feature, (idx, count) in model['features'].items()
         }
 
         del model
 
+    def _load_from_binary(self, binary_path):
+        with load_binary(binary_path) as model:
+            self.transitions = model.transitions()
+            self.state_features = model.state_features()
+            self.idx2feature = model.idx2feature()
+            # features map is used only for training. build it when requested
+            self._feature_counts = model.feature_counts()
+        self._normalize_coefficients()
+
+    def _normalize_coefficients(self):
+        # weight normalize. [-1, 1]
+        max_value = max(abs(coef) for coef in self.transitions.values())
+        max_value = max(max_value, max(abs(coef) for coef in self.state_features.values()))
+        self.transitions = {key:coef/max_value for key, coef in self.transitions.items()}
+        self.state_features = {key:coef/max_value for key, coef in self.state_features.items()}
+
+    @property
+    def features(self):
+        if self._features is None and self._feature_counts is not None:
+            self._features = {
+                feature: Feature(idx, count) for idx, (feature, count)
+                in enumerate(zip(self.idx2feature, self._feature_counts))
+            }
+            self._feature_counts = None
+        return self._features
+
+    def _index(self):
+        # coefficients and derived structures as JSON. tuple keys become rows of [*key, coef]
+        def rows(table):
+            return [[*key, coef] for key, coef in table.items()]
+
+        if self._feature_counts is not None:
+            feature_counts = self._feature_counts
+        else:
+            feature_counts = [self._features[feature].count for feature in self.idx2feature]
+        return {
+            'transitions': rows(self.transitions),
+            'state_features': rows(self.state_features),
+            'idx2feature': self.idx2feature,
+            'feature_counts': feature_counts,
+            'pos2words': self.pos2words,
+            'tables': {name: {tag: rows(table) for tag, table in getattr(self, name).items()}
+                       for name in self._index_tables}
+        }
+
+    def _set_index(self, index):
+        def table(rows):
+            return {tuple(row[:-1]): row[-1] for row in rows}
+
+        self.transitions = table(index['transitions'])
+        self.state_features = table(index['state_features'])
+        self.idx2feature = index['idx2feature']
+        # features map is built when requested
+        self._feature_counts = index['feature_counts']
+        self.pos2words = index['pos2words']
+        for name, tables in index['tables'].items():
+            setattr(self, name, {tag: table(rows) for tag, rows in tables.items()})
+
     def _construct_dictionary_from_state_features(self):
         self.pos2words = defaultdict(lambda: {})
         for (feature, tag), coef in self.state_features.items():
@@ -178,11 +447,72 @@ class AbstractParameter:
         self.pos2words = dict(self.pos2words)
 
     def _update_dictionary_with_preanalyzed_eojeols(self):
+        updated = set()
         for preanalyzeds in self.preanalyzed_eojeols.values():
             for l_morph, r_morph, l_tag, r_tag in preanalyzeds:
                 if l_tag in self.pos2words:
                     self.pos2words[l_tag][l_morph] = max(
                         0, self.pos2words[l_tag].get(l_morph, 0))
+                    updated.add(l_morph)
                 if r_tag in self.pos2words:
                     self.pos2words[r_tag][r_morph] = max(
-                        0, self.pos2words[r_tag].get(r_morph, 0))
\ No newline at end of file
+                        0, self.pos2words[r_tag].get(r_morph, 0))
+                    updated.add(r_morph)
+        self._update_dictionary_index(updated)
+        self._lemma_cache.clear()
+        self._eojeol_cache.clear()
+
+@contextmanager
+def _paused_gc():
+    # bulk insertion creates many dicts and tuples but no reference cycle,
+    # and the cyclic collector would traverse the whole dictionary repeatedly
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def read_user_dictionary(path, default_score=1, sep='\t'):
+    """It yields (word, tag, score) of each line 'word<sep>tag[<sep>score]'.
+    Empty lines and lines beginning with # are skipped."""
+
+    with open(path, encoding='utf-8') as f:
+        for i, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line[0] == '#':
+                continue
+            columns = line.split(sep)
+            try:
+                score = float(columns[2]) if len(columns) > 2 else default_score
+                yield columns[0].strip(), columns[1].strip(), score
+            except (IndexError, ValueError):
+                raise ValueError('line {} of {} is not word<TAB>tag[<TAB>score]: {}'.format(i, path, line))
+
+def _load_index_cache(path, key):
+    # the first line is the key, so a stale cache is not parsed
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            if json.loads(f.readline()) != key:
+                return None
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_index_cache(path, key, index):
+    # write and rename, so a concurrent loader never reads a partial cache
+    # the cache is optional. if it can not be written, go on without it
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(key, ensure_ascii=False) + '\n')
+            f.write(json.dumps(index, ensure_ascii=False))
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
@@ -0,0 +1,125 @@
+"""Pruning and quantization of trained models
+
+Most of state features have coefficients close to zero after training.
+prune_model removes state features whose magnitude is under a threshold,
+or keeps the top_n features of each feature template, and saves the
+model. The coefficients of binary models can be quantized to int8 or
+float16 as well. Word features (x[0]) make the dictionary of parameters,
+so they are kept by default.
+"""
+
+from collections import defaultdict
+import json
+from .binary import dequantize
+from .binary import is_binary_model
+from .binary import load_binary
+from .binary import save_binary
+from .transformer import is_word_feature
+
+def read_model(model_path, marker=' -> '):
+    """It returns state_features, transitions, idx2feature, features of
+    a JSON or binary model, without normalization of coefficients"""
+
+    if is_binary_model(model_path):
+        with load_binary(model_path) as model:
+            idx2feature = model.idx2feature()
+            features = {feature: (idx, count) for idx, (feature, count)
+                        in enumerate(zip(idx2feature, model.feature_counts()))}
+            return model.state_features(), model.transitions(), idx2feature, features
+
+    with open(model_path, encoding='utf-8') as f:
+        model = json.load(f)
+    state_features = {tuple(key.split(marker)): coef for key, coef in model['state_features'].items()}
+    transitions = {tuple(key.split(marker)): coef for key, coef in model['transitions'].items()}
+    return state_features, transitions, model['idx2feature'], model['features']
+
+def template_of(feature):
+    """'x[-1:0]=이-것, y[-1]=Noun' -> 'x[-1:0], y[-1]'"""
+    return ', '.join(part.split('=', 1)[0] for part in feature.split(', '))
+
+def prune_features(state_features, threshold=0, top_n=0, keep_words=True):
+    """
+    :param dict state_features: {(feature, tag): coef}
+    :param float threshold: minimum |coef| / max |coef|. Parameters use
+        coefficients normalized by max |coef|
+    :param int top_n: if positive, top_n (feature, tag) of largest |coef| are kept for each template
+    :param bool keep_words: if True, word features (x[0]) are not pruned
+    :returns: pruned state_features
+    """
+
+    max_coef = max((abs(coef) for coef in state_features.values()), default=0) or 1
+    kept = {key: coef for key, coef in state_features.items()
+            if abs(coef) / max_coef >= threshold or (keep_words and is_word_feature(key[0]))}
+
+    if top_n > 0:
+        templates = defaultdict(lambda: [])
+        for key, coef in kept.items():
+            if not (keep_words and is_word_feature(key[0])):
+                templates[template_of(key[0])].append((abs(coef), key))
+        for items in templates.values():
+            if len(items) > top_n:
+                for _, key in sorted(items, reverse=True)[top_n:]:
+                    del kept[key]
+    return kept
+
+def prune_model(model_path, output_path, threshold=0, top_n=0,
+    quantization=None, keep_words=True, marker=' -> '):
+    """It prunes and quantizes the model of model_path, and saves it at
+    output_path. If output_path ends with .bin, the model is saved in
+    binary format, otherwise JSON. JSON models store the coefficients as
+    they are read from a quantized binary model.
+
+    :param str quantization: None, 'int8' or 'float16'
+    :returns: number of state features (before, after)
+    """
+
+    state_features, transitions, idx2feature, features = read_model(model_path, marker)
+    pruned = prune_features(state_features, threshold, top_n, keep_words)
+
+    # features which remain in state features, in the order of idx
+    remained = {feature for feature, _ in pruned}
+    idx2feature = [feature for feature in idx2feature if feature in remained]
+    features = {feature: (idx, features[feature][1]) for idx, feature in enumerate(idx2feature)}
+
+    if output_path.endswith('.bin'):
+        save_binary(output_path, pruned, transitions, idx2feature, features, quantization)
+    else:
+        if quantization is not None:
+            pruned = dict(zip(pruned, dequantize(list(pruned.values()), quantization)))
+            transitions = dict(zip(transitions, dequantize(list(transitions.values()), quantization)))
+        params = {
+            'state_features': {marker.join(key): coef for key, coef in pruned.items()},
+            'transitions': {marker.join(key): coef for key, coef in transitions.items()},
+            'idx2feature': idx2feature,
+            'features': features
+        }
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(params, f, ensure_ascii=False, indent=2)
+
+    return len(state_features), len(pruned)
+
+def morpheme_f1(tagger, sentences):
+    """Precision, recall and f1 of (morpheme, tag) of the best paths.
+
+    :param sentences: iterable of [(word, tag), ...] such as Corpus. The
+        input of tagger is the concatenation of words
+    """
+
+    n_correct, n_pred, n_true = 0, 0, 0
+    for sentence in sentences:
+        result = tagger.tag(''.join(word for word, _ in sentence))
+        # TrigramTagger returns list of (poses, score) and HMMStyleTagger returns [poses, score]
+        poses = result[0][0] if isinstance(result[0], tuple) else result[0]
+        counter = defaultdict(int)
+        for wordpos in sentence:
+            counter[tuple(wordpos)] += 1
+        for wordpos in poses:
+            if counter[tuple(wordpos)] > 0:
+                counter[tuple(wordpos)] -= 1
+                n_correct += 1
+        n_pred += len(poses)
+        n_true += len(sentence)
+    precision = n_correct / max(1, n_pred)
+    recall = n_correct / max(1, n_true)
+    f1 = 2 * precision * recall / max(1e-12, precision + recall)
+    return {'precision': precision, 'recall': recall, 'f1': f1}
@@ -0,0 +1,404 @@
+"""Asyncio tagging server with dynamic micro-batching
+
+    python -m crf_postagger.server --model_path model.json --port 8470
+    python -m crf_postagger.server --model_path model.json --unix_path /tmp/tagger.sock
+
+tag is synchronous CPU work, so TaggingServer runs it in worker processes
+which hold the loaded parameters, and the event loop only queues requests.
+Queued sentences are grouped into a micro-batch until max_batch_size
+sentences are gathered or max_delay seconds have passed since the first
+one, and the batch is sent to a worker at once. The queue is bounded by
+max_queue; when it is full, requests are rejected with 'overloaded'
+instead of growing the queue. A request which is not tagged in timeout
+seconds returns 'timeout', and it is dropped from its batch if the batch
+has not been dispatched yet. A sentence which raises an error fails only
+its own request. If the worker pool breaks, for example when a worker is
+killed, the requests of the broken batches fail and the pool is restarted.
+
+Web apps on asyncio can embed the server and await TaggingServer.tag
+without a socket. The socket protocol is a JSON object per line.
+
+    {"id": 0, "sentence": "..."}   -> {"id": 0, "poses": [[word, tag], ...], "score": float}
+                                      {"id": 0, "error": "timeout" | "overloaded" | ...}
+    {"op": "health"}               -> {"status": "ok", "queue": int}
+    {"op": "stats"}                -> counters, batch sizes and latency percentiles
+
+Responses of a connection are written as soon as they are tagged, so they
+may be out of request order; id is returned as it was given. A line longer
+than max_line_size bytes is skipped with {"error": "request too long"}.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from .tagger import _set_worker_tagger
+from .tagger import _tag_chunk
+
+
+class Overloaded(Exception):
+    pass
+
+class TaggingServer:
+    """
+    :param AbstractTagger tagger: tagger with loaded parameters
+    :param int n_jobs: number of worker processes. If 0, batches are tagged
+        by a thread of the server process
+    :param int max_batch_size: maximum number of sentences in a batch
+    :param float max_delay: seconds to wait for more sentences after the
+        first sentence of a batch arrives
+    :param int max_queue: maximum number of queued sentences
+    :param float timeout: default seconds of a request. None means no limit
+    :param int max_inflight: maximum number of dispatched batches. Default is 2 * n_jobs
+    :param int max_line_size: maximum bytes of a request line of socket
+    :param tag_kwargs: arguments of tagger.tag, such as beam_size
+    """
+
+    def __init__(self, tagger, n_jobs=1, max_batch_size=32, max_delay=0.005,
+        max_queue=1000, timeout=1.0, max_inflight=None, max_line_size=1 << 20,
+        **tag_kwargs):
+
+        self.tagger = tagger
+        self.n_jobs = n_jobs
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.max_inflight = max_inflight or 2 * max(1, n_jobs)
+        self.max_line_size = max_line_size
+        self.tag_kwargs = tag_kwargs
+
+        self._queue = None
+        self._inflight = None
+        self._executor = None
+        self._batch_task = None
+        self._servers = []
+        self._latencies = deque(maxlen=10000)
+        self._batch_sizes = deque(maxlen=1000)
+        self._counts = {'received': 0, 'completed': 0, 'rejected': 0,
+                        'timeout': 0, 'failed': 0, 'dropped': 0, 'batches': 0,
+                        'restarts': 0}
+        self._begin_time = None
+
+    async def start(self, host='127.0.0.1', port=8470, unix_path=None):
+        """It starts the worker processes and the batching loop, and listens
+        on unix_path if given, otherwise on host:port. With host=None, it
+        runs without a socket for embedding"""
+
+        if self._batch_task is None:
+            self._start_workers()
+        if unix_path is not None:
+            self._servers.append(await asyncio.start_unix_server(
+                self._handle, path=unix_path, limit=self.max_line_size))
+        elif host is not None:
+            self._servers.append(await asyncio.start_server(
+                self._handle, host, port, limit=self.max_line_size))
+        return self
+
+    def _start_workers(self):
+        if self.n_jobs > 0:
+            self._executor = self._new_executor()
+        else:
+            _set_worker_tagger(self.tagger)
+        self._queue = asyncio.Queue(self.max_queue)
+        self._inflight = asyncio.Semaphore(self.max_inflight)
+        self._begin_time = time.time()
+        self._batch_task = asyncio.get_running_loop().create_task(self._batch_loop())
+
+    def _new_executor(self):
+        if 'fork' in multiprocessing.get_all_start_methods():
+            # forked workers share the parameters copy-on-write
+            context = multiprocessing.get_context('fork')
+        else:
+            context = multiprocessing.get_context()
+        return ProcessPoolExecutor(self.n_jobs, context,
+            initializer=_set_worker_tagger, initargs=(self.tagger,))
+
+    def _restart_executor(self, executor):
+        # batches of the broken executor fail one by one, but it is restarted once
+        if executor is None or executor is not self._executor:
+            return
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._new_executor()
+        self._counts['restarts'] += 1
+
+    async def serve_forever(self):
+        await asyncio.gather(*[server.serve_forever() for server in self._servers])
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+        if self._batch_task is not None:
+            self._batch_task.cancel()
+            try:
+                await self._batch_task
+            except asyncio.CancelledError:
+                pass
+            self._batch_task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def tag(self, sentence, timeout=-1):
+        """It returns tagger.tag(sentence, **tag_kwargs).
+
+        :param float timeout: seconds. -1 means the default timeout of the server
+        :raises Overloaded: if the queue is full
+        :raises asyncio.TimeoutError: if the sentence is not tagged in timeout
+        """
+
+        if timeout == -1:
+            timeout = self.timeout
+        self._counts['received'] += 1
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((sentence, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self._counts['rejected'] += 1
+            raise Overloaded('queue is full ({} sentences)'.format(self.max_queue))
+        try:
+            # wait_for cancels the future at timeout, so batch loop skips it
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._counts['timeout'] += 1
+            raise
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                remain = deadline - loop.time()
+                if remain <= 0 and self._queue.empty():
+                    break
+                try:
+                    if remain <= 0:
+                        batch.append(self._queue.get_nowait())
+                    else:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remain))
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+
+            await self._inflight.acquire()
+            # requests timed out while waiting
+            n = len(batch)
+            batch = [request for request in batch if not request[1].done()]
+            self._counts['dropped'] += n - len(batch)
+            if not batch:
+                self._inflight.release()
+                continue
+
+            self._counts['batches'] += 1
+            self._batch_sizes.append(len(batch))
+            sentences = [sentence for sentence, _, _ in batch]
+            executor = self._executor
+            try:
+                result = loop.run_in_executor(executor, _tag_batch, sentences, self.tag_kwargs)
+            except Exception as e:
+                # submit raises when the pool is already broken
+                self._inflight.release()
+                self._fail(batch, e)
+                self._restart_executor(executor)
+                continue
+            result.add_done_callback(
+                lambda result, batch=batch, executor=executor: self._resolve(batch, result, executor))
+
+    def _resolve(self, batch, result, executor=None):
+        self._inflight.release()
+        now = time.perf_counter()
+        if result.cancelled():
+            # executor is shut down
+            for _, future, _ in batch:
+                future.cancel()
+            return
+        try:
+            results = result.result()
+        except Exception as e:
+            self._fail(batch, e)
+            if isinstance(e, BrokenProcessPool):
+                self._restart_executor(executor)
+            return
+        for (_, future, begin), (result, error) in zip(batch, results):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+                self._counts['failed'] += 1
+            else:
+                future.set_result(result)
+                self._counts['completed'] += 1
+                self._latencies.append(now - begin)
+
+    def _fail(self, batch, error):
+        self._counts['failed'] += len(batch)
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+        batch_sizes = self._batch_sizes
+        return {
+            'uptime': time.time() - self._begin_time if self._begin_time else 0,
+            'queue': self._queue.qsize() if self._queue is not None else 0,
+            'max_queue': self.max_queue,
+            'counts': dict(self._counts),
+            'mean_batch_size': sum(batch_sizes) / len(batch_sizes) if batch_sizes else 0,
+            'latency_ms': {
+                'p50': 1000 * percentile(latencies, 50),
+                'p90': 1000 * percentile(latencies, 90),
+                'p99': 1000 * percentile(latencies, 99)
+            }
+        }
+
+    async def _handle(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(response):
+            async with lock:
+                writer.write((json.dumps(response, ensure_ascii=False) + '\n').encode('utf-8'))
+                # backpressure of slow clients
+                await writer.drain()
+
+        async def handle_tag(request):
+            response = {'id': request.get('id')}
+            try:
+                result = await self.tag(request['sentence'], request.get('timeout', -1))
+                response['poses'], response['score'] = as_poses(result)
+            except asyncio.TimeoutError:
+                response['error'] = 'timeout'
+            except Overloaded:
+                response['error'] = 'overloaded'
+            except Exception as e:
+                response['error'] = repr(e)
+            await respond(response)
+
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b'\n')
+                except asyncio.IncompleteReadError as e:
+                    # last line without newline
+                    line = e.partial
+                except asyncio.LimitOverrunError:
+                    await _skip_line(reader)
+                    await respond({'error': 'request too long'})
+                    continue
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    op = request.get('op', 'tag')
+                except Exception:
+                    await respond({'error': 'invalid request'})
+                    continue
+                if op == 'tag' and isinstance(request.get('sentence'), str):
+                    task = asyncio.get_running_loop().create_task(handle_tag(request))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                elif op == 'health':
+                    await respond({'status': 'ok', 'queue': self._queue.qsize()})
+                elif op == 'stats':
+                    await respond(self.stats())
+                else:
+                    await respond({'id': request.get('id'), 'error': 'invalid request'})
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+async def _skip_line(reader):
+    # consume a line longer than the limit of reader, without buffering all of it
+    while True:
+        try:
+            await reader.readuntil(b'\n')
+            return
+        except asyncio.LimitOverrunError as e:
+            await reader.readexactly(e.consumed)
+
+def _tag_batch(sentences, kwargs):
+    # (result, error) of each sentence, so an error fails only its sentence
+    results = []
+    for sentence in sentences:
+        try:
+            results.append((_tag_chunk([sentence], kwargs)[0], None))
+        except Exception as e:
+            results.append((None, e))
+    return results
+
+def as_poses(result):
+    # TrigramTagger returns list of (poses, score) and HMMStyleTagger returns [poses, score]
+    if isinstance(result[0], tuple):
+        return result[0]
+    return result[0], result[1]
+
+def percentile(values, p):
+    if not values:
+        return 0
+    return values[int(round(p / 100 * (len(values) - 1)))]
+
+def main():
+    from .hmm_style import HMMStyleParameter
+    from .hmm_style import HMMStyleTagger
+    from .trigram import TrigramParameter
+    from .trigram import TrigramTagger
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_path', type=str, required=True, help='trained JSON or binary model path')
+    parser.add_argument('--model_type', type=str, default='trigram', choices=['trigram', 'hmm_style'])
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8470)
+    parser.add_argument('--unix_path', type=str, default=None, help='listen on unix socket instead of TCP')
+    parser.add_argument('--n_jobs', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--max_batch_size', type=int, default=32)
+    parser.add_argument('--max_delay_ms', type=float, default=5, help='batching delay after the first sentence')
+    parser.add_argument('--max_queue', type=int, default=1000, help='requests over it are rejected')
+    parser.add_argument('--timeout', type=float, default=1.0, help='seconds of a request')
+    parser.add_argument('--max_line_size', type=int, default=1 << 20, help='maximum bytes of a request line')
+    parser.add_argument('--beam_size', type=int, default=5, help='used only in trigram tagger')
+    parser.add_argument('--guess_tag', dest='guess_tag', action='store_true', help='used only in trigram tagger')
+    parser.add_argument('--compiled', dest='compiled', action='store_true', help='used only in trigram tagger')
+    parser.add_argument('--index_cache', dest='index_cache', action='store_true', help='store derived index next to the model')
+
+    args = parser.parse_args()
+
+    if args.model_type == 'trigram':
+        tagger = TrigramTagger(TrigramParameter(args.model_path,
+            compiled=args.compiled, index_cache=args.index_cache))
+        tag_kwargs = {'beam_size': args.beam_size, 'guess_tag': args.guess_tag}
+    else:
+        tagger = HMMStyleTagger(HMMStyleParameter(args.model_path, index_cache=args.index_cache))
+        tag_kwargs = {}
+
+    server = TaggingServer(tagger, args.n_jobs, args.max_batch_size,
+        args.max_delay_ms / 1000, args.max_queue, args.timeout,
+        max_line_size=args.max_line_size, **tag_kwargs)
+
+    async def serve():
+        await server.start(args.host, args.port, args.unix_path)
+        print('[CRF tagger] serving on {}'.format(
+            args.unix_path or '{}:{}'.format(args.host, args.port)))
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
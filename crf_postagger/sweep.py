@@ -0,0 +1,219 @@
+"""Hyperparameter sweep of Trainer
+
+Features are counted by Trainer with its scan_method, and sentences are
+written once as an encoded corpus (see crf_postagger.encoded). Every
+configuration of the grid streams the encoded corpus in a worker process,
+so neither the sentences nor their features are kept in memory. Models
+are scored by the token accuracy of pycrfsuite on a held-out split, and
+only the model of the best configuration is kept.
+"""
+
+try:
+    import pycrfsuite
+except:
+    print('Failed to import python-crfsuite')
+
+import itertools
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from .encoded import EncodedCorpus
+from .encoded import EncodedCorpusWriter
+from .trainer import Trainer
+from .trainer import _as_attributes
+from .trainer import _trim_features
+
+grid_parameters = ('l1_cost', 'l2_cost', 'min_count', 'max_iter')
+
+def parameter_grid(grid):
+    """
+    :param dict grid: {parameter: list of values}
+    :returns: list of dict, every combination of the values
+    """
+
+    unknown = set(grid) - set(grid_parameters)
+    if unknown:
+        raise ValueError('Unknown parameters {}, available {}'.format(unknown, grid_parameters))
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+class Split:
+    """Train or dev part of sentences, which can be iterated many times.
+    Each sentence is in dev with probability dev_ratio, and the sampling
+    is same for every iteration of same seed."""
+
+    def __init__(self, sentences, dev_ratio=0.1, seed=0, dev=False):
+        self.sentences = sentences
+        self.dev_ratio = dev_ratio
+        self.seed = seed
+        self.dev = dev
+
+    def __iter__(self):
+        sampler = random.Random(self.seed)
+        for sentence in self.sentences:
+            if (sampler.random() < self.dev_ratio) == self.dev:
+                yield sentence
+
+def encode(sentences, sentence_to_xy, path, min_count=1, dev_ratio=0.1,
+    seed=0, scan_method='memory', verbose=True):
+    """It counts the features of train split by Trainer with scan_method,
+    and writes every sentence as feature ids at path. Features of dev
+    sentences which are not in train split are removed.
+
+    :param sentences: iterable which can be iterated many times, such as Corpus
+    :returns: EncodedCorpus
+    """
+
+    trainer = Trainer(sentence_to_xy, min_count=min_count,
+        scan_method=scan_method, verbose=verbose)
+    trainer._set_features(trainer._scan(Split(sentences, dev_ratio, seed)))
+
+    writer = EncodedCorpusWriter(path, trainer._features)
+    if getattr(sentence_to_xy, 'hashed', False):
+        # workers decode the features with the recorded keys
+        sentence_to_xy.record_keys(trainer._features)
+    try:
+        for sentence in sentences:
+            writer.write(*sentence_to_xy(sentence))
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close({'dev_ratio': dev_ratio, 'seed': seed}, trainer._idx2feature,
+        [trainer._features[feature].count for feature in trainer._idx2feature])
+    return EncodedCorpus(path)
+
+def label_accuracy(crfsuite_path, sentences, integer=False):
+    """Token accuracy of pycrfsuite model on list of (x, y). If integer is
+    True, x is feature ids"""
+
+    tagger = pycrfsuite.Tagger()
+    tagger.open(crfsuite_path)
+    n_correct, n_tokens = 0, 0
+    for x, y in sentences:
+        if integer:
+            x = _as_attributes(x)
+        n_correct += sum(1 for pred, label in zip(tagger.tag(x), y) if pred == label)
+        n_tokens += len(y)
+    tagger.close()
+    return n_correct / max(1, n_tokens)
+
+def sweep(sentences, sentence_to_xy, grid, model_path, dev_ratio=0.1,
+    n_jobs=1, summary_path=None, seed=0, scan_method='memory', verbose=True):
+    """It trains a model for every configuration of grid, and keeps the
+    model of the best dev accuracy at model_path.
+
+    :param sentences: iterable of [(word, tag), ...] such as Corpus
+    :param dict grid: {parameter: list of values}. parameter is one of
+        l1_cost, l2_cost, min_count and max_iter. Others use Trainer default
+    :param str model_path: JSON, or binary if it ends with .bin
+    :param float dev_ratio: ratio of held-out sentences
+    :param int n_jobs: maximum number of concurrently trained models. -1 means all cores
+    :param str summary_path: if given, summary is written as tsv
+    :param str scan_method: scan_method of Trainer to count features
+    :returns: list of dict, summary of configurations sorted by accuracy
+    """
+
+    configs = parameter_grid(grid)
+    min_count = min(config.get('min_count', Trainer(sentence_to_xy, verbose=False).min_count)
+                    for config in configs)
+
+    model_dir = tempfile.mkdtemp(prefix='_sweep_', dir=os.path.dirname(os.path.abspath(model_path)))
+    extension = '.bin' if model_path.endswith('.bin') else '.json'
+
+    if n_jobs < 0:
+        n_jobs = multiprocessing.cpu_count()
+    n_jobs = max(1, min(n_jobs, len(configs)))
+
+    results = []
+    pool = None
+    try:
+        if verbose:
+            print('[CRF tagger] encode sentences')
+        corpus_path = os.path.join(model_dir, 'corpus.enc')
+        encoded = encode(sentences, sentence_to_xy, corpus_path, min_count,
+            dev_ratio, seed, scan_method, verbose)
+        if verbose:
+            print('[CRF tagger] {} sents, {} features'.format(len(encoded), len(encoded.idx2feature)))
+        del encoded
+
+        args = [(i, config, sentence_to_xy, corpus_path, model_dir, extension)
+                for i, config in enumerate(configs)]
+        if n_jobs == 1:
+            trained = map(_train_config, args)
+        else:
+            pool = multiprocessing.Pool(n_jobs)
+            trained = pool.imap_unordered(_train_config, args)
+        for result in trained:
+            results.append(result)
+            if verbose:
+                print('[CRF tagger] {}/{} configs, {}'.format(
+                    len(results), len(configs), _as_summary_line(result, grid_parameters)))
+
+        results = sorted(results, key=lambda result: -result['accuracy'])
+        best = results[0]
+        shutil.move(best['model_path'], model_path)
+        for result in results:
+            result['model_path'] = model_path if result is best else None
+    finally:
+        if pool is not None:
+            pool.terminate()
+        shutil.rmtree(model_dir, ignore_errors=True)
+
+    if summary_path:
+        write_summary(results, summary_path)
+
+    if verbose:
+        print('[CRF tagger] best {}, saved at {}'.format(
+            _as_summary_line(results[0], grid_parameters), model_path))
+
+    return results
+
+def write_summary(results, path):
+    columns = list(grid_parameters) + ['accuracy', 'train_time', 'model_size', 'model_path']
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\t'.join(columns) + '\n')
+        for result in results:
+            f.write('\t'.join(str(result[column]) for column in columns) + '\n')
+
+def _as_summary_line(result, keys):
+    return ', '.join('{}={}'.format(key, result[key]) for key in keys) + \
+        ', accuracy={:.4f}, train_time={:.1f} sec, model_size={} bytes'.format(
+            result['accuracy'], result['train_time'], result['model_size'])
+
+def _train_config(args):
+    i, config, sentence_to_xy, corpus_path, model_dir, extension = args
+    encoded = EncodedCorpus(corpus_path)
+    dev_ratio, seed = encoded.signature['dev_ratio'], encoded.signature['seed']
+    counter = dict(zip(encoded.idx2feature, encoded.feature_counts))
+
+    trainer = Trainer(sentence_to_xy, verbose=False, **config)
+    trainer._set_features(_trim_features(counter, trainer.min_count))
+    del counter
+    train = Split(encoded, dev_ratio, seed)
+    dev = Split(encoded, dev_ratio, seed, dev=True)
+
+    crfsuite_path = os.path.join(model_dir, '_config{}'.format(i))
+    begin_time = time.time()
+    trainer._train_pycrfsuite(train, crfsuite_path, featurized=True)
+    train_time = time.time() - begin_time
+    accuracy = label_accuracy(crfsuite_path, dev, getattr(sentence_to_xy, 'integer', False))
+
+    trainer._parse_coefficients(crfsuite_path)
+    os.remove(crfsuite_path)
+    model_path = os.path.join(model_dir, 'config{}{}'.format(i, extension))
+    if extension == '.bin':
+        trainer._save_as_binary(model_path)
+    else:
+        trainer._save_as_json(model_path)
+
+    result = {parameter: getattr(trainer, parameter) for parameter in grid_parameters}
+    result.update({
+        'accuracy': accuracy,
+        'train_time': train_time,
+        'model_size': os.path.getsize(model_path),
+        'model_path': model_path
+    })
+    return result
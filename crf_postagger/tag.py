@@ -0,0 +1,126 @@
+"""Tag a text file line by line
+
+    python -m crf_postagger.tag --model_path model.json --input_path in.txt --output_path out.txt
+
+Each output line is the best path of the input line, formatted as
+'word/tag word/tag ...' which Corpus reads back. Lines are streamed
+through AbstractTagger.tag_iter, so memory use does not depend on the
+input size. With --resume, the lines already written in output_path are
+skipped and tagging continues from begin_line + the number of them.
+"""
+
+import argparse
+import os
+import time
+from itertools import islice
+from .utils import get_process_memory
+
+
+def tag_file(tagger, input_path, output_path, begin_line=0, n_jobs=1,
+    chunksize=200, verbose=True, resume=False, **tag_kwargs):
+    """It tags lines of input_path from begin_line (0-based) and writes them
+    to output_path. If begin_line > 0, lines are appended to output_path.
+    If resume is True, output_path has the tagged lines from begin_line,
+    and tagging continues after them.
+
+    :returns: number of tagged lines
+    """
+
+    mode = 'a' if begin_line > 0 else 'w'
+    if resume:
+        begin_line += count_written_lines(output_path)
+        mode = 'a'
+        if verbose:
+            print('[CRF tagger] resume from line {}'.format(begin_line))
+
+    def print_status(i, begin_time):
+        speed = i / max(1e-9, time.time() - begin_time)
+        info = '{} sents, {:.1f} sents / sec, mem={:f} Gb'.format(
+            begin_line + i, speed, get_process_memory())
+        print('\r[CRF tagger] tagging {}'.format(info), end='')
+
+    begin_time = time.time()
+    i = 0
+    with open(input_path, encoding='utf-8') as fi, open(output_path, mode, encoding='utf-8') as fo:
+        lines = (line.strip() for line in islice(fi, begin_line, None))
+        results = tagger.tag_iter(lines, n_jobs=n_jobs, chunksize=chunksize, **tag_kwargs)
+        for i, result in enumerate(results, start=1):
+            fo.write('{}\n'.format(as_line(result)))
+            if verbose and i % 1000 == 0:
+                print_status(i, begin_time)
+
+    if verbose:
+        print_status(i, begin_time)
+        print(' done.')
+
+    return i
+
+def as_line(result):
+    # TrigramTagger returns list of (poses, score) and HMMStyleTagger returns [poses, score]
+    poses = result[0][0] if isinstance(result[0], tuple) else result[0]
+    return ' '.join('{}/{}'.format(word, tag) for word, tag in poses)
+
+def count_written_lines(path, block_size=1 << 20):
+    """It returns the number of complete lines in path, and removes the
+    last line if it was cut by an interruption. The file is read in blocks,
+    so memory use does not depend on its size"""
+
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb+') as f:
+        n_lines = 0
+        for block in iter(lambda: f.read(block_size), b''):
+            n_lines += block.count(b'\n')
+
+        # find the last newline from the end
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            begin = max(0, end - block_size)
+            f.seek(begin)
+            i = f.read(end - begin).rfind(b'\n')
+            if i >= 0:
+                end = begin + i + 1
+                break
+            end = begin
+        f.truncate(end)
+    return n_lines
+
+def main():
+    from .hmm_style import HMMStyleParameter
+    from .hmm_style import HMMStyleTagger
+    from .trigram import TrigramParameter
+    from .trigram import TrigramTagger
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_path', type=str, required=True, help='trained JSON or binary model path')
+    parser.add_argument('--model_type', type=str, default='trigram', choices=['trigram', 'hmm_style'])
+    parser.add_argument('--input_path', type=str, required=True, help='utf-8 text, a sentence per line')
+    parser.add_argument('--output_path', type=str, required=True)
+    parser.add_argument('--beam_size', type=int, default=5, help='used only in trigram tagger')
+    parser.add_argument('--guess_tag', dest='guess_tag', action='store_true', help='used only in trigram tagger')
+    parser.add_argument('--viterbi', dest='viterbi', action='store_true', help='used only in trigram tagger')
+    parser.add_argument('--compiled', dest='compiled', action='store_true', help='used only in trigram tagger')
+    parser.add_argument('--max_chunk_len', type=int, default=0, help='lines longer than it are decoded in chunks. used only in trigram tagger')
+    parser.add_argument('--index_cache', dest='index_cache', action='store_true', help='store derived index next to the model')
+    parser.add_argument('--n_jobs', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--chunksize', type=int, default=200, help='number of sentences sent to a worker at once')
+    parser.add_argument('--begin_line', type=int, default=0, help='0-based input line to begin from')
+    parser.add_argument('--resume', dest='resume', action='store_true', help='continue after the lines in output_path, which begin from begin_line')
+    parser.add_argument('--verbose', dest='verbose', action='store_true')
+
+    args = parser.parse_args()
+
+    if args.model_type == 'trigram':
+        tagger = TrigramTagger(TrigramParameter(args.model_path,
+            compiled=args.compiled, index_cache=args.index_cache))
+        tag_kwargs = {'beam_size': args.beam_size, 'guess_tag': args.guess_tag,
+            'viterbi': args.viterbi, 'max_chunk_len': args.max_chunk_len}
+    else:
+        tagger = HMMStyleTagger(HMMStyleParameter(args.model_path, index_cache=args.index_cache))
+        tag_kwargs = {}
+
+    tag_file(tagger, args.input_path, args.output_path, args.begin_line,
+        args.n_jobs, args.chunksize, args.verbose, args.resume, **tag_kwargs)
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,13 @@
+from collections import deque
+from itertools import islice
+import multiprocessing
 from .utils import bos, eos, unk, Eojeols
+from .utils import TaggerStats
 from .transformer import *
 
+# tagger of worker process. it is inherited by fork, or set by initializer
+_worker_tagger = None
+
 class AbstractTagger:
 
     def __init__(self, parameters,
@@ -12,6 +19,8 @@ class AbstractTagger:
         self.parameters = parameters
         self.feature_transformer = feature_transformer
         self.verbose = verbose
+        # TaggerStats if enabled. tag checks only whether it is None
+        self.stats = None
 
     def evaluate(self, wordpos_sentence, debug=False):
 
@@ -41,20 +50,105 @@ class AbstractTagger:
     def tag(self, sentence, flatten=True, debug=False):
         raise NotImplemented
 
+    def tag_iter(self, sentences, n_jobs=1, chunksize=200, max_inflight=None, **tag_kwargs):
+        """It yields tag(sentence, **tag_kwargs) of each sentence in input order.
+
+        With n_jobs > 1, chunks of sentences are tagged by worker processes.
+        Workers are forked after the parameters are loaded, so they share the
+        model pages copy-on-write instead of unpickling it. Where fork is not
+        available, the tagger is pickled once per worker. At most max_inflight
+        chunks (default 2 * n_jobs) are submitted but not yet yielded, so
+        memory is bounded for any length of input.
+
+        :param iterable sentences: iterable of str
+        :param int n_jobs: number of worker processes. -1 means all cores
+        :param int chunksize: number of sentences sent to a worker at once
+        """
+
+        return self._map_iter('tag', sentences, n_jobs, chunksize, max_inflight, tag_kwargs)
+
+    def tag_batch(self, sentences, n_jobs=1, chunksize=200, max_inflight=None, **tag_kwargs):
+        """List version of tag_iter"""
+        return list(self.tag_iter(sentences, n_jobs, chunksize, max_inflight, **tag_kwargs))
+
+    def _map_iter(self, method, items, n_jobs, chunksize, max_inflight, kwargs):
+        # it yields getattr(self, method)(item, **kwargs) in input order
+        if n_jobs < 0:
+            n_jobs = multiprocessing.cpu_count()
+        if n_jobs <= 1:
+            func = getattr(self, method)
+            for item in items:
+                yield func(item, **kwargs)
+            return
+
+        if multiprocessing.current_process().daemon:
+            # daemonic workers of tag_iter can not start processes
+            raise ValueError('n_jobs > 1 is not available in worker processes of tag_iter')
+
+        if max_inflight is None:
+            max_inflight = 2 * n_jobs
+
+        global _worker_tagger
+        if 'fork' in multiprocessing.get_all_start_methods():
+            _worker_tagger = self
+            pool = multiprocessing.get_context('fork').Pool(n_jobs)
+        else:
+            pool = multiprocessing.Pool(n_jobs, _set_worker_tagger, (self,))
+
+        items = iter(items)
+        inflight = deque()
+        try:
+            while True:
+                chunk = list(islice(items, chunksize))
+                if chunk:
+                    inflight.append(pool.apply_async(_tag_chunk, (chunk, kwargs, method)))
+                if inflight and (not chunk or len(inflight) >= max_inflight):
+                    yield from inflight.popleft().get()
+                elif not chunk:
+                    break
+        finally:
+            pool.terminate()
+            _worker_tagger = None
+
+    def enable_stats(self, callback=None):
+        """It records per-stage timings and counters of tag as TaggerStats,
+        and returns it. stats.as_dict() returns them as dict. Sentences
+        tagged by worker processes of tag_iter are not recorded.
+
+        :param callable callback: callback(sentence, stats of the call)
+        """
+        self.stats = TaggerStats(callback)
+        return self.stats
+
+    def disable_stats(self):
+        self.stats = None
+
     def add_user_dictionary(self, tag, word_score):
-        if not (tag in self.parameters.pos2words):
-            raise ValueError('{} tag does not exist in model'.format(tag))
-        for word, score in word_score.items():
-            self.parameters.pos2words[tag][word] = score
+        return self.parameters.add_user_dictionary(tag, word_score)
 
-    def _remain_details(self, eojeols):
-        return [(eojeol.pos, eojeol.begin, eojeol.end, eojeol.eojeol_score)
-                for eojeol in eojeols.eojeols[1:-1]]
+    def remove_user_dictionary(self, tag, words):
+        return self.parameters.remove_user_dictionary(tag, words)
 
-    def _remain_only_pos(self, eojeols):
+    def load_user_dictionary(self, path, default_score=1, remove=False):
+        return self.parameters.load_user_dictionary(path, default_score, remove)
+
+    def _remain_details(self, lattice, eojeols):
+        # eojeols are lattice nodes, from begin node to end node
+        return [(lattice.pos(node), lattice.begin[node], lattice.end[node], lattice.score[node])
+                for node in eojeols.eojeols[1:-1]]
+
+    def _remain_only_pos(self, lattice, eojeols):
         poses = []
-        for eojeol in eojeols.eojeols[1:-1]:
-            poses.append((eojeol.first_word, eojeol.first_tag))
-            if eojeol.compound:
-                poses.append((eojeol.last_word, eojeol.last_tag))
-        return poses
\ No newline at end of file
+        for node in eojeols.eojeols[1:-1]:
+            poses.append((lattice.first_word[node], lattice.first_tag[node]))
+            if lattice.compound[node]:
+                poses.append((lattice.last_word[node], lattice.last_tag[node]))
+        return poses
+
+def _set_worker_tagger(tagger):
+    global _worker_tagger
+    _worker_tagger = tagger
+
+def _tag_chunk(items, kwargs, method='tag'):
+    func = getattr(_worker_tagger, method)
+    return [func(item, **kwargs) for item in items]
@@ -4,18 +4,70 @@ except:
     print('Failed to import python-crfsuite')
 
 import json
+import multiprocessing
 import os
+import shutil
+import sys
+import tempfile
 from collections import namedtuple
+from itertools import islice
+from .binary import save_binary
+from .counting import LossyCounter
+from .counting import SpillCounter
+from .encoded import EncodedCorpus
+from .encoded import EncodedCorpusWriter
+from .encoded import hash_signature
+from .encoded import load_encoded_corpus
 from .transformer import BaseFeatureTransformer
+from .transformer import is_word_feature
 from .utils import get_process_memory
 from .utils import check_dirs
+from .utils import corpus_signature
 
 Feature = namedtuple('Feature', 'idx count')
 
+def _trim_features(counter, min_count):
+    counter = {
+        feature:count for feature, count in counter.items()
+        # memorize all words no matter how the word occured.
+        if (count >= min_count) or is_word_feature(feature)
+    }
+    return counter
+
+def _as_attributes(x):
+    # pycrfsuite accepts only str attributes
+    return [[str(xij) for xij in xi] for xi in x]
+
+def _print_scan_status(i, counter):
+    info = '{} sent, {} features, mem={:f} Gb'.format(
+        i, len(counter), get_process_memory())
+    print('\r[CRF tagger] scanning from {}'.format(info), end='')
+
+def _count_features(args):
+    sentence_to_xy, sentences = args
+    counter = {}
+    for sentence in sentences:
+        sentence_, _ = sentence_to_xy(sentence)
+        for features in sentence_:
+            for feature in features:
+                counter[feature] = counter.get(feature, 0) + 1
+    return len(sentences), counter
+
+def _transformer_name(sentence_to_xy):
+    transformer = sentence_to_xy.__class__
+    name = '{}.{}'.format(transformer.__module__, transformer.__qualname__)
+    if getattr(sentence_to_xy, 'vocabulary', None) is not None:
+        name += ' vocabulary={}'.format(hash_signature(sentence_to_xy.vocabulary))
+    elif getattr(sentence_to_xy, 'hashed', False):
+        # hash of tuple may change between Python versions
+        name += ' hashed python{}.{}'.format(*sys.version_info[:2])
+    return name
+
 class Trainer:
     def __init__(self, sentence_to_xy=None, min_count=3,
         l2_cost=1.0, l1_cost=1.0, scan_batch_size=200000,
-        max_iter=300, verbose=True):
+        max_iter=300, n_jobs=1, scan_method='memory', error_rate=1e-6,
+        spill_dir=None, buffer_size=1000000, cache_path=None, verbose=True):
 
         if sentence_to_xy is None:
             sentence_to_xy = BaseFeatureTransformer()
@@ -29,30 +81,30 @@ class Trainer:
         self.l1_cost = l1_cost
         self.scan_batch_size = scan_batch_size
         self.max_iter = max_iter
+        self.n_jobs = n_jobs
+        self.scan_method = scan_method
+        self.error_rate = error_rate
+        self.spill_dir = spill_dir
+        self.buffer_size = buffer_size
+        self.cache_path = cache_path
         self.verbose = verbose
+        self._attribute_names = None
 
     def scan_features(self, sentences, sentence_to_xy,
-        min_count=2, scan_batch_size=1000000):
-
-        def trim(counter, min_count):
-            counter = {
-                feature:count for feature, count in counter.items()
-                # memorize all words no matter how the word occured.
-                if (count >= min_count) or (feature[:4] == 'x[0]' and not ', ' in feature)
-            }
-            return counter
+        min_count=2, scan_batch_size=1000000, n_jobs=1):
 
-        def print_status(i, counter):
-            info = '{} sent, {} features, mem={:f} Gb'.format(
-                i, len(counter), get_process_memory())
-            print('\r[CRF tagger] scanning from {}'.format(info), end='')
+        if n_jobs < 0:
+            n_jobs = multiprocessing.cpu_count()
+        if n_jobs > 1:
+            return self._scan_features_parallel(
+                sentences, sentence_to_xy, min_count, scan_batch_size, n_jobs)
 
         counter = {}
 
         for i, sentence in enumerate(sentences):
             # remove infrequent features
             if (i % scan_batch_size == 0):
-                counter = trim(counter, min_count)
+                counter = _trim_features(counter, min_count)
             # transform sentence to features
             sentence_, _ = sentence_to_xy(sentence)
             # count
@@ -61,37 +113,221 @@ class Trainer:
                     counter[feature] = counter.get(feature, 0) + 1
             # print status
             if self.verbose and i % 10000 == 0:
-                print_status(i, counter)
+                _print_scan_status(i, counter)
 
         # last removal of infrequent features
-        counter = trim(counter, min_count)
+        counter = _trim_features(counter, min_count)
 
         if self.verbose:
-            print_status(i, counter)
+            _print_scan_status(i, counter)
             print(' done.')
 
         return counter
 
-    def train(self, sentences, model_path=None):
+    def scan_features_lossy(self, sentences, sentence_to_xy,
+        min_count=2, error_rate=1e-6, max_size=1000000):
+        """Memory-bounded version of scan_features.
+
+        The first pass counts features with LossyCounter, so at most
+        (1 / error_rate) * log(error_rate * N) features are kept for N
+        feature occurrences, and every feature occurring more than
+        error_rate * N times survives. The counter never stores more than
+        max_size features. Word features (x[0]) are not counted in the
+        first pass, because they are all kept as in scan_features. The
+        second pass recounts exactly the word features and the surviving
+        features which may occur min_count times or more, so the returned
+        counts are exact and memory is bounded by max_size and the output.
+
+        :param sentences: iterable which can be iterated twice, such as Corpus
+        """
+
+        # first pass, approximate counting
+        lossy = LossyCounter(error_rate, max_size)
+        add = lossy.add
+        for i, sentence in enumerate(sentences):
+            sentence_, _ = sentence_to_xy(sentence)
+            for features in sentence_:
+                for feature in features:
+                    if not is_word_feature(feature):
+                        add(feature)
+            if self.verbose and i % 10000 == 0:
+                _print_scan_status(i, lossy)
 
-        features = self.scan_features(
-            sentences, self.sentence_to_xy,
-            self.min_count, self.scan_batch_size)
+        if self.verbose:
+            _print_scan_status(i, lossy)
+            print(' done.')
 
-        # feature encoder
-        self._features = {
-            # wrapping feature idx and its count
-            feature:Feature(idx, count) for idx, (feature, count) in
-            # sort features by their count in decreasing order
-            enumerate(sorted(features.items(), key=lambda x:-x[1]
-            ))
+        # second pass, exact recount of candidates and words
+        counter = {feature: 0 for feature in lossy.candidates(min_count)}
+        del lossy, add
+        words = {}
+        for i, sentence in enumerate(sentences):
+            sentence_, _ = sentence_to_xy(sentence)
+            for features in sentence_:
+                for feature in features:
+                    count = counter.get(feature)
+                    if count is not None:
+                        counter[feature] = count + 1
+                    elif is_word_feature(feature):
+                        words[feature] = words.get(feature, 0) + 1
+            if self.verbose and i % 10000 == 0:
+                print('\r[CRF tagger] recounting {} candidates from {} sent'.format(
+                    len(counter), i), end='')
+
+        counter = {feature: count for feature, count in counter.items() if count >= min_count}
+        counter.update(words)
+
+        if self.verbose:
+            _print_scan_status(i, counter)
+            print(' done.')
+
+        return counter
+
+    def scan_features_disk(self, sentences, sentence_to_xy,
+        min_count=2, spill_dir=None, buffer_size=1000000):
+        """Exact out-of-core version of scan_features.
+
+        Features are counted in memory until buffer_size distinct features
+        are stored, then spilled to spill_dir as sorted runs. A k-way merge
+        of the runs applies min_count, keeping every word feature (x[0])
+        as scan_features does. Unlike scan_features, no feature is trimmed
+        before its total count is known.
+
+        If spill_dir is given, the runs are kept there, and a later call
+        with the same Corpus and feature transformer merges them without
+        scanning. Otherwise a temporal directory is used and removed.
+        Integer features are spilled as str and are restored after merging.
+        """
+
+        integer = getattr(sentence_to_xy, 'integer', False)
+
+        signature = corpus_signature(sentences)
+        if signature is not None:
+            signature['transformer'] = _transformer_name(sentence_to_xy)
+
+        remove_dir = spill_dir is None
+        if remove_dir:
+            spill_dir = tempfile.mkdtemp(prefix='crf_postagger_')
+
+        spilled = SpillCounter.load(spill_dir, signature)
+        if spilled is not None:
+            if self.verbose:
+                print('[CRF tagger] use {} spilled runs in {}'.format(len(spilled.runs), spill_dir))
+        else:
+            spilled = SpillCounter(spill_dir, buffer_size)
+            # remove runs of previous scanning
+            spilled.remove_runs()
+            for i, sentence in enumerate(sentences):
+                sentence_, _ = sentence_to_xy(sentence)
+                for features in sentence_:
+                    spilled.update(map(str, features) if integer else features)
+                if self.verbose and i % 10000 == 0:
+                    info = '{} sent, {} runs, {} buffered features, mem={:f} Gb'.format(
+                        i, len(spilled.runs), len(spilled), get_process_memory())
+                    print('\r[CRF tagger] scanning from {}'.format(info), end='')
+            spilled.save_manifest(signature)
+            if self.verbose:
+                print(' done.')
+
+        items = spilled.items()
+        if integer:
+            items = ((int(feature), count) for feature, count in items)
+        counter = {
+            feature:count for feature, count in items
+            # memorize all words no matter how the word occured.
+            if (count >= min_count) or is_word_feature(feature)
         }
 
-        # feature id decoder
-        self._idx2feature = [
-            feature for feature in sorted(
-                self._features, key=lambda x:self._features[x].idx)
-        ]
+        if remove_dir:
+            shutil.rmtree(spill_dir)
+
+        if self.verbose:
+            print('[CRF tagger] merged {} features, mem={:f} Gb'.format(
+                len(counter), get_process_memory()))
+
+        return counter
+
+    def _scan_features_parallel(self, sentences, sentence_to_xy,
+        min_count, scan_batch_size, n_jobs):
+        """Map-reduce version of scan_features. Each batch of scan_batch_size
+        sentences is split into chunks counted by worker processes, and
+        the partial counts are summed. The counter is trimmed only between
+        batches, as scan_features does, so the result is exactly same."""
+
+        counter = {}
+        chunksize = max(1, min(10000, scan_batch_size // (4 * n_jobs)))
+        sentences = iter(sentences)
+        n_sents = 0
+
+        with multiprocessing.Pool(n_jobs) as pool:
+            while True:
+                batch = list(islice(sentences, scan_batch_size))
+                if not batch:
+                    break
+                # remove infrequent features
+                counter = _trim_features(counter, min_count)
+                chunks = [(sentence_to_xy, batch[b: b + chunksize])
+                          for b in range(0, len(batch), chunksize)]
+                for n_chunk_sents, chunk_counter in pool.imap(_count_features, chunks):
+                    # merge
+                    for feature, count in chunk_counter.items():
+                        counter[feature] = counter.get(feature, 0) + count
+                    # print status
+                    if self.verbose and (n_sents // 10000 < (n_sents + n_chunk_sents) // 10000):
+                        _print_scan_status(n_sents + n_chunk_sents, counter)
+                    n_sents += n_chunk_sents
+
+        # last removal of infrequent features
+        counter = _trim_features(counter, min_count)
+
+        if self.verbose:
+            _print_scan_status(n_sents, counter)
+            print(' done.')
+
+        return counter
+
+    def _encoding_signature(self, sentences):
+        """Hash of everything which changes the encoded corpus. It is None
+        if sentences is not a Corpus"""
+
+        signature = corpus_signature(sentences)
+        if signature is None:
+            return None
+        signature['transformer'] = _transformer_name(self.sentence_to_xy)
+        signature['min_count'] = self.min_count
+        signature['scan_method'] = self.scan_method
+        if self.scan_method == 'memory':
+            signature['scan_batch_size'] = self.scan_batch_size
+        elif self.scan_method == 'lossy':
+            signature['error_rate'] = self.error_rate
+            signature['buffer_size'] = self.buffer_size
+        return hash_signature(signature)
+
+    def train(self, sentences, model_path=None):
+        """If cache_path is given and sentences is a Corpus, the features of
+        sentences are encoded as ids in cache_path. Later training with the
+        same Corpus, feature transformer and scanning options reads the
+        encoded corpus without scanning and transforming sentences."""
+
+        signature, encoded = None, None
+        if self.cache_path:
+            signature = self._encoding_signature(sentences)
+            if signature is None and self.verbose:
+                print('[CRF tagger] cache_path is ignored, because sentences is not a Corpus')
+            encoded = load_encoded_corpus(self.cache_path, signature)
+
+        if encoded is not None:
+            if self.verbose:
+                print('[CRF tagger] use encoded corpus {}'.format(self.cache_path))
+            # features are already sorted by their idx
+            self._features = {
+                feature:Feature(idx, count) for idx, (feature, count) in
+                enumerate(zip(encoded.idx2feature, encoded.feature_counts))
+            }
+            self._idx2feature = encoded.idx2feature
+            sentences = encoded
+        else:
+            self._set_features(self._scan(sentences))
 
         # temporal file
         if (model_path is None) or (not model_path):
@@ -103,15 +339,53 @@ class Trainer:
             model_path_ = '{}/_{}'.format(dirname, basename)
 
         # train model using python-crfsuite
-        self._train_pycrfsuite(sentences, model_path_)
+        self._train_pycrfsuite(sentences, model_path_, signature)
 
         # summary
         self._parse_coefficients(model_path_)
 
-        if model_path:
+        if model_path and model_path.endswith('.bin'):
+            self._save_as_binary(model_path)
+        elif model_path:
             self._save_as_json(model_path)
 
-    def _train_pycrfsuite(self, sentences, model_path):
+    def _scan(self, sentences):
+        if self.scan_method == 'lossy':
+            return self.scan_features_lossy(
+                sentences, self.sentence_to_xy,
+                self.min_count, self.error_rate, self.buffer_size)
+        elif self.scan_method == 'disk':
+            return self.scan_features_disk(
+                sentences, self.sentence_to_xy,
+                self.min_count, self.spill_dir, self.buffer_size)
+        return self.scan_features(
+            sentences, self.sentence_to_xy,
+            self.min_count, self.scan_batch_size, self.n_jobs)
+
+    def _set_features(self, features):
+        # feature encoder
+        self._features = {
+            # wrapping feature idx and its count
+            feature:Feature(idx, count) for idx, (feature, count) in
+            # sort features by their count in decreasing order
+            enumerate(sorted(features.items(), key=lambda x:-x[1]
+            ))
+        }
+
+        # feature id decoder
+        self._idx2feature = [
+            feature for feature in sorted(
+                self._features, key=lambda x:self._features[x].idx)
+        ]
+
+    def _train_pycrfsuite(self, sentences, model_path, signature=None, featurized=False):
+        """If sentences is EncodedCorpus, its (x, y) are appended as they
+        are. If featurized is True, sentences are (x, y) which are not
+        filtered yet. Otherwise sentences are transformed, and they are also
+        encoded in cache_path when signature is given.
+
+        Integer features are appended as str of feature id, and they are
+        decoded to string features after appending."""
 
         def print_status(i):
             info = 'from {} sents, mem = {:f} Gb'.format(
@@ -120,18 +394,49 @@ class Trainer:
 
         trainer = pycrfsuite.Trainer(verbose=self.verbose)
 
-        for i, sentence in enumerate(sentences):
-
-            if self.verbose and i % 2000 == 0:
-                print_status(i)
-
-            # transform sentence to features
-            x, y = self.sentence_to_xy(sentence)
-
-            # use only conformed feature
-            x = [[xij for xij in xi if xij in self._features] for xi in x]
-
-            trainer.append(x, y)
+        integer = getattr(self.sentence_to_xy, 'integer', False)
+        self._attribute_names = None
+        is_encoded = isinstance(sentences, EncodedCorpus)
+        writer = None
+        if signature is not None and not is_encoded:
+            writer = EncodedCorpusWriter(self.cache_path, self._features)
+        if getattr(self.sentence_to_xy, 'hashed', False) and not (is_encoded or featurized):
+            # keys of only the remained features are recorded while appending
+            self.sentence_to_xy.record_keys(self._features)
+
+        try:
+            for i, sentence in enumerate(sentences):
+
+                if self.verbose and i % 2000 == 0:
+                    print_status(i)
+
+                if is_encoded:
+                    x, y = sentence
+                else:
+                    # transform sentence to features
+                    x, y = sentence if featurized else self.sentence_to_xy(sentence)
+
+                    # use only conformed feature
+                    if writer is not None:
+                        x = writer.write(x, y)
+                    else:
+                        x = [[xij for xij in xi if xij in self._features] for xi in x]
+
+                    if integer:
+                        x = _as_attributes(x)
+
+                trainer.append(x, y)
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            raise
+
+        if integer and not is_encoded:
+            self._decode_features()
+
+        if writer is not None:
+            writer.close(signature, self._idx2feature,
+                [self._features[feature].count for feature in self._idx2feature])
 
         if self.verbose:
             print_status(i)
@@ -149,6 +454,15 @@ class Trainer:
         trainer.set_params(params)
         trainer.train(model_path)
 
+    def _decode_features(self):
+        # feature id (as pycrfsuite attribute) -> string feature
+        decode = self.sentence_to_xy.decode
+        self._attribute_names = {str(feature): decode(feature) for feature in self._idx2feature}
+        self._features = {
+            self._attribute_names[str(feature)]:value for feature, value in self._features.items()
+        }
+        self._idx2feature = [self._attribute_names[str(feature)] for feature in self._idx2feature]
+
     def _parse_coefficients(self, model_path):
 
         if self.verbose:
@@ -161,6 +475,12 @@ class Trainer:
         # state feature coeffitient
         debugger = tagger.info()
         self.state_features = debugger.state_features
+        if self._attribute_names is not None:
+            names = self._attribute_names
+            self.state_features = {
+                (names.get(attribute, attribute), tag):coef
+                for (attribute, tag), coef in self.state_features.items()
+            }
         # transition coefficient
         self.transitions = debugger.transitions
 
@@ -190,4 +510,8 @@ class Trainer:
 
         # save
         with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(params, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+            json.dump(params, f, ensure_ascii=False, indent=2)
+
+    def _save_as_binary(self, binary_path):
+        save_binary(binary_path, self.state_features, self.transitions,
+                    self._idx2feature, self._features)
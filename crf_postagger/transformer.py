@@ -1,7 +1,72 @@
+from hashlib import blake2b
 from pprint import pprint
 from .utils import bos, eos
 
+# In integer mode, feature id = (key of word and tag ids << 4) | template index.
+# With vocabulary, the key packs the ids of words and tags. When hashed, the
+# feature id is a 64 bit hash of template index and the ids, and the low 4
+# bits are replaced with the template index
+
+_hash_mask = ((1 << 64) - 1) ^ 15
+
+def stable_hash(text):
+    """64 bit hash of str, same in every process unlike hash()"""
+    return int.from_bytes(blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def is_word_feature(feature):
+    """x[0] features. In integer mode, x[0] is the first template of every transformer"""
+    if isinstance(feature, int):
+        return feature & 15 == 0
+    return feature[:4] == 'x[0]' and not ', ' in feature
+
+def build_vocabulary(sentences):
+    """It returns {word or tag: id} of sentences, to use as vocabulary of
+    feature transformer. Id 0 is reserved for unknown words"""
+
+    vocabulary = {bos: 1, eos: 2}
+    for sentence in sentences:
+        for word, tag in sentence:
+            for string in (word, tag):
+                if not string in vocabulary:
+                    vocabulary[string] = len(vocabulary) + 1
+    return vocabulary
+
 class AbstractFeatureTransformer:
+    """If hashed is True or vocabulary is given, features are integer ids
+    instead of strings. Each word and tag is mapped to an id by a stable 64
+    bit hash or by vocabulary. With vocabulary, a feature id packs the ids
+    of the feature template, and features with an unknown word or tag (id
+    0) are not emitted. With hashed, a feature id is a 64 bit hash of the
+    template and the ids. Hashing does not record anything, so a hashed
+    feature is decoded only if its key (template and ids) was recorded:
+    after record_keys(features), transforming sentences records the keys
+    of those features, and a collision of two keys raises ValueError.
+    decode(feature id) returns the string feature, and Trainer stores the
+    decoded features in the model.
+
+    :param bool hashed: if True, use 64 bit hash ids
+    :param dict vocabulary: {word or tag: id}, for example from build_vocabulary
+    """
+
+    # format of string features, ordered by template index
+    templates = []
+
+    def __init__(self, hashed=False, vocabulary=None):
+        self.hashed = hashed
+        self.vocabulary = vocabulary
+        self.integer = hashed or (vocabulary is not None)
+        if vocabulary is not None:
+            self._bits = max(vocabulary.values(), default=0).bit_length()
+            self._ids = vocabulary
+            self._id2string = {idx: string for string, idx in vocabulary.items()}
+        else:
+            self._bits = 64
+            # cache of hash ids, and the reversible mapping of seen strings
+            self._ids = {}
+            self._id2string = {}
+        # hashed feature ids to record, and their keys (template index, ids of words and tags)
+        self._recording = None
+        self._id2key = {}
 
     def __call__(self, sentence):
         return self.sentence_to_xy(sentence)
@@ -21,12 +86,87 @@ class AbstractFeatureTransformer:
 
     def potential_function(self, words_, tags_):
         n = len(tags_) - 2 # except bos & eos
+        if self.integer:
+            word_ids = [self._string_id(word) for word in words_]
+            tag_ids = [self._string_id(tag) for tag in tags_]
+            if self.hashed:
+                to_feature_ids = self._hashed_feature_ids
+            elif 0 in word_ids or 0 in tag_ids:
+                to_feature_ids = self._known_feature_ids
+            else:
+                to_feature_ids = self.to_feature_ids
+            return [to_feature_ids(word_ids, tag_ids, i) for i in range(1, n+1)]
         sentence_ = [self.to_feature(words_, tags_, i) for i in range(1, n+1)]
         return sentence_
 
+    def _string_id(self, string):
+        idx = self._ids.get(string)
+        if idx is None:
+            if not self.hashed:
+                return 0
+            idx = self._ids[string] = stable_hash(string)
+            self._id2string[idx] = string
+        return idx
+
     def to_feature(self, sentence):
         raise NotImplemented
 
+    def to_feature_ids(self, word_ids, tag_ids, i):
+        """Feature ids packed with vocabulary, in the order of templates"""
+        raise NotImplemented
+
+    def to_feature_keys(self, word_ids, tag_ids, i):
+        """Tuple of keys in the order of templates. A key is a tuple of
+        template index and the word and tag ids of the template"""
+        raise NotImplemented
+
+    def _hashed_feature_ids(self, word_ids, tag_ids, i):
+        keys = self.to_feature_keys(word_ids, tag_ids, i)
+        # hash of tuple of int is not salted, so it is same in every process
+        features = [hash(key) & _hash_mask | key[0] for key in keys]
+        if self._recording:
+            recording, id2key = self._recording, self._id2key
+            for feature, key in zip(features, keys):
+                if feature in recording and id2key.setdefault(feature, key) != key:
+                    raise ValueError('hash collision of features {} and {}'.format(
+                        self._decode_key(key), self.decode(feature)))
+        return features
+
+    def record_keys(self, features):
+        """From now on, transforming sentences records the keys of these
+        hashed features to decode them. Other features are not recorded,
+        so scanning sentences before it costs only hashing"""
+        self._recording = set(features)
+        self._id2key = {}
+
+    def _known_feature_ids(self, word_ids, tag_ids, i):
+        # features with unknown word or tag (id 0) are not emitted
+        features = []
+        for key in self.to_feature_keys(word_ids, tag_ids, i):
+            if 0 in key[1:]:
+                continue
+            feature = 0
+            for idx in key[1:]:
+                feature = feature << self._bits | idx
+            features.append(feature << 4 | key[0])
+        return features
+
+    def decode(self, feature):
+        """It returns string feature of feature id"""
+        if self.hashed:
+            return self._decode_key(self._id2key[feature])
+        template = feature & 15
+        feature >>= 4
+        mask = (1 << self._bits) - 1
+        ids = []
+        for _ in range(self.templates[template].count('%s')):
+            ids.append(feature & mask)
+            feature >>= self._bits
+        return self._decode_key((template, *reversed(ids)))
+
+    def _decode_key(self, key):
+        return self.templates[key[0]] % tuple(self._id2string[idx] for idx in key[1:])
+
     def show_example(self):
         sentence = [
             ('이것', 'Noun'),
@@ -41,8 +181,18 @@ class AbstractFeatureTransformer:
         pprint(features)
 
 class BaseFeatureTransformer(AbstractFeatureTransformer):
-    def __init__(self):
-        super().__init__()
+
+    templates = [
+        'x[0]=%s',
+        'x[0]=%s, y[-1]=%s',
+        'x[-1:0]=%s-%s',
+        'x[-1:0]=%s-%s, y[-1]=%s',
+        'x[-1,1]=%s-%s',
+        'x[-1,1]=%s-%s, y[-1]=%s'
+    ]
+
+    def __init__(self, hashed=False, vocabulary=None):
+        super().__init__(hashed, vocabulary)
 
     def to_feature(self, words_, tags_, i):
         features = [
@@ -53,4 +203,26 @@ class BaseFeatureTransformer(AbstractFeatureTransformer):
             'x[-1,1]=%s-%s' % (words_[i-1], words_[i+1]),
             'x[-1,1]=%s-%s, y[-1]=%s' % (words_[i-1], words_[i+1], tags_[i-1])
         ]
-        return features
\ No newline at end of file
+        return features
+
+    def to_feature_ids(self, w, t, i):
+        b = self._bits
+        features = [
+            w[i] << 4,
+            (w[i] << b | t[i-1]) << 4 | 1,
+            (w[i-1] << b | w[i]) << 4 | 2,
+            ((w[i-1] << b | w[i]) << b | t[i-1]) << 4 | 3,
+            (w[i-1] << b | w[i+1]) << 4 | 4,
+            ((w[i-1] << b | w[i+1]) << b | t[i-1]) << 4 | 5
+        ]
+        return features
+
+    def to_feature_keys(self, w, t, i):
+        return (
+            (0, w[i]),
+            (1, w[i], t[i-1]),
+            (2, w[i-1], w[i]),
+            (3, w[i-1], w[i], t[i-1]),
+            (4, w[i-1], w[i+1]),
+            (5, w[i-1], w[i+1], t[i-1])
+        )
@@ -0,0 +1,83 @@
+_terminal = ''
+
+class Trie:
+    """Character prefix trie. Each node is a dict of char -> child node, and
+    the value of a registered word is kept in its last node with key ''."""
+
+    def __init__(self, items=None):
+        self.root = {}
+        self.n_words = 0
+        if items:
+            for word, value in items:
+                self[word] = value
+
+    def __len__(self):
+        return self.n_words
+
+    def __contains__(self, word):
+        return self._find(word) is not None
+
+    def __getitem__(self, word):
+        node = self._find(word)
+        if node is None:
+            raise KeyError(word)
+        return node[_terminal]
+
+    def __setitem__(self, word, value):
+        if not word:
+            raise ValueError('word should not be empty')
+        node = self.root
+        for char in word:
+            child = node.get(char)
+            if child is None:
+                child = node[char] = {}
+            node = child
+        if not (_terminal in node):
+            self.n_words += 1
+        node[_terminal] = value
+
+    def __delitem__(self, word):
+        # the deepest node which still leads to other words after deletion
+        node = self.root
+        cut_node, cut_char = node, word[:1]
+        for char in word:
+            child = node.get(char)
+            if child is None:
+                raise KeyError(word)
+            if len(node) > 1:
+                cut_node, cut_char = node, char
+            node = child
+        if not (_terminal in node):
+            raise KeyError(word)
+        self.n_words -= 1
+        if len(node) > 1:
+            del node[_terminal]
+        else:
+            del cut_node[cut_char]
+
+    def get(self, word, default=None):
+        node = self._find(word)
+        if node is None:
+            return default
+        return node[_terminal]
+
+    def _find(self, word):
+        node = self.root
+        for char in word:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node if _terminal in node else None
+
+    def prefixes(self, text, begin=0):
+        """Scan text from begin and yield (end, value) for every registered
+        word text[begin:end]. The scan stops as soon as a prefix has no
+        continuation in the trie."""
+
+        node = self.root
+        for end in range(begin + 1, len(text) + 1):
+            node = node.get(text[end - 1])
+            if node is None:
+                return
+            if _terminal in node:
+                yield end, node[_terminal]
@@ -1,94 +1,235 @@
-from .. import bos, eos, unk, BOS, Eojeol, Eojeols
+from heapq import nlargest
+from .. import bos, eos, unk, Eojeols
 
 class Beam:
-    def __init__(self, k):
+    """Hypotheses ending at each offset. A hypothesis is (score, node,
+    previous hypothesis) of lattice nodes, and the path is found by
+    following previous hypotheses. If recombine is True, hypotheses with
+    the same last two nodes are merged and only the best one survives,
+    because trigram score functions give them same scores for any
+    extension. If threshold is given, hypotheses whose score is less than
+    best score - threshold are pruned."""
+
+    def __init__(self, k, bos_node, recombine=False, threshold=None):
         self.k = k
-        self.beam = [[Eojeols((BOS,), 0)]]
+        self.recombine = recombine
+        self.threshold = threshold
+        self.beam = [[(0, bos_node, None)]]
 
     def __getitem__(self, index):
         return self.beam[index]
 
-    def append(self, candidates):
-        # descending order of score, last item in list
-        candidates = sorted(candidates, key=lambda x:-x.score)[:self.k]
+    def append(self, candidates, recombine=None):
+        if recombine is None:
+            recombine = self.recombine
+        if recombine:
+            best = {}
+            for candidate in candidates:
+                state = (candidate[1], candidate[2][1])
+                other = best.get(state)
+                if other is None or candidate[0] > other[0]:
+                    best[state] = candidate
+            candidates = best.values()
+        if self.threshold is not None and candidates:
+            min_score = max(candidate[0] for candidate in candidates) - self.threshold
+            candidates = [candidate for candidate in candidates if candidate[0] >= min_score]
+        # descending order of score, same order with stable sort for ties
+        candidates = nlargest(self.k, candidates, key=lambda x:x[0])
         self.beam += [candidates]
 
-def beam_search(begin_index, k, chars, params, score_functions,
-                unknown_penalty, **kwargs):
+def backtrack(hypothesis):
+    """Eojeols of the nodes in the path of hypothesis"""
+    score = hypothesis[0]
+    path = []
+    while hypothesis is not None:
+        path.append(hypothesis[1])
+        hypothesis = hypothesis[2]
+    return Eojeols(tuple(reversed(path)), score)
+
+def beam_search(lattice, k, chars, params, score_functions, unknown_penalty,
+                stats=None, recombine=True, threshold=None, breaks=None, **kwargs):
+    """It returns top k Eojeols, whose eojeols are the nodes of lattice from
+    begin node to end node.
+
+    Score functions are called as func(lattice, prev2, prev, node, params, **kwargs)
+    where prev2 is -1 if prev is the begin node. If recombine is True,
+    hypotheses are merged by their last two nodes. It assumes that score
+    functions depend only on those nodes, as trigram score functions do.
+    If breaks (offsets) are given, every path has a boundary at them."""
 
     len_sent = len(chars)
-    max_len = params.max_word_len
-    beam = Beam(k)
+    bounds = _begin_bounds(len_sent, params.max_word_len, breaks)
+    bos_node = params._add_node(lattice, bos, bos, bos, bos, 0, 0, 0, indexed=False, pos=bos)
+    beam = Beam(k, bos_node, recombine, threshold)
 
-    def appending(immatures, appending_words, matures):
+    def appending(immatures, appending_nodes, matures):
         for immature in immatures:
-            for eojeol in appending_words:
-                eojeols = (*immature.eojeols, eojeol)
-                score = immature.score
+            immature_score, prev, previous = immature
+            prev2 = previous[1] if previous is not None else -1
+            for node in appending_nodes:
+                score = immature_score
                 for func in score_functions:
-                    score += func(immature, eojeol, params, **kwargs)
-                matures.append(Eojeols(eojeols, score))
+                    score += func(lattice, prev2, prev, node, params, **kwargs)
+                matures.append((score, node, immature))
         return matures
 
     for e in range(1, len_sent + 1):
         matures = []
+        n_edges = 0
 
-        for b in range(max(0, e - max_len), e):
+        for b in range(bounds[e], e):
             # prepare previous sequence
             immatures = beam[b]
 
             # prepare appending words
-            appending_eojeols = [eojeol for eojeol in begin_index[b] if eojeol.end == e]
-
-            if not appending_eojeols:
-                sub = chars[b:e]
-                appending_eojeols = [Eojeol(sub+'/'+unk, sub, sub, unk, unk, b, e, unknown_penalty, 0, 1)]
+            appending_nodes = _appending_nodes(
+                lattice, b, e, chars, params, unknown_penalty)
 
             # appending
-            matures = appending(immatures, appending_eojeols, matures)
+            matures = appending(immatures, appending_nodes, matures)
+
+            if stats is not None:
+                # hypotheses in a beam may end with same node
+                n_edges += len({immature[1] for immature in immatures}) * len(appending_nodes)
 
         # append beam and prune
         beam.append(matures)
 
-    # for eos scoring
-    EOS = Eojeol('', eos, '', eos, '', len_sent, len_sent, 0, 0, 0)
-    matures = appending(beam[-1], [EOS], [])
-    beam.append(matures)
-
-    return beam[-1]
-
-def _preference_penalty(immature, eojeol, params, a_syllable_penalty,
+        if stats is not None:
+            stats.count('edges', n_edges)
+            stats.count('hypotheses', len(matures))
+            stats.count('pruned', len(matures) - len(beam[-1]))
+
+    # for eos scoring. final paths are not merged to keep k-best of them
+    eos_node = params._add_node(lattice, eos, '', eos, '', len_sent, len_sent, 0, indexed=False, pos='')
+    matures = appending(beam[-1], [eos_node], [])
+    if stats is not None:
+        stats.count('edges', len({immature[1] for immature in beam[-1]}))
+        stats.count('hypotheses', len(matures))
+    beam.append(matures, recombine=False)
+    if stats is not None:
+        stats.count('pruned', len(matures) - len(beam[-1]))
+
+    return [backtrack(hypothesis) for hypothesis in beam[-1]]
+
+def _begin_bounds(len_sent, max_len, breaks=None):
+    # bounds[e] is the minimum begin of nodes ending at e. nodes do not cross breaks
+    bounds = [max(0, e - max_len) for e in range(len_sent + 1)]
+    if breaks:
+        last = 0
+        for e in range(1, len_sent + 1):
+            bounds[e] = max(bounds[e], last)
+            if e in breaks:
+                last = e
+    return bounds
+
+def _appending_nodes(lattice, b, e, chars, params, unknown_penalty):
+    ends = lattice.end
+    appending_nodes = [node for node in lattice.begin_index[b] if ends[node] == e]
+
+    # span without any known word becomes an unknown word
+    if not appending_nodes:
+        sub = chars[b:e]
+        appending_nodes = [params._add_node(lattice, sub, sub, unk, unk, b, e,
+            unknown_penalty, 0, 1, indexed=False)]
+
+    return appending_nodes
+
+def _preference_penalty(lattice, prev2, prev, node, params, a_syllable_penalty,
     noun_preference, longer_noun_preference):
 
-    len_eojeol = eojeol.end - eojeol.begin
-    score = (a_syllable_penalty * (1 + noun_preference * (eojeol.first_tag == 'Noun'))) if len_eojeol == 1 else 0
-    score += noun_preference if (eojeol.first_tag == 'Noun' and len_eojeol > 1 and not eojeol.unknown) else 0
-    score += longer_noun_preference * (len_eojeol - 1) if eojeol.first_tag == 'Noun' else 0
+    len_eojeol = lattice.end[node] - lattice.begin[node]
+    is_noun = lattice.first_tag[node] == 'Noun'
+    score = (a_syllable_penalty * (1 + noun_preference * is_noun)) if len_eojeol == 1 else 0
+    score += noun_preference if (is_noun and len_eojeol > 1 and not lattice.unknown[node]) else 0
+    score += longer_noun_preference * (len_eojeol - 1) if is_noun else 0
     return score
 
-def _trigram_score(immature, eojeol, params, **kargs):
+def _trigram_score(lattice, prev2, prev, node, params, **kargs):
+
+    word = lattice.first_word[node]
+    tag = lattice.first_tag[node]
+    prev_word = lattice.last_word[prev]
+    prev_tag = lattice.last_tag[prev]
+    # eojeol score, x[0]
+    score = lattice.score[node]
+
+    # transition score
+    score += params.transitions.get((prev_tag, tag), 0)
+
+    if lattice.unknown[node]:
+        return score
+
+    # previous features
+    score += params.previous_1X0.get(tag, {}).get((prev_word, word), 0)
+    score += params.previous_X0_1Y.get(tag, {}).get((word, prev_tag), 0)
+
+    # successive features (for previous pos)
+    score += params.successive_X01.get(prev_tag, {}).get((prev_word, word), 0)
+    score += params.successive_X01_Y1.get(prev_tag, {}).get((prev_word, word, tag), 0)
+
+    # bothside features (for previous pos)
+    if prev2 >= 0:
+        prev2_word = lattice.last_word[prev2]
+        prev_first_tag = lattice.first_tag[prev]
+        score += params.bothside_1X1.get(prev_first_tag, {}).get((prev2_word, word), 0)
+        score += params.bothside_1X01.get(prev_first_tag, {}).get((prev2_word, lattice.first_word[prev], word), 0)
+
+    return score
 
-    eojeol_prev = immature.eojeols[-1]
+def _compiled_trigram_score(lattice, prev2, prev, node, params, **kargs):
+    # same as _trigram_score, with interned ids of compiled TrigramParameter
+    n_words = params._n_words
+    n_tags = params._n_tags
     # eojeol score, x[0]
-    score = eojeol.eojeol_score
+    score = lattice.score[node]
+
+    prev_tag = lattice.last_tag_id[prev]
+    tag = lattice.first_tag_id[node]
 
     # transition score
-    score += params.transitions.get((eojeol_prev.last_tag, eojeol.first_tag), 0)
+    score += params._transition_matrix[prev_tag * n_tags + tag]
+
+    if lattice.unknown[node]:
+        return score
+
+    word = lattice.first_word_id[node]
+    key = lattice.last_word_id[prev] * n_words + word
 
     # previous features
-    if not eojeol.unknown:
-        score += params.previous_1X0.get(eojeol.first_tag, {}).get((eojeol_prev.last_word, eojeol.first_word), 0)
-        score += params.previous_X0_1Y.get(eojeol.first_tag, {}).get((eojeol.first_word, eojeol_prev.last_tag), 0)
+    score += params._packed_1X0[tag].get(key, 0)
+    score += params._packed_X0_1Y[tag].get(word * n_tags + prev_tag, 0)
 
     # successive features (for previous pos)
-    if not eojeol.unknown:
-        score += params.successive_X01.get(eojeol_prev.last_tag, {}).get((eojeol_prev.last_word, eojeol.first_word), 0)
-        score += params.successive_X01_Y1.get(eojeol_prev.last_tag, {}).get((eojeol_prev.last_word, eojeol.first_word, eojeol.first_tag), 0)
+    score += params._packed_X01[prev_tag].get(key, 0)
+    score += params._packed_X01_Y1[prev_tag].get(key * n_tags + tag, 0)
 
     # bothside features (for previous pos)
-    if len(immature.eojeols) >= 2 and not eojeol.unknown:
-        eojeol_prev2 = immature.eojeols[-2]
-        score += params.bothside_1X1.get(eojeol_prev.first_tag, {}).get((eojeol_prev2.last_word, eojeol.first_word), 0)
-        score += params.bothside_1X01.get(eojeol_prev.first_tag, {}).get((eojeol_prev2.last_word, eojeol_prev.first_word, eojeol.first_word), 0)
+    if prev2 >= 0:
+        prev_first_tag = lattice.first_tag_id[prev]
+        prev2_word = lattice.last_word_id[prev2]
+        score += params._packed_1X1[prev_first_tag].get(prev2_word * n_words + word, 0)
+        score += params._packed_1X01[prev_first_tag].get(
+            (prev2_word * n_words + lattice.first_word_id[prev]) * n_words + word, 0)
+
+    return score
+
+    word = lattice.first_word_id[node]
+    prev_word = lattice.last_word_id[prev]
 
-    return score
\ No newline at end of file
+    # previous features
+    score += params._packed_1X0.get((tag * n_words + prev_word) * n_words + word, 0)
+    score += params._packed_X0_1Y.get((tag * n_words + word) * n_tags + prev_tag, 0)
+
+    # successive features (for previous pos)
+    key = (prev_tag * n_words + prev_word) * n_words + word
+    score += params._packed_X01.get(key, 0)
+    score += params._packed_X01_Y1.get(key * n_tags + tag, 0)
+
+    # bothside features (for previous pos)
+    if prev2 >= 0:
+        key = lattice.first_tag_id[prev] * n_words + lattice.last_word_id[prev2]
+        score += params._packed_1X1.get(key * n_words + word, 0)
+        score += params._packed_1X01.get((key * n_words + lattice.first_word_id[prev]) * n_words + word, 0)
+
+    return score
@@ -1,10 +1,16 @@
+from array import array
 from collections import defaultdict
+from functools import partial
 from ._beam import beam_search
 from ._beam import _preference_penalty
 from ._beam import _trigram_score
+from ._beam import _compiled_trigram_score
+from ._viterbi import viterbi_search
 from .. import AbstractTagger
 from .. import AbstractParameter
 from .. import AbstractFeatureTransformer
+from .. import bos, eos, unk, Eojeols
+from .. import Lattice
 
 
 class TrigramTagger(AbstractTagger):
@@ -23,39 +29,209 @@ class TrigramTagger(AbstractTagger):
 
         self._beam_score_functions = [
             _preference_penalty,
-            _trigram_score
+            _compiled_trigram_score if getattr(parameters, 'compiled', False) else _trigram_score
         ]
         super().__init__(parameters, feature_transformer, verbose)
 
-    def tag(self, sentence, flatten=True, guess_tag=False, beam_size=5):
+    def tag(self, sentence, flatten=True, guess_tag=False, beam_size=5, viterbi=False,
+        recombine=True, beam_threshold=None, max_chunk_len=0, chunk_overlap=2, n_jobs=1):
+        """If viterbi is True, it finds the exact beam_size best paths with
+        second-order Viterbi search instead of beam search.
+
+        recombine and beam_threshold are used only in beam search. If
+        recombine is True, partial paths with the same last two eojeols are
+        merged into the best one. If beam_threshold is given, partial paths
+        whose score is less than the best score - beam_threshold are pruned.
+
+        If max_chunk_len > 0 and the sentence has more characters than it,
+        except whitespaces, the sentence is decoded in chunks of eojeols (see
+        tag_chunks), and only the best path is returned."""
+
+        if max_chunk_len > 0 and len(sentence) > max_chunk_len and _n_chars(sentence) > max_chunk_len:
+            return self.tag_chunks(sentence, max_chunk_len, chunk_overlap, n_jobs,
+                flatten, guess_tag=guess_tag, beam_size=beam_size, viterbi=viterbi,
+                recombine=recombine, beam_threshold=beam_threshold)
+
+        stats = self.stats
+        if stats is not None:
+            stats.begin()
+
+        lattice, top_eojeols = self._search(sentence, guess_tag, beam_size,
+            viterbi, recombine, beam_threshold)
+
+        # post-processing
+        def postprocessing(eojeols, flatten):
+            if flatten:
+                return self._remain_only_pos(lattice, eojeols)
+            else:
+                return self._remain_details(lattice, eojeols)
+
+        top_poses = [(postprocessing(eojeols, flatten), eojeols.score)
+                     for eojeols in top_eojeols]
+
+        if stats is not None:
+            stats.lap('postprocess')
+            stats.end(sentence)
+
+        return top_poses
+
+    def _search(self, sentence, guess_tag=False, beam_size=5, viterbi=False,
+        recombine=True, beam_threshold=None, breaks=None):
+
+        stats = self.stats
+
         # generate nodes and edges
-        begin_index = self.parameters.generate(sentence, guess_tag)
+        lattice = self.parameters.generate(sentence, guess_tag)
+
+        if stats is not None:
+            stats.lap('generate')
+            stats.count('nodes', len(lattice))
+            stats.count('lemma_candidates', sum(lattice.compound))
 
         # find optimal path
         chars = sentence.replace(' ', '')
-        top_eojeols = beam_search(
-            begin_index, beam_size, chars, self.parameters,
+        if viterbi:
+            search = viterbi_search
+        else:
+            search = partial(beam_search, recombine=recombine, threshold=beam_threshold)
+        if breaks:
+            search = partial(search, breaks=breaks)
+        top_eojeols = search(
+            lattice, beam_size, chars, self.parameters,
             self._beam_score_functions, self.parameters.unknown_penalty,
+            stats = stats,
             a_syllable_penalty = self._a_syllable_penalty,
             noun_preference = self._noun_preference,
             longer_noun_preference = self._longer_noun_preference
         )
 
-        # post-processing
-        def postprocessing(eojeols, flatten):
-            if flatten:
-                return self._remain_only_pos(eojeols)
-            else:
-                return self._remain_details(eojeols)
+        if stats is not None:
+            stats.lap('search')
 
-        top_poses = [(postprocessing(eojeols, flatten), eojeols.score)
-                     for eojeols in top_eojeols]
+        return lattice, top_eojeols
 
-        return top_poses
+    def tag_chunks(self, sentence, max_chunk_len=300, chunk_overlap=2, n_jobs=1,
+        flatten=True, **search_kwargs):
+        """It decodes a long input, such as a paragraph or a document, in
+        chunks of eojeols whose length is at most max_chunk_len characters
+        (an eojeol longer than it becomes a chunk alone), so the time is
+        linear to the length of input.
+
+        Every chunk is decoded with chunk_overlap eojeols of both neighbour
+        chunks as context, so the trigram features of the eojeols next to
+        the chunk boundaries see their neighbours. Paths are forced to have
+        boundaries at the chunk boundaries, and the nodes of the chunk are
+        stitched with the global offsets. The score of the stitched path is
+        computed again over the whole input. With n_jobs > 1, chunks are
+        decoded by worker processes as tag_iter. The workers are started
+        for each call, and they are not available in the worker processes
+        of tag_iter, so use n_jobs=1 to decode many documents with tag_iter.
+
+        It returns [(poses, score)] of the best path. beam_size is the width
+        of search in each chunk. All whitespaces are eojeol boundaries.
+        """
+
+        stats = self.stats
+        if stats is not None:
+            stats.begin()
+
+        windows = _chunk_windows(sentence.split(), max_chunk_len, chunk_overlap)
+        # a task of each worker
+        chunksize = max(1, -(-len(windows) // max(1, n_jobs)))
+        eojeols = [eojeol for chunk in self._map_iter('_tag_window', windows,
+                   n_jobs, chunksize, None, search_kwargs) for eojeol in chunk]
+
+        # path lattice with begin and end nodes, and its score over the whole input
+        params = self.parameters
+        lattice = Lattice()
+        path = [params._add_node(lattice, bos, bos, bos, bos, 0, 0, 0, indexed=False, pos=bos)]
+        for eojeol in eojeols:
+            path.append(lattice.add(*eojeol[1:], indexed=False, pos=eojeol.pos))
+        n_char = eojeols[-1].end if eojeols else 0
+        path.append(params._add_node(lattice, eos, '', eos, '', n_char, n_char, 0, indexed=False, pos=''))
+
+        score = 0
+        kwargs = {
+            'a_syllable_penalty': self._a_syllable_penalty,
+            'noun_preference': self._noun_preference,
+            'longer_noun_preference': self._longer_noun_preference
+        }
+        for i in range(1, len(path)):
+            prev2 = path[i-2] if i >= 2 else -1
+            for func in self._beam_score_functions:
+                score += func(lattice, prev2, path[i-1], path[i], params, **kwargs)
+        eojeols = Eojeols(tuple(path), score)
+
+        if flatten:
+            poses = self._remain_only_pos(lattice, eojeols)
+        else:
+            poses = self._remain_details(lattice, eojeols)
+
+        if stats is not None:
+            stats.lap('postprocess')
+            stats.end(sentence)
+
+        return [(poses, score)]
+
+    def _tag_window(self, window, **search_kwargs):
+        # it returns Eojeols of the best path in [begin, end) of window, with global offsets
+        text, offset, begin, end = window
+        breaks = {b for b in (begin, end) if 0 < b < len(text.replace(' ', ''))}
+        lattice, top_eojeols = self._search(text, breaks=breaks, **search_kwargs)
+        eojeols = []
+        for node in top_eojeols[0].eojeols[1:-1]:
+            if begin <= lattice.begin[node] < end:
+                eojeol = lattice.eojeol(node)
+                eojeols.append(eojeol._replace(
+                    begin = eojeol.begin - begin + offset,
+                    end = eojeol.end - begin + offset))
+        return eojeols
+
+def _n_chars(sentence):
+    # length of sentence counted as _chunk_windows
+    return sum(len(eojeol) for eojeol in sentence.split())
+
+def _chunk_windows(eojeols, max_chunk_len, chunk_overlap):
+    """It returns (text, offset, begin, end) of each chunk. text is the chunk
+    with chunk_overlap eojeols of both sides, and [begin, end) is the chunk
+    in text without spaces. offset is the begin of the chunk in the input"""
+
+    # chunks of eojeols, [i, j)
+    chunks = []
+    i, length = 0, 0
+    for j, eojeol in enumerate(eojeols):
+        if j > i and length + len(eojeol) > max_chunk_len:
+            chunks.append((i, j))
+            i, length = j, 0
+        length += len(eojeol)
+    if i < len(eojeols):
+        chunks.append((i, len(eojeols)))
+
+    windows = []
+    offset = 0
+    for i, j in chunks:
+        left = eojeols[max(0, i - chunk_overlap):i]
+        right = eojeols[j:j + chunk_overlap]
+        begin = sum(len(eojeol) for eojeol in left)
+        end = begin + sum(len(eojeol) for eojeol in eojeols[i:j])
+        windows.append((' '.join(left + eojeols[i:j] + right), offset, begin, end))
+        offset += end - begin
+    return windows
 
 class TrigramFeatureTransformer(AbstractFeatureTransformer):
-    def __init__(self):
-        super().__init__()
+
+    templates = [
+        'x[0]=%s',
+        'x[0]=%s, y[-1]=%s',
+        'x[-1:0]=%s-%s',
+        'x[0:1]=%s-%s',
+        'x[0:1]=%s-%s, y[1]=%s',
+        'x[-1,1]=%s-%s',
+        'x[-1:1]=%s-%s-%s'
+    ]
+
+    def __init__(self, hashed=False, vocabulary=None):
+        super().__init__(hashed, vocabulary)
 
     def to_feature(self, words_, tags_, i):
         features = [
@@ -74,13 +250,53 @@ class TrigramFeatureTransformer(AbstractFeatureTransformer):
         ]
         return features
 
+    def to_feature_ids(self, w, t, i):
+        b = self._bits
+        x_1, x0, x1 = w[i-1], w[i], w[i+1]
+        x_10 = x_1 << b | x0
+        x01 = x0 << b | x1
+        features = [
+            x0 << 4,
+            (x0 << b | t[i-1]) << 4 | 1,
+            x_10 << 4 | 2,
+            x01 << 4 | 3,
+            (x01 << b | t[i+1]) << 4 | 4,
+            (x_1 << b | x1) << 4 | 5,
+            (x_10 << b | x1) << 4 | 6
+        ]
+        return features
+
+    def to_feature_keys(self, w, t, i):
+        x_1, x0, x1 = w[i-1], w[i], w[i+1]
+        return (
+            (0, x0),
+            (1, x0, t[i-1]),
+            (2, x_1, x0),
+            (3, x0, x1),
+            (4, x0, x1, t[i+1]),
+            (5, x_1, x1),
+            (6, x_1, x0, x1)
+        )
+
 class TrigramParameter(AbstractParameter):
     def __init__(self, model_path=None, pos2words=None, preanalyzed_eojeols=None,
-        max_word_len=0, parameter_marker=' -> ', unknown_penalty=-0.1):
+        max_word_len=0, parameter_marker=' -> ', unknown_penalty=-0.1,
+        lemma_cache_size=100000, eojeol_cache_size=10000, compiled=False,
+        index_cache=False):
 
         super().__init__(model_path, pos2words, preanalyzed_eojeols,
-            max_word_len, parameter_marker, unknown_penalty)
+            max_word_len, parameter_marker, unknown_penalty,
+            lemma_cache_size, eojeol_cache_size, index_cache)
 
+        self.compiled = compiled
+        if compiled:
+            self._compile()
+
+    _index_tables = (
+        'previous_1X0', 'previous_X0_1Y', 'successive_X01',
+        'successive_X01_Y1', 'bothside_1X1', 'bothside_1X01')
+
+    def _derive_features(self):
         self._separate_features()
 
     def _separate_features(self):
@@ -135,5 +351,65 @@ class TrigramParameter(AbstractParameter):
         self.bothside_1X1 = dict(self.bothside_1X1)
         self.bothside_1X01 = dict(self.bothside_1X01)
 
+    def _compile(self):
+        """Intern words and tags as integer ids. Transitions become a dense
+        matrix and each feature table becomes a list indexed by tag id of
+        dicts keyed by packed ids, so scoring never hashes strings. Id 0 is
+        reserved for unseen words and tags, and no packed key contains it."""
+
+        # tables with their key format; w: word, t: tag
+        tables = [
+            ('_packed_1X0', self.previous_1X0, 'ww'),
+            ('_packed_X0_1Y', self.previous_X0_1Y, 'wt'),
+            ('_packed_X01', self.successive_X01, 'ww'),
+            ('_packed_X01_Y1', self.successive_X01_Y1, 'wwt'),
+            ('_packed_1X1', self.bothside_1X1, 'ww'),
+            ('_packed_1X01', self.bothside_1X01, 'www')
+        ]
+
+        tags = {bos, eos, unk}
+        tags.update(tag for transition in self.transitions for tag in transition)
+        tags.update(tag for _, tag in self.state_features)
+        self._tag2id = {tag: i for i, tag in enumerate(sorted(tags), start=1)}
+
+        words = set()
+        for _, table, key_format in tables:
+            for features in table.values():
+                for key in features:
+                    if len(key) == len(key_format):
+                        words.update(w for w, f in zip(key, key_format) if f == 'w')
+        self._word2id = {word: i for i, word in enumerate(sorted(words), start=1)}
+
+        n_tags = self._n_tags = len(self._tag2id) + 1
+        n_words = self._n_words = len(self._word2id) + 1
+
+        # dense transition matrix, [from_tag * n_tags + to_tag]
+        self._transition_matrix = array('d', [0]) * (n_tags * n_tags)
+        for (from_, to_), coef in self.transitions.items():
+            self._transition_matrix[self._tag2id[from_] * n_tags + self._tag2id[to_]] = coef
+
+        def pack(key, key_format):
+            packed_key = 0
+            for item, f in zip(key, key_format):
+                if f == 'w':
+                    packed_key = packed_key * n_words + self._word2id[item]
+                elif item in self._tag2id:
+                    packed_key = packed_key * n_tags + self._tag2id[item]
+                else:
+                    return None
+            return packed_key
+
+        # [tag id][packed key of words (and tag)]
+        for name, table, key_format in tables:
+            packed = [{} for _ in range(n_tags)]
+            for tag, features in table.items():
+                for key, coef in features.items():
+                    if len(key) != len(key_format):
+                        continue
+                    packed_key = pack(key, key_format)
+                    if packed_key is not None:
+                        packed[self._tag2id[tag]][packed_key] = coef
+            setattr(self, name, packed)
+
     #def generate(self, sentence):
     #    raise NotImplemented
\ No newline at end of file
@@ -0,0 +1,65 @@
+from heapq import nlargest
+from .. import bos, eos, Eojeols
+from ._beam import _appending_nodes
+from ._beam import _begin_bounds
+
+def viterbi_search(lattice, k, chars, params, score_functions,
+                   unknown_penalty, stats=None, breaks=None, **kwargs):
+    """Second-order Viterbi search over the same lattice as beam_search.
+    A state is (previous eojeol, current eojeol), because the score of an
+    eojeol depends on the two eojeols before it. Each state keeps its k
+    best partial scores with back-pointers, so it returns the exact k-best
+    paths in time linear to the number of (eojeol, eojeol, eojeol) links.
+    If breaks (offsets) are given, every path has a boundary at them."""
+
+    len_sent = len(chars)
+    bounds = _begin_bounds(len_sent, params.max_word_len, breaks)
+
+    # ends[e] is the list of nodes which end at e
+    bos_node = params._add_node(lattice, bos, bos, bos, bos, 0, 0, 0, indexed=False, pos=bos)
+    ends = [[bos_node]] + [[] for _ in range(len_sent)]
+    for e in range(1, len_sent + 1):
+        for b in range(bounds[e], e):
+            ends[e] += _appending_nodes(lattice, b, e, chars, params, unknown_penalty)
+    eos_id = params._add_node(lattice, eos, '', eos, '', len_sent, len_sent, 0, indexed=False, pos='')
+
+    # states[c] = {p: kbest}, kbest = [(score, p of p, rank in state (p of p, p)), ...]
+    # the virtual state (-1, BOS) begins the search
+    states = [{} for _ in range(len(lattice))]
+    states[bos_node] = {-1: [(0, None, 0)]}
+
+    def extend(c):
+        for p in (ends[lattice.begin[c]] if c != eos_id else ends[len_sent]):
+            candidates = []
+            for pp, kbest in states[p].items():
+                scores = [func(lattice, pp, p, c, params, **kwargs) for func in score_functions]
+                for rank, (score, _, _) in enumerate(kbest):
+                    # same order of summation with beam_search
+                    for score_ in scores:
+                        score += score_
+                    candidates.append((score, pp, rank))
+            if candidates:
+                states[c][p] = nlargest(k, candidates, key=lambda x:x[0])
+            if stats is not None:
+                if states[p]:
+                    stats.count('edges')
+                stats.count('hypotheses', len(candidates))
+                stats.count('pruned', max(0, len(candidates) - k))
+
+    for e in range(1, len_sent + 1):
+        for c in ends[e]:
+            extend(c)
+    extend(eos_id)
+
+    def backtrack(p, pp, rank):
+        path = [eos_id, p]
+        while pp >= 0:
+            path.append(pp)
+            p, (_, pp, rank) = pp, states[p][pp][rank]
+        return tuple(reversed(path))
+
+    # top k among every (p, EOS) state
+    finals = [(score, p, pp, rank) for p, kbest in states[eos_id].items()
+              for score, pp, rank in kbest]
+    finals = nlargest(k, finals, key=lambda x:x[0])
+    return [Eojeols(backtrack(p, pp, rank), score) for score, p, pp, rank in finals]
@@ -1,9 +1,13 @@
 from collections import namedtuple
+from collections import OrderedDict
 import os
 import psutil
+import time
 
 
-Eojeol = namedtuple('Eojeol', 'pos first_word last_word first_tag last_tag begin end eojeol_score compound unknown')
+# *_id fields are integer ids interned by compiled parameters. 0 means unseen
+Eojeol = namedtuple('Eojeol', 'pos first_word last_word first_tag last_tag begin end eojeol_score compound unknown '
+                    'first_word_id last_word_id first_tag_id last_tag_id', defaults=(0, 0, 0, 0))
 Eojeols = namedtuple('Eojeols', 'eojeols score')
 
 bos = 'BOS'
@@ -29,6 +33,137 @@ class Corpus:
                 if morphtags:
                     yield morphtags
 
+class LRUCache:
+    """Bounded least-recently-used cache with hit / miss counters.
+    max_size <= 0 disables caching."""
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key, value):
+        if self.max_size <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def keys(self):
+        return list(self._data)
+
+    def pop(self, key, default=None):
+        return self._data.pop(key, default)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        n_query = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / n_query if n_query > 0 else 0
+        }
+
+class TaggerStats:
+    """Per-stage timings (sec) and counters of tagging, enabled by
+    AbstractTagger.enable_stats.
+
+    Stages are generate (dictionary lookup and lemmatization), search (beam,
+    Viterbi or longest path search) and postprocess. Counters are
+
+    - nodes: lattice nodes
+    - edges: links of (previous node, node) tried by search
+    - hypotheses: partial paths scored by beam or Viterbi search
+    - pruned: partial paths discarded by beam or Viterbi search
+    - lemma_candidates: lattice nodes of lemmas, tried as compound words
+
+    time and counts are cumulative. last is {'time', 'counts'} of the last
+    call, and callback(sentence, last) is called after every call.
+    """
+
+    stages = ('generate', 'search', 'postprocess')
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.reset()
+
+    def reset(self):
+        self.n_calls = 0
+        self.time = {stage: 0.0 for stage in self.stages}
+        self.counts = {}
+        self.last = None
+        self._call = {'time': {}, 'counts': {}}
+        self._begin_time = time.perf_counter()
+
+    def begin(self):
+        self._call = {'time': {}, 'counts': {}}
+        self._begin_time = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        times = self._call['time']
+        times[stage] = times.get(stage, 0) + now - self._begin_time
+        self._begin_time = now
+
+    def count(self, name, n=1):
+        counts = self._call['counts']
+        counts[name] = counts.get(name, 0) + n
+
+    def end(self, sentence):
+        call = self._call
+        for stage, elapsed in call['time'].items():
+            self.time[stage] = self.time.get(stage, 0) + elapsed
+        for name, n in call['counts'].items():
+            self.counts[name] = self.counts.get(name, 0) + n
+        self.n_calls += 1
+        self.last = call
+        if self.callback is not None:
+            self.callback(sentence, call)
+
+    def as_dict(self):
+        return {
+            'n_calls': self.n_calls,
+            'time': dict(self.time),
+            'counts': dict(self.counts),
+            'last': self.last
+        }
+
+def corpus_signature(corpus):
+    """It returns a dict identifying the content of a Corpus, or None if
+    the sentences are not from a file"""
+
+    if not isinstance(corpus, Corpus):
+        return None
+    stat = os.stat(corpus.path)
+    return {
+        'path': os.path.abspath(corpus.path),
+        'num_sent': corpus.num_sent,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime
+    }
+
 def _to_end_index(begin_index):
     end_index = [[] for _ in range(len(begin_index) + 1)]
     for words in begin_index:
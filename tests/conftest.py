@@ -0,0 +1,29 @@
+import os
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'benchmarks'))
+
+import pytest
+
+from synthetic import as_text
+from synthetic import generate_model
+from synthetic import generate_pos2words
+from synthetic import generate_sentences
+from synthetic import save_model
+
+
+@pytest.fixture(scope='session')
+def pos2words():
+    return generate_pos2words(0.002, 0)[0]
+
+@pytest.fixture(scope='session')
+def model_path(tmp_path_factory, pos2words):
+    path = str(tmp_path_factory.mktemp('model') / 'model.json')
+    save_model(path, *generate_model(pos2words, 300, 1))
+    return path
+
+@pytest.fixture(scope='session')
+def sentences(pos2words):
+    return [as_text(sentence) for sentence in generate_sentences(pos2words, 30, 0, 2)]
@@ -0,0 +1,122 @@
+import os
+import random
+
+from crf_postagger import Trainer
+from crf_postagger import counting
+from crf_postagger.counting import LossyCounter
+from crf_postagger.counting import SpillCounter
+from crf_postagger.transformer import is_word_feature
+from crf_postagger.trigram import TrigramFeatureTransformer
+from crf_postagger.utils import Corpus
+
+from synthetic import as_wordpos
+from synthetic import generate_sentences
+
+
+def test_lossy_counter_max_size():
+    rng = random.Random(0)
+    items = [int(rng.paretovariate(1.2)) for _ in range(20000)]
+    counter = LossyCounter(0.001, max_size=100)
+    for item in items:
+        counter.add(item)
+        assert len(counter) <= 100
+    true_counts = {item: items.count(item) for item in set(items)}
+    for item, count in true_counts.items():
+        if count > counter.max_error:
+            assert item in counter
+        if item in counter:
+            stored, _ = counter.counter[item]
+            assert count - counter.max_error <= stored <= count
+
+def test_scan_features_lossy_is_exact(pos2words):
+    sentences = [as_wordpos(sentence) for sentence in generate_sentences(pos2words, 200, 0, 3)]
+    transformer = TrigramFeatureTransformer()
+    trainer = Trainer(transformer, verbose=False)
+    expected = trainer.scan_features(sentences, transformer, min_count=2)
+    for max_size in [0, 500]:
+        counter = trainer.scan_features_lossy(sentences, transformer, 2, 1e-4, max_size)
+        assert set(counter) <= set(expected)
+        assert all(counter[feature] == expected[feature] for feature in counter)
+        # word features are all kept
+        assert {f for f in expected if f.startswith('x[0]=') and ', ' not in f} <= set(counter)
+    # nothing is pruned when error_rate * N < 1
+    assert trainer.scan_features_lossy(sentences, transformer, 2, 1e-7, 0) == expected
+
+def test_scan_features_parallel_is_exact(pos2words):
+    sentences = [as_wordpos(sentence) for sentence in generate_sentences(pos2words, 200, 0, 3)]
+    transformer = TrigramFeatureTransformer()
+    trainer = Trainer(transformer, verbose=False)
+    true_counts = {}
+    for sentence in sentences:
+        for features in transformer(sentence)[0]:
+            for feature in features:
+                true_counts[feature] = true_counts.get(feature, 0) + 1
+    # word features are all kept
+    expected = {feature: count for feature, count in true_counts.items()
+                if count >= 2 or is_word_feature(feature)}
+    assert trainer.scan_features(sentences, transformer, 2, n_jobs=2) == expected
+    # trimming between batches is same with sequential scanning
+    for scan_batch_size in [30, 64]:
+        assert trainer.scan_features(sentences, transformer, 2, scan_batch_size, n_jobs=2) == \
+            trainer.scan_features(sentences, transformer, 2, scan_batch_size)
+
+def test_spill_counter_bounded_merge(tmp_path, monkeypatch):
+    rng = random.Random(0)
+    items = [str(int(rng.paretovariate(1.2))) for _ in range(3000)]
+    counter = SpillCounter(str(tmp_path), buffer_size=5, max_merge=3)
+    for b in range(0, len(items), 10):
+        counter.update(items[b: b + 10])
+    counter.update(['0'])
+    assert len(counter.runs) > 9
+
+    # count open runs
+    read_run, n_open = counting._read_run, [0, 0]
+    def counted_read_run(path):
+        n_open[0] += 1
+        n_open[1] = max(n_open)
+        try:
+            yield from read_run(path)
+        finally:
+            n_open[0] -= 1
+    monkeypatch.setattr(counting, '_read_run', counted_read_run)
+
+    true_counts = {item: items.count(item) for item in set(items)}
+    true_counts['0'] = 1
+    assert list(counter.items()) == sorted(true_counts.items())
+    assert n_open[1] <= 3
+    # intermediate runs are removed
+    assert sorted(os.listdir(str(tmp_path))) == sorted(os.path.basename(run) for run in counter.runs)
+
+def test_scan_features_disk(tmp_path, pos2words, monkeypatch):
+    corpus_path = str(tmp_path / 'corpus.txt')
+    def write_corpus(num_sents, seed):
+        with open(corpus_path, 'w', encoding='utf-8') as f:
+            for sentence in generate_sentences(pos2words, num_sents, 0, seed):
+                f.write(' '.join('{}/{}'.format(word, tag) for word, tag in as_wordpos(sentence)) + '\n')
+    write_corpus(200, 3)
+    corpus = Corpus(corpus_path)
+    transformer = TrigramFeatureTransformer()
+    trainer = Trainer(transformer, verbose=False)
+    expected = trainer.scan_features(corpus, transformer, 2, scan_batch_size=1000)
+    # spilled runs are removed with temporal directory
+    assert trainer.scan_features_disk(corpus, transformer, 2, None, buffer_size=100) == expected
+
+    spill_dir = str(tmp_path / 'spill')
+    assert trainer.scan_features_disk(corpus, transformer, 2, spill_dir, buffer_size=100) == expected
+    assert len(os.listdir(spill_dir)) > 2
+
+    # same corpus merges the runs in manifest without scanning
+    original_update = SpillCounter.update
+    def update(self, items):
+        raise AssertionError('scanned again')
+    monkeypatch.setattr(SpillCounter, 'update', update)
+    assert trainer.scan_features_disk(corpus, transformer, 2, spill_dir, buffer_size=100) == expected
+    assert trainer.scan_features_disk(corpus, transformer, 3, spill_dir, buffer_size=100) == \
+        trainer.scan_features(corpus, transformer, 3, scan_batch_size=1000)
+
+    # changed corpus is scanned again, and old runs are removed
+    monkeypatch.setattr(SpillCounter, 'update', original_update)
+    write_corpus(100, 4)
+    expected = trainer.scan_features(corpus, transformer, 2, scan_batch_size=1000)
+    assert trainer.scan_features_disk(corpus, transformer, 2, spill_dir, buffer_size=1000000) == expected
+    assert sorted(os.listdir(spill_dir)) == ['manifest.json', 'run0.tsv']
@@ -0,0 +1,127 @@
+import multiprocessing
+
+import pytest
+
+from crf_postagger.hmm_style import HMMStyleParameter
+from crf_postagger.hmm_style import HMMStyleTagger
+from crf_postagger.hmm_style import ford_list
+from crf_postagger.hmm_style._hmm_style import _hmm_style_tagger_weight
+from crf_postagger.trigram import TrigramParameter
+from crf_postagger.trigram import TrigramTagger
+
+
+@pytest.fixture(scope='module')
+def trigram_tagger(model_path):
+    return TrigramTagger(TrigramParameter(model_path))
+
+@pytest.fixture(scope='module')
+def hmm_style_tagger(model_path):
+    return HMMStyleTagger(HMMStyleParameter(model_path))
+
+def test_dag_longest_path_equals_ford_list(hmm_style_tagger, sentences):
+    tagger = hmm_style_tagger
+    for sentence in sentences + ['아이돌', 'abc 아이돌']:
+        poses, cost = tagger.tag(sentence, flatten=False)
+        edges, bos_, eos_ = tagger.parameters.generate(sentence)
+        nodes = {node for edge in edges for node in edge}
+        weighted = _hmm_style_tagger_weight(edges, tagger.parameters,
+            tagger._a_syllable_penalty, tagger._noun_preference)
+        path, cost_ = ford_list(weighted, nodes, bos_, eos_)
+        assert cost == pytest.approx(cost_)
+        assert poses == [(e.pos, e.begin, e.end, e.eojeol_score) for e in path[1:-1]]
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_viterbi_is_exact(model_path, sentences, compiled):
+    tagger = TrigramTagger(TrigramParameter(model_path, compiled=compiled))
+    for sentence in sentences[:10]:
+        viterbi = tagger.tag(sentence, viterbi=True, beam_size=3)
+        # beam search is exact when the beam keeps every hypothesis
+        exhaustive = tagger.tag(sentence, beam_size=100000)
+        beam = tagger.tag(sentence, beam_size=5)
+        assert viterbi[0][1] == pytest.approx(exhaustive[0][1])
+        assert viterbi[0][0] == exhaustive[0][0]
+        assert viterbi[0][1] >= beam[0][1] - 1e-9
+        assert [score for _, score in viterbi] == sorted((score for _, score in viterbi), reverse=True)
+
+def test_search_stats(model_path, sentences):
+    tagger = TrigramTagger(TrigramParameter(model_path))
+    stats = tagger.enable_stats()
+    for sentence in sentences[:10]:
+        tagger.tag(sentence, viterbi=True)
+        viterbi = stats.last['counts']
+        tagger.tag(sentence, beam_size=100000)
+        exhaustive = stats.last['counts']
+        tagger.tag(sentence, beam_size=1)
+        beam = stats.last['counts']
+        # both searches try every link of the nodes when the beam keeps every hypothesis
+        assert viterbi['edges'] == exhaustive['edges'] >= beam['edges']
+        assert beam['hypotheses'] >= beam['edges'] - beam['pruned']
+        lattice = tagger.parameters.generate(sentence)
+        assert viterbi['lemma_candidates'] == beam['lemma_candidates'] == sum(lattice.compound)
+
+def test_compiled_parameters_give_same_result(model_path, trigram_tagger, sentences):
+    compiled = TrigramTagger(TrigramParameter(model_path, compiled=True))
+    for sentence in sentences:
+        expected = trigram_tagger.tag(sentence)
+        result = compiled.tag(sentence)
+        assert [poses for poses, _ in result] == [poses for poses, _ in expected]
+        assert [score for _, score in result] == pytest.approx([score for _, score in expected])
+
+def test_chunks_of_long_input(trigram_tagger, sentences):
+    document = ' '.join(sentences)
+    n_char = len(document.replace(' ', ''))
+    assert trigram_tagger.tag(sentences[0], max_chunk_len=10000) == trigram_tagger.tag(sentences[0])
+
+    poses, score = trigram_tagger.tag(document, flatten=False, max_chunk_len=50)[0]
+    # stitched chunks cover the input without gap and overlap
+    assert poses[0][1] == 0 and poses[-1][2] == n_char
+    assert all(a[2] == b[1] for a, b in zip(poses, poses[1:]))
+
+    # score is computed again over the whole input
+    whole = trigram_tagger.tag(document, beam_size=5)[0]
+    chunked = trigram_tagger.tag(document, max_chunk_len=50)[0]
+    if chunked[0] == whole[0]:
+        assert chunked[1] == pytest.approx(whole[1])
+    assert trigram_tagger.tag(document, max_chunk_len=50, n_jobs=2) == [chunked]
+
+def test_chunk_length_excludes_spaces(trigram_tagger, sentences):
+    sentence = max(sentences, key=lambda sentence: sentence.count(' '))
+    n_char = len(sentence.replace(' ', ''))
+    assert trigram_tagger.tag(sentence, max_chunk_len=n_char) == trigram_tagger.tag(sentence)
+    assert len(trigram_tagger.tag(sentence, max_chunk_len=n_char - 1)) == 1
+
+def test_chunk_workers_in_worker_process(trigram_tagger, sentences):
+    document = ' '.join(sentences[:5])
+    with multiprocessing.get_context('fork').Pool(1) as pool:
+        with pytest.raises(ValueError):
+            pool.apply(trigram_tagger.tag, (document,), {'max_chunk_len': 50, 'n_jobs': 2})
+        # with n_jobs=1, chunks are decoded in the worker
+        assert pool.apply(trigram_tagger.tag, (document,), {'max_chunk_len': 50}) == \
+            trigram_tagger.tag(document, max_chunk_len=50)
+
+def test_tag_iter_parallel(trigram_tagger, sentences):
+    expected = [trigram_tagger.tag(sentence, beam_size=3) for sentence in sentences]
+    assert trigram_tagger.tag_batch(sentences, n_jobs=2, chunksize=3, beam_size=3) == expected
+    # uneven last chunk and max_inflight = 1
+    assert list(trigram_tagger.tag_iter(sentences[:7], n_jobs=2, chunksize=2,
+        max_inflight=1, beam_size=3)) == expected[:7]
+
+def test_tag_iter_bounds_inflight_chunks(trigram_tagger, sentences):
+    n_read = [0]
+    def read():
+        for sentence in sentences:
+            n_read[0] += 1
+            yield sentence
+
+    results = trigram_tagger.tag_iter(read(), n_jobs=2, chunksize=2, max_inflight=3)
+    for n_yielded, _ in enumerate(results, start=1):
+        # at most max_inflight chunks are read but not yielded
+        assert n_read[0] - n_yielded < 3 * 2
+    assert n_yielded == len(sentences)
+
+def test_tag_iter_terminates_pool_when_closed(trigram_tagger, sentences):
+    results = trigram_tagger.tag_iter(sentences, n_jobs=2, chunksize=2)
+    next(results)
+    assert len(multiprocessing.active_children()) == 2
+    results.close()
+    assert not multiprocessing.active_children()
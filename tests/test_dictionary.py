@@ -0,0 +1,61 @@
+import pytest
+
+from crf_postagger.trigram import TrigramParameter
+
+
+def lattice_eojeols(parameter, eojeol):
+    lattice = parameter.generate(eojeol)
+    return sorted(lattice.eojeol(node) for node in range(len(lattice)))
+
+def test_user_dictionary_updates_cached_lemmas(model_path):
+    parameter = TrigramParameter(model_path)
+    parameter.add_user_dictionary('Noun', {'학교': 0.5})
+    cached = lattice_eojeols(parameter, '학굔')
+    # '학교/Noun + ㄴ/Josa' is a lemma node, and 'ㄴ' is not a substring of '학굔'
+    assert any(eojeol.compound for eojeol in cached)
+    parameter.add_user_dictionary('Josa', {'ㄴ': 0.77})
+
+    expected = TrigramParameter(model_path)
+    expected.add_user_dictionary('Noun', {'학교': 0.5})
+    expected.add_user_dictionary('Josa', {'ㄴ': 0.77})
+    assert lattice_eojeols(parameter, '학굔') == lattice_eojeols(expected, '학굔')
+    assert lattice_eojeols(parameter, '학굔') != cached
+
+    parameter.remove_user_dictionary('Josa', ['ㄴ'])
+    expected = TrigramParameter(model_path)
+    expected.add_user_dictionary('Noun', {'학교': 0.5})
+    assert lattice_eojeols(parameter, '학굔') == lattice_eojeols(expected, '학굔')
+
+def test_user_dictionary_updates_preanalyzed_eojeols(model_path):
+    preanalyzed = {'갔음': (('가', 'ㅆ음', 'Verb', 'NounEnding'),)}
+    parameter = TrigramParameter(model_path, preanalyzed_eojeols=preanalyzed)
+    lattice_eojeols(parameter, '갔음')
+    parameter.add_user_dictionary('NounEnding', {'ㅆ음': 0.3})
+
+    expected = TrigramParameter(model_path, preanalyzed_eojeols=preanalyzed)
+    expected.add_user_dictionary('NounEnding', {'ㅆ음': 0.3})
+    assert lattice_eojeols(parameter, '갔음') == lattice_eojeols(expected, '갔음')
+
+def test_load_user_dictionary(tmp_path, model_path):
+    path = str(tmp_path / 'user.tsv')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('# comment\n학교\tNoun\t0.5\n\nㄴ\tJosa\n')
+    parameter = TrigramParameter(model_path)
+    lattice_eojeols(parameter, '학굔')
+    assert parameter.load_user_dictionary(path, default_score=0.77) == 2
+    assert parameter.pos2words['Noun']['학교'] == 0.5
+    assert parameter.pos2words['Josa']['ㄴ'] == 0.77
+
+    expected = TrigramParameter(model_path)
+    expected.add_user_dictionary('Noun', {'학교': 0.5})
+    expected.add_user_dictionary('Josa', {'ㄴ': 0.77})
+    assert lattice_eojeols(parameter, '학굔') == lattice_eojeols(expected, '학굔')
+
+    assert parameter.load_user_dictionary(path, remove=True) == 2
+    assert '학교' not in parameter.pos2words['Noun']
+    assert lattice_eojeols(parameter, '학굔') == lattice_eojeols(TrigramParameter(model_path), '학굔')
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('학교\n')
+    with pytest.raises(ValueError):
+        parameter.load_user_dictionary(path)
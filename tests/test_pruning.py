@@ -0,0 +1,61 @@
+import pytest
+
+from crf_postagger.pruning import prune_features
+from crf_postagger.pruning import prune_model
+from crf_postagger.pruning import read_model
+from crf_postagger.transformer import is_word_feature
+from crf_postagger.trigram import TrigramParameter
+from crf_postagger.trigram import TrigramTagger
+
+
+def test_prune_features():
+    state_features = {
+        ('x[0]=이것', 'Noun'): 0.01,
+        ('x[-1:0]=이-것', 'Noun'): 2.0,
+        ('x[-1:0]=그-것', 'Noun'): -0.5,
+        ('x[-1:0]=저-것', 'Noun'): 0.1,
+        ('x[0:1]=이-것', 'Noun'): -4.0,
+    }
+    # threshold is relative to max |coef|
+    assert set(prune_features(state_features, threshold=0.1)) == {
+        ('x[0]=이것', 'Noun'), ('x[-1:0]=이-것', 'Noun'), ('x[-1:0]=그-것', 'Noun'), ('x[0:1]=이-것', 'Noun')}
+    assert set(prune_features(state_features, threshold=0.1, keep_words=False)) == {
+        ('x[-1:0]=이-것', 'Noun'), ('x[-1:0]=그-것', 'Noun'), ('x[0:1]=이-것', 'Noun')}
+    # top_n is applied to each template
+    assert set(prune_features(state_features, top_n=1)) == {
+        ('x[0]=이것', 'Noun'), ('x[-1:0]=이-것', 'Noun'), ('x[0:1]=이-것', 'Noun')}
+
+@pytest.mark.parametrize('output_name,quantization', [
+    ('pruned.json', None), ('pruned.bin', None), ('int8.bin', 'int8'),
+    ('float16.bin', 'float16'), ('int8.json', 'int8')])
+def test_prune_model(tmp_path, model_path, sentences, output_name, quantization):
+    output_path = str(tmp_path / output_name)
+    n_before, n_after = prune_model(model_path, output_path, threshold=0.05, quantization=quantization)
+    assert n_after < n_before
+
+    state_features, transitions, _, _ = read_model(model_path)
+    pruned, pruned_transitions, idx2feature, _ = read_model(output_path)
+    assert len(pruned) == n_after
+    assert set(idx2feature) == {feature for feature, _ in pruned}
+    max_coef = max(abs(coef) for coef in state_features.values())
+    for key, coef in state_features.items():
+        if key not in pruned:
+            assert abs(coef) < 0.05 * max_coef and not is_word_feature(key[0])
+
+    # quantized coefficients are within the quantization step
+    if quantization == 'int8':
+        step = max(abs(coef) for coef in state_features.values()) / 127
+        tolerance = {'abs': step / 2 + 1e-9}
+    elif quantization == 'float16':
+        tolerance = {'rel': 2 ** -11, 'abs': 6e-8}
+    else:
+        tolerance = {'abs': 1e-12}
+    for key, coef in pruned.items():
+        assert coef == pytest.approx(state_features[key], **tolerance)
+    assert set(pruned_transitions) == set(transitions)
+
+    # pruned model is loaded and tags sentences
+    tagger = TrigramTagger(TrigramParameter(output_path))
+    for sentence in sentences[:5]:
+        poses, score = tagger.tag(sentence)[0]
+        assert poses and all(word and tag for word, tag in poses)
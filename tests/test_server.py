@@ -0,0 +1,120 @@
+import asyncio
+import json
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from crf_postagger.server import Overloaded
+from crf_postagger.server import TaggingServer
+from crf_postagger.trigram import TrigramParameter
+from crf_postagger.trigram import TrigramTagger
+
+
+@pytest.fixture(scope='module')
+def tagger(model_path):
+    return TrigramTagger(TrigramParameter(model_path))
+
+def test_embedded_server(tagger, sentences):
+    async def run():
+        server = await TaggingServer(tagger, n_jobs=0, max_delay=0.001).start(host=None)
+        try:
+            return await asyncio.gather(*[server.tag(sentence) for sentence in sentences])
+        finally:
+            await server.close()
+
+    assert asyncio.run(run()) == [tagger.tag(sentence) for sentence in sentences]
+
+def test_server_rejects_when_queue_is_full(tagger, sentences):
+    async def run():
+        server = await TaggingServer(tagger, n_jobs=0, max_queue=1).start(host=None)
+        try:
+            results = await asyncio.gather(*[server.tag(sentence) for sentence in sentences[:5]],
+                return_exceptions=True)
+            return results, server.stats()['counts']
+        finally:
+            await server.close()
+
+    results, counts = asyncio.run(run())
+    assert any(isinstance(result, Overloaded) for result in results)
+    assert counts['rejected'] == sum(isinstance(result, Overloaded) for result in results)
+
+def test_socket_protocol(tagger, sentences):
+    async def run():
+        server = await TaggingServer(tagger, n_jobs=0).start('127.0.0.1', 0)
+        port = server._servers[0].sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            request = {'id': 7, 'sentence': sentences[0]}
+            writer.write((json.dumps(request) + '\n{"op": "health"}\n').encode('utf-8'))
+            responses = [await reader.readline() for _ in range(2)]
+            writer.close()
+            return responses
+        finally:
+            await server.close()
+
+    responses = [json.loads(response) for response in asyncio.run(run())]
+    tagged = [response for response in responses if 'id' in response][0]
+    poses, score = tagger.tag(sentences[0])[0]
+    assert tagged['id'] == 7 and tagged['score'] == pytest.approx(score)
+    assert [tuple(pos) for pos in tagged['poses']] == poses
+    assert {'status': 'ok', 'queue': 0} in responses
+
+def test_socket_skips_long_lines(tagger, sentences):
+    async def run():
+        server = await TaggingServer(tagger, n_jobs=0, max_line_size=1000).start('127.0.0.1', 0)
+        port = server._servers[0].sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            long_request = json.dumps({'id': 1, 'sentence': sentences[0] * 500}) + '\n'
+            writer.write((long_request + '{"op": "health"}\n').encode('utf-8'))
+            # a long line written in parts
+            for b in range(0, len(long_request), 700):
+                writer.write(long_request[b: b + 700].encode('utf-8'))
+                await writer.drain()
+                await asyncio.sleep(0.01)
+            request = {'id': 2, 'sentence': sentences[0]}
+            writer.write((json.dumps(request) + '\n').encode('utf-8'))
+            responses = [json.loads(await reader.readline()) for _ in range(4)]
+            writer.close()
+            return responses
+        finally:
+            await server.close()
+
+    responses = asyncio.run(run())
+    assert responses[:3] == [{'error': 'request too long'}, {'status': 'ok', 'queue': 0},
+        {'error': 'request too long'}]
+    assert responses[3]['id'] == 2 and 'poses' in responses[3]
+
+def test_error_fails_only_its_sentence(tagger, sentences):
+    async def run():
+        server = await TaggingServer(tagger, n_jobs=0, max_delay=0.01).start(host=None)
+        try:
+            results = await asyncio.gather(server.tag(sentences[0]), server.tag(None),
+                server.tag(sentences[1]), return_exceptions=True)
+            return results, server.stats()['counts']
+        finally:
+            await server.close()
+
+    results, counts = asyncio.run(run())
+    assert results[0] == tagger.tag(sentences[0]) and results[2] == tagger.tag(sentences[1])
+    assert isinstance(results[1], Exception)
+    assert counts['completed'] == 2 and counts['failed'] == 1
+
+def test_server_restarts_broken_workers(tagger, sentences):
+    async def run():
+        server = await TaggingServer(tagger, n_jobs=1, timeout=30).start(host=None)
+        try:
+            await server.tag(sentences[0])
+            for process in list(server._executor._processes.values()):
+                process.kill()
+            await asyncio.sleep(0.5)
+            broken = await asyncio.gather(server.tag(sentences[0]), return_exceptions=True)
+            result = await server.tag(sentences[1])
+            return broken[0], result, server.stats()['counts']
+        finally:
+            await server.close()
+
+    broken, result, counts = asyncio.run(run())
+    assert isinstance(broken, BrokenProcessPool)
+    assert result == tagger.tag(sentences[1])
+    assert counts['restarts'] == 1
@@ -0,0 +1,187 @@
+import json
+import os
+
+import pytest
+
+from crf_postagger import Lattice
+from crf_postagger import Trainer
+from crf_postagger.binary import json_to_binary
+from crf_postagger.binary import load_binary
+from crf_postagger.encoded import EncodedCorpus
+from crf_postagger.encoded import EncodedCorpusWriter
+from crf_postagger.encoded import load_encoded_corpus
+from crf_postagger.trie import Trie
+from crf_postagger.trigram import TrigramFeatureTransformer
+from crf_postagger.trigram import TrigramParameter
+from crf_postagger.trigram import TrigramTagger
+from crf_postagger.utils import Corpus
+from crf_postagger.utils import LRUCache
+
+from synthetic import as_wordpos
+from synthetic import generate_sentences
+
+
+def test_trie():
+    trie = Trie([('아이', 1), ('아이돌', 2), ('돌', 3)])
+    assert len(trie) == 3 and '아이돌' in trie and '아' not in trie
+    assert list(trie.prefixes('아이돌이다')) == [(2, 1), (3, 2)]
+    assert list(trie.prefixes('x아이돌', 1)) == [(3, 1), (4, 2)]
+
+    del trie['아이']
+    assert '아이' not in trie and trie['아이돌'] == 2
+    del trie['아이돌']
+    assert '아' not in trie.root and len(trie) == 1
+    with pytest.raises(KeyError):
+        del trie['아이']
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache.get('a') == 1
+    cache['c'] = 3
+    assert 'b' not in cache and cache.keys() == ['a', 'c']
+    assert cache.get('b') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    disabled = LRUCache(0)
+    disabled['a'] = 1
+    assert len(disabled) == 0
+
+def test_lattice():
+    lattice = Lattice(3)
+    a = lattice.add('아이', '아이', 'Noun', 'Noun', 0, 2, 1.0)
+    b = lattice.add('가', '다', 'Verb', 'Eomi', 0, 1, 0.5, compound=1)
+    assert lattice.begin_index[0] == [a, b]
+    assert lattice.pos(b) == '가/Verb + 다/Eomi'
+
+    other = Lattice(3)
+    other.extend(lattice, 1)
+    assert other.begin_index[1] == [0, 1] and other.end == [3, 2]
+    assert other.eojeol(0).pos == '아이/Noun'
+
+def test_binary_model(tmp_path, model_path, sentences):
+    binary_path = str(tmp_path / 'model.bin')
+    json_to_binary(model_path, binary_path)
+    from_json = TrigramParameter(model_path)
+    from_binary = TrigramParameter(binary_path)
+    assert from_binary.transitions == from_json.transitions
+    assert from_binary.state_features == from_json.state_features
+    assert from_binary.features == from_json.features
+    with load_binary(binary_path) as model:
+        assert model.idx2feature() == from_json.idx2feature
+
+    tagger, tagger_ = TrigramTagger(from_json), TrigramTagger(from_binary)
+    for sentence in sentences[:5]:
+        assert tagger.tag(sentence) == tagger_.tag(sentence)
+
+def test_index_cache(tmp_path, model_path, sentences):
+    cache_path = str(tmp_path / 'model.index')
+    expected = TrigramParameter(model_path)
+    # given max_word_len is not stored in the cache
+    short = TrigramParameter(model_path, max_word_len=2, index_cache=cache_path)
+    assert short.max_word_len == 2
+    with open(cache_path, encoding='utf-8') as f:
+        assert json.loads(f.readline())['size'] == os.path.getsize(model_path)
+
+    cached = TrigramParameter(model_path, index_cache=cache_path)
+    assert cached.max_word_len == expected.max_word_len
+    assert cached.transitions == expected.transitions
+    assert cached.state_features == expected.state_features
+    assert cached.pos2words == expected.pos2words
+    assert cached.features == expected.features
+    assert cached.previous_1X0 == expected.previous_1X0
+    tagger, tagger_ = TrigramTagger(expected), TrigramTagger(cached)
+    for sentence in sentences[:5]:
+        assert tagger.tag(sentence) == tagger_.tag(sentence)
+
+    # a cache of other model is not used
+    with open(cache_path, encoding='utf-8') as f:
+        key, index = json.loads(f.readline()), f.read()
+    key['mtime'] -= 1
+    index = json.loads(index)
+    index['transitions'] = []
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(key) + '\n' + json.dumps(index))
+    assert TrigramParameter(model_path, index_cache=cache_path).transitions == expected.transitions
+
+def test_unwritable_index_cache(tmp_path, model_path, sentences):
+    expected = TrigramParameter(model_path)
+    # the directory of the cache does not exist
+    cache_path = str(tmp_path / 'missing' / 'model.index')
+    parameter = TrigramParameter(model_path, index_cache=cache_path)
+    assert not os.path.exists(cache_path)
+    # the cache path is a directory, so the temporary file is written but not renamed
+    cache_path = str(tmp_path / 'directory.index')
+    os.mkdir(cache_path)
+    parameter = TrigramParameter(model_path, index_cache=cache_path)
+    assert os.listdir(str(tmp_path)) == ['directory.index']
+    assert parameter.state_features == expected.state_features
+    tagger, tagger_ = TrigramTagger(expected), TrigramTagger(parameter)
+    for sentence in sentences[:5]:
+        assert tagger.tag(sentence) == tagger_.tag(sentence)
+
+def test_add_words_longer_than_max_word_len(model_path, sentences):
+    parameter, expected = TrigramParameter(model_path), TrigramParameter(model_path)
+    # long eojeols have candidates longer than max_word_len
+    documents = [sentence.replace(' ', '') for sentence in sentences[:10]]
+    for document in documents:
+        parameter.generate(document, guess_tag=True)
+    word = '가' * (parameter.max_word_len + 3)
+    parameter.add_words([(word, 'Josa', 1.0)])
+    expected.add_words([(word, 'Josa', 1.0)])
+    for document in documents:
+        lattice, lattice_ = parameter.generate(document, True), expected.generate(document, True)
+        assert [lattice.eojeol(i) for i in range(len(lattice))] == \
+            [lattice_.eojeol(i) for i in range(len(lattice_))]
+
+def test_encoded_corpus(tmp_path):
+    path = str(tmp_path / 'corpus.enc')
+    features = {'a': (0, 3), 'b': (1, 2)}
+    writer = EncodedCorpusWriter(path, features)
+    assert writer.write([['a', 'x'], ['b', 'a']], ['Noun', 'Josa']) == [['a'], ['b', 'a']]
+    writer.write([['x']], ['Noun'])
+    writer.close('signature', ['a', 'b'], [3, 2])
+
+    corpus = EncodedCorpus(path)
+    assert len(corpus) == 2
+    assert list(corpus) == [([['a'], ['b', 'a']], ['Noun', 'Josa']), ([[]], ['Noun'])]
+    assert load_encoded_corpus(path, 'signature') is not None
+    assert load_encoded_corpus(path, 'other') is None
+
+def test_trainer_cache_path(tmp_path, pos2words, monkeypatch):
+    corpus_path, cache_path = str(tmp_path / 'corpus.txt'), str(tmp_path / 'corpus.enc')
+    def write_corpus(num_sents, seed):
+        with open(corpus_path, 'w', encoding='utf-8') as f:
+            for sentence in generate_sentences(pos2words, num_sents, 0, seed):
+                f.write(' '.join('{}/{}'.format(word, tag) for word, tag in as_wordpos(sentence)) + '\n')
+    def train(name, min_count=2):
+        trainer = Trainer(TrigramFeatureTransformer(), min_count=min_count,
+            max_iter=5, cache_path=cache_path, verbose=False)
+        trainer.train(Corpus(corpus_path), str(tmp_path / name))
+        with open(str(tmp_path / name), encoding='utf-8') as f:
+            return json.load(f)
+
+    # count scanning
+    scan, n_scans = Trainer._scan, [0]
+    def counted_scan(self, sentences):
+        n_scans[0] += 1
+        return scan(self, sentences)
+    monkeypatch.setattr(Trainer, '_scan', counted_scan)
+
+    write_corpus(60, 3)
+    model = train('model.json')
+    assert n_scans == [1] and os.path.exists(cache_path)
+    # cached training repeats the training exactly
+    assert train('cached.json') == model
+    assert n_scans == [1]
+
+    # other scanning options or a changed corpus invalidate the cache
+    assert train('min_count.json', min_count=3)['features'] != model['features']
+    assert n_scans == [2]
+    write_corpus(50, 4)
+    changed = train('changed.json')
+    assert n_scans == [3]
+    assert changed['features'] != model['features']
+    assert train('changed_cached.json') == changed
+    assert n_scans == [3]
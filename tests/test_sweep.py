@@ -0,0 +1,29 @@
+import os
+
+from crf_postagger.sweep import Split
+from crf_postagger.sweep import sweep
+from crf_postagger.trigram import TrigramFeatureTransformer
+from crf_postagger.trigram import TrigramParameter
+
+from synthetic import as_wordpos
+from synthetic import generate_sentences
+
+
+def test_split():
+    sentences = list(range(100))
+    train, dev = Split(sentences, 0.2, 1), Split(sentences, 0.2, 1, dev=True)
+    assert sorted(list(train) + list(dev)) == sentences
+    assert list(train) == list(train) and 0 < len(list(dev)) < 50
+
+def test_sweep(tmp_path, pos2words):
+    sentences = [as_wordpos(sentence) for sentence in generate_sentences(pos2words, 80, 0, 4)]
+    model_path = str(tmp_path / 'best.json')
+    grid = {'l2_cost': [0.1, 1.0], 'max_iter': [5], 'min_count': [1, 2]}
+    results = sweep(sentences, TrigramFeatureTransformer(), grid, model_path,
+        dev_ratio=0.2, n_jobs=2, summary_path=str(tmp_path / 'summary.tsv'), verbose=False)
+
+    assert len(results) == 4
+    assert [r['accuracy'] for r in results] == sorted((r['accuracy'] for r in results), reverse=True)
+    assert results[0]['model_path'] == model_path and results[0]['accuracy'] > 0
+    assert sorted(os.listdir(str(tmp_path))) == ['best.json', 'summary.tsv']
+    assert TrigramParameter(model_path).transitions
@@ -0,0 +1,44 @@
+import pytest
+
+from crf_postagger.tag import as_line
+from crf_postagger.tag import count_written_lines
+from crf_postagger.tag import tag_file
+from crf_postagger.trigram import TrigramParameter
+from crf_postagger.trigram import TrigramTagger
+
+
+@pytest.mark.parametrize('block_size', [1, 3, 1 << 20])
+@pytest.mark.parametrize('content', [b'', b'a', b'a\nb\n', b'a\nbcd', b'\n\nxyzw', b'abcdefgh\nij'])
+def test_count_written_lines(tmp_path, content, block_size):
+    path = tmp_path / 'output.txt'
+    path.write_bytes(content)
+    assert count_written_lines(str(path), block_size) == content.count(b'\n')
+    # cut last line is removed
+    assert path.read_bytes() == content[:content.rfind(b'\n') + 1]
+
+def test_count_written_lines_of_missing_file(tmp_path):
+    assert count_written_lines(str(tmp_path / 'missing.txt')) == 0
+
+@pytest.mark.parametrize('begin_line', [0, 4])
+def test_tag_file_resume(tmp_path, model_path, sentences, begin_line):
+    tagger = TrigramTagger(TrigramParameter(model_path))
+    input_path, output_path = str(tmp_path / 'input.txt'), str(tmp_path / 'output.txt')
+    with open(input_path, 'w', encoding='utf-8') as f:
+        f.write(''.join(sentence + '\n' for sentence in sentences[:12]))
+    expected = [as_line(tagger.tag(sentence)) + '\n' for sentence in sentences[begin_line:12]]
+
+    # output interrupted after 3 lines and a part of the 4th line
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(''.join(expected[:3]) + expected[3][:5])
+    n_tagged = tag_file(tagger, input_path, output_path, begin_line, chunksize=2, verbose=False, resume=True)
+    assert n_tagged == len(expected) - 3
+    with open(output_path, encoding='utf-8') as f:
+        assert f.readlines() == expected
+
+    # nothing remains
+    assert tag_file(tagger, input_path, output_path, begin_line, verbose=False, resume=True) == 0
+    # missing output is tagged from begin_line
+    missing_path = str(tmp_path / 'missing.txt')
+    assert tag_file(tagger, input_path, missing_path, begin_line, verbose=False, resume=True) == len(expected)
+    with open(missing_path, encoding='utf-8') as f:
+        assert f.readlines() == expected
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from crf_postagger import Trainer
+from crf_postagger.hmm_style import HMMStyleFeatureTransformer
+from crf_postagger.sweep import sweep
+from crf_postagger.transformer import BaseFeatureTransformer
+from crf_postagger.transformer import build_vocabulary
+from crf_postagger.transformer import is_word_feature
+from crf_postagger.trigram import TrigramFeatureTransformer
+from crf_postagger.utils import unk
+
+from synthetic import as_wordpos
+from synthetic import generate_sentences
+
+
+transformers = [BaseFeatureTransformer, TrigramFeatureTransformer, HMMStyleFeatureTransformer]
+
+@pytest.mark.parametrize('transformer_class', transformers)
+def test_hashed_features_decode(transformer_class, pos2words):
+    sentences = [as_wordpos(sentence) for sentence in generate_sentences(pos2words, 50, 0, 3)]
+    strings = transformer_class()
+    hashed = transformer_class(hashed=True)
+    # nothing is recorded before record_keys
+    features = [f for sentence in sentences for fs in hashed(sentence)[0] for f in fs]
+    assert not hashed._id2key
+    recorded = set(features[::2])
+    hashed.record_keys(recorded)
+    for sentence in sentences:
+        expected, _ = strings(sentence)
+        features, _ = hashed(sentence)
+        assert [[hashed.decode(f) for f in fs if f in recorded] for fs in features] == \
+            [[e for f, e in zip(fs, es) if f in recorded] for fs, es in zip(features, expected)]
+        assert all(0 <= f < 1 << 64 for fs in features for f in fs)
+        assert [[is_word_feature(f) for f in fs] for fs in features] == \
+            [[is_word_feature(f) for f in fs] for fs in expected]
+    assert set(hashed._id2key) == recorded
+
+def test_hashed_feature_collision():
+    transformer = TrigramFeatureTransformer(hashed=True)
+    sentence = [('이것', 'Noun'), ('은', 'Josa')]
+    features, _ = transformer(sentence)
+    transformer.record_keys(features[0])
+    transformer(sentence)
+    # pretend that the first feature id belongs to another feature
+    transformer._id2key[features[0][0]] = transformer._id2key[features[0][1]]
+    with pytest.raises(ValueError, match='collision'):
+        transformer(sentence)
+
+@pytest.mark.parametrize('transformer_class', transformers)
+def test_vocabulary_skips_unknown_words(transformer_class, pos2words):
+    sentences = [as_wordpos(sentence) for sentence in generate_sentences(pos2words, 100, 0, 3)]
+    strings = transformer_class()
+    vocab = transformer_class(vocabulary=build_vocabulary(sentences[:50]))
+    n_unknown = 0
+    for sentence in sentences:
+        expected, _ = strings(sentence)
+        features, _ = vocab(sentence)
+        decoded = [[vocab.decode(f) for f in fs] for fs in features]
+        known = [[f for f in fs if f in vocab_fs] for fs, vocab_fs in zip(expected, decoded)]
+        # features are same with string features, except features with unknown words
+        assert decoded == known
+        assert not any(unk in f for fs in decoded for f in fs)
+        n_unknown += sum(len(fs) for fs in expected) - sum(len(fs) for fs in decoded)
+    assert n_unknown > 0
+
+def test_hashed_training_equals_string_training(tmp_path, pos2words):
+    sentences = [as_wordpos(sentence) for sentence in generate_sentences(pos2words, 60, 0, 3)]
+    models = []
+    for hashed in [False, True]:
+        model_path = str(tmp_path / 'model{}.json'.format(int(hashed)))
+        transformer = TrigramFeatureTransformer(hashed=hashed)
+        Trainer(transformer, min_count=2, max_iter=5, verbose=False).train(sentences, model_path)
+        with open(model_path, encoding='utf-8') as f:
+            models.append(json.load(f))
+        if hashed:
+            # only the keys of remained features are recorded
+            assert len(transformer._id2key) == len(models[-1]['features'])
+    assert models[0]['state_features'] == models[1]['state_features']
+    assert models[0]['features'] == models[1]['features']
+
+    results = sweep(sentences, TrigramFeatureTransformer(hashed=True), {'max_iter': [5]},
+        str(tmp_path / 'best.json'), dev_ratio=0.2, verbose=False)
+    assert results[0]['accuracy'] > 0
@@ -0,0 +1,18 @@
+import argparse
+import sys
+sys.path.append('../')
+
+from crf_postagger.binary import json_to_binary
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--json_path', type=str, default='../models/trigram_sejong_lr_sepxsv.json', help='trained JSON model path')
+    parser.add_argument('--binary_path', type=str, default='../models/trigram_sejong_lr_sepxsv.bin', help='binary model path')
+    parser.add_argument('--parameter_marker', type=str, default=' -> ')
+
+    args = parser.parse_args()
+    json_to_binary(args.json_path, args.binary_path, args.parameter_marker)
+
+if __name__ == '__main__':
+    main()
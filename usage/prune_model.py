@@ -0,0 +1,66 @@
+import argparse
+import itertools
+import os
+import sys
+import time
+sys.path.append('../')
+
+from crf_postagger import Corpus
+from crf_postagger.hmm_style import HMMStyleParameter
+from crf_postagger.hmm_style import HMMStyleTagger
+from crf_postagger.pruning import morpheme_f1
+from crf_postagger.pruning import prune_model
+from crf_postagger.pruning import read_model
+from crf_postagger.trigram import TrigramParameter
+from crf_postagger.trigram import TrigramTagger
+
+def evaluate(model_path, model_type, sentences):
+    begin = time.time()
+    if model_type == 'trigram':
+        tagger = TrigramTagger(TrigramParameter(model_path))
+    else:
+        tagger = HMMStyleTagger(HMMStyleParameter(model_path))
+    load_time = time.time() - begin
+    return load_time, morpheme_f1(tagger, sentences)['f1']
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_path', type=str, default='../models/trigram_sejong_lr_sepxsv.json', help='trained JSON or binary model path')
+    parser.add_argument('--model_type', type=str, default='trigram', choices=['trigram', 'hmm_style'])
+    parser.add_argument('--output_dir', type=str, default='../models/pruned/')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0, 0.001, 0.01], help='minimum |coef| / max |coef|')
+    parser.add_argument('--top_n', type=int, nargs='+', default=[0], help='number of features kept for each template. 0 means all')
+    parser.add_argument('--quantization', type=str, nargs='+', default=['none'], choices=['none', 'int8', 'float16'])
+    parser.add_argument('--binary', dest='binary', action='store_true', help='save pruned models in binary format')
+    parser.add_argument('--prune_words', dest='prune_words', action='store_true', help='prune word features (x[0]) too')
+    parser.add_argument('--corpus_path', type=str, default=None, help='held-out corpus to evaluate')
+    parser.add_argument('--num_sent', type=int, default=1000)
+
+    args = parser.parse_args()
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    sentences = list(Corpus(args.corpus_path, args.num_sent)) if args.corpus_path else []
+    extension = '.bin' if args.binary else '.json'
+    basename = os.path.basename(args.model_path).rsplit('.', 1)[0]
+
+    def report(name, path, n_features):
+        size = os.path.getsize(path) / (1024 ** 2)
+        if sentences:
+            load_time, f1 = evaluate(path, args.model_type, sentences)
+            print('{:32} {:>9} state features {:>8.2f} Mb  load {:.3f} sec  f1 {:.4f}'.format(
+                name, n_features, size, load_time, f1))
+        else:
+            print('{:32} {:>9} state features {:>8.2f} Mb'.format(name, n_features, size))
+
+    report('original', args.model_path, len(read_model(args.model_path)[0]))
+    for threshold, top_n, quantization in itertools.product(args.thresholds, args.top_n, args.quantization):
+        quantization = None if quantization == 'none' else quantization
+        name = '{}_t{}_n{}_{}'.format(basename, threshold, top_n, quantization or 'float64')
+        path = os.path.join(args.output_dir, name + extension)
+        _, n_features = prune_model(args.model_path, path, threshold, top_n,
+            quantization, keep_words=not args.prune_words)
+        report(name, path, n_features)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import sys
+sys.path.append('../')
+
+from crf_postagger import Corpus
+from crf_postagger import BaseFeatureTransformer
+from crf_postagger.sweep import sweep
+from crf_postagger.trigram import TrigramFeatureTransformer
+from crf_postagger.hmm_style import HMMStyleFeatureTransformer
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus_path', type=str, default='../data/sejong_corpus_lr_sepxsv.txt', help='corpus path')
+    parser.add_argument('--corpus_length', type=int, default=-1, help='if you set, sample sentence')
+    parser.add_argument('--feature_type', type=str, default='trigram',
+                        choices=['base', 'hmm_style', 'trigram']
+                       )
+    parser.add_argument('--l1_cost', type=float, nargs='+', default=[0])
+    parser.add_argument('--l2_cost', type=float, nargs='+', default=[0.1, 1.0])
+    parser.add_argument('--min_count', type=int, nargs='+', default=[3])
+    parser.add_argument('--max_iter', type=int, nargs='+', default=[100])
+    parser.add_argument('--dev_ratio', type=float, default=0.1, help='ratio of held-out sentences')
+    parser.add_argument('--scan_method', type=str, default='memory', choices=['memory', 'lossy', 'disk'], help='feature counting of Trainer')
+    parser.add_argument('--n_jobs', type=int, default=1, help='number of concurrently trained models')
+    parser.add_argument('--model_path', type=str, default='../models/trigram_sejong_lr_sepxsv.json', help='best model path')
+    parser.add_argument('--summary_path', type=str, default=None, help='tsv summary of configurations')
+    parser.add_argument('--verbose', dest='verbose', action='store_true')
+
+    args = parser.parse_args()
+
+    if args.feature_type == 'hmm_style':
+        sentence_to_xy = HMMStyleFeatureTransformer()
+    elif args.feature_type == 'trigram':
+        sentence_to_xy = TrigramFeatureTransformer()
+    else:
+        sentence_to_xy = BaseFeatureTransformer()
+
+    grid = {
+        'l1_cost': args.l1_cost,
+        'l2_cost': args.l2_cost,
+        'min_count': args.min_count,
+        'max_iter': args.max_iter
+    }
+
+    sweep(
+        Corpus(args.corpus_path, num_sent=args.corpus_length),
+        sentence_to_xy,
+        grid,
+        args.model_path,
+        dev_ratio = args.dev_ratio,
+        n_jobs = args.n_jobs,
+        summary_path = args.summary_path,
+        scan_method = args.scan_method,
+        verbose = args.verbose
+    )
+
+if __name__ == '__main__':
+    main()
@@ -17,7 +17,14 @@ def main():
     parser.add_argument('--feature_type', type=str, default='trigram',
                         choices=['base', 'hmm_style', 'trigram']
                        )
+    parser.add_argument('--hashed', dest='hashed', action='store_true', help='use 64 bit hashed integer features while training')
     parser.add_argument('--max_iter', type=int, default=100, help='the number of maximal iteration of CRF')
+    parser.add_argument('--n_jobs', type=int, default=1, help='number of processes to scan features')
+    parser.add_argument('--scan_method', type=str, default='memory', choices=['memory', 'lossy', 'disk'])
+    parser.add_argument('--error_rate', type=float, default=1e-6, help='error rate of lossy scanning')
+    parser.add_argument('--spill_dir', type=str, default=None, help='directory of spilled feature counts, reused by later runs')
+    parser.add_argument('--buffer_size', type=int, default=1000000, help='number of features counted in memory before spilling, or kept by lossy scanning')
+    parser.add_argument('--cache_path', type=str, default=None, help='feature id encoded corpus, reused by later runs')
     parser.add_argument('--model_path', type=str, default='../models/trigram_sejong_lr_sepxsv.json', help='trained model path')
     parser.add_argument('--verbose', dest='verbose', action='store_true')
 
@@ -25,21 +32,34 @@ def main():
     corpus_path = args.corpus_path
     corpus_length = args.corpus_length
     feature_type = args.feature_type
+    hashed = args.hashed
     max_iter = args.max_iter
+    n_jobs = args.n_jobs
+    scan_method = args.scan_method
+    error_rate = args.error_rate
+    spill_dir = args.spill_dir
+    buffer_size = args.buffer_size
+    cache_path = args.cache_path
     model_path = args.model_path
     verbose = args.verbose
 
     if feature_type == 'hmm_style':
-        sentence_to_xy = HMMStyleFeatureTransformer()
+        sentence_to_xy = HMMStyleFeatureTransformer(hashed=hashed)
     elif feature_type == 'trigram':
-        sentence_to_xy = TrigramFeatureTransformer()
+        sentence_to_xy = TrigramFeatureTransformer(hashed=hashed)
     else:
-        sentence_to_xy = BaseFeatureTransformer()
+        sentence_to_xy = BaseFeatureTransformer(hashed=hashed)
 
     trainer = Trainer(
         sentence_to_xy = sentence_to_xy,
         max_iter = max_iter,
         l1_cost = 0,
+        n_jobs = n_jobs,
+        scan_method = scan_method,
+        error_rate = error_rate,
+        spill_dir = spill_dir,
+        buffer_size = buffer_size,
+        cache_path = cache_path,
         verbose = verbose
     )
     trainer.train(